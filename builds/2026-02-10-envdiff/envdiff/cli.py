@@ -7,10 +7,15 @@ import json
 import sys
 from typing import Optional
 
-from .snapshot import SnapshotEngine
+from .codec import fingerprints_of
+from .collectors import ALL_COLLECTORS, FilesCollector
+from .entrystore import EntryStream, close_spools
+from .snapshot import SnapshotEngine, collector_name
 from .storage import SnapshotStorage
+from .timeline import Timeline, parse_time
 from .diff import SnapshotDiff
 from .formatters import SnapshotFormatter
+from .watch import FileEventSource, WatchPipeline
 
 
 @click.group()
@@ -39,7 +44,10 @@ def snap(name: Optional[str], storage: Optional[str]):
         snapshot_id, snapshot_data = engine.capture_named(name)
         
         # Save to storage
-        storage_engine.save_snapshot(snapshot_id, snapshot_id, snapshot_data)
+        try:
+            storage_engine.save_snapshot(snapshot_id, snapshot_id, snapshot_data)
+        finally:
+            close_spools(snapshot_data)
         
         formatter.print_success(f"Snapshot '{snapshot_id}' created successfully")
         formatter.format_snapshot_summary(snapshot_id, snapshot_data)
@@ -69,35 +77,57 @@ def list(storage: Optional[str]):
 @click.argument('snap1')
 @click.argument('snap2', required=False)
 @click.option('--storage', help='Path to snapshot database')
-def compare(snap1: str, snap2: Optional[str], storage: Optional[str]):
+@click.option('--similar', is_flag=True,
+              help='Also pair moved files edited in place (same name and size)')
+def compare(snap1: str, snap2: Optional[str], storage: Optional[str], similar: bool):
     """Compare two snapshots or compare a snapshot with current state."""
     formatter = SnapshotFormatter()
     
     try:
         storage_engine = SnapshotStorage(storage)
-        diff_engine = SnapshotDiff()
+        diff_engine = SnapshotDiff(detect_similar=similar)
         
-        # Get first snapshot
-        snapshot1_data = storage_engine.get_snapshot(snap1)
-        if not snapshot1_data:
+        # Look up section fingerprints first so identical sections are never loaded
+        fingerprints1 = storage_engine.get_section_hashes(snap1)
+        if fingerprints1 is None:
             formatter.print_error(f"Snapshot '{snap1}' not found")
             sys.exit(1)
         
-        # Get second snapshot or capture current state
+        # Fingerprint the second snapshot or capture current state
         if snap2:
-            snapshot2_data = storage_engine.get_snapshot(snap2)
-            if not snapshot2_data:
+            fingerprints2 = storage_engine.get_section_hashes(snap2)
+            if fingerprints2 is None:
                 formatter.print_error(f"Snapshot '{snap2}' not found")
                 sys.exit(1)
             snap2_id = snap2
         else:
             # Compare with current state
             engine = SnapshotEngine()
-            snapshot2_data = engine.capture()
+            current_data = engine.capture()
+            fingerprints2 = fingerprints_of(current_data)
             snap2_id = "current"
         
+        changed = diff_engine.changed_sections(fingerprints1, fingerprints2)
+        
+        snapshot1_data = storage_engine.get_snapshot(snap1, sections=changed)
+        if snapshot1_data is None:
+            formatter.print_error(f"Snapshot '{snap1}' not found")
+            sys.exit(1)
+        
+        if snap2:
+            snapshot2_data = storage_engine.get_snapshot(snap2, sections=changed)
+            if snapshot2_data is None:
+                formatter.print_error(f"Snapshot '{snap2}' not found")
+                sys.exit(1)
+        else:
+            snapshot2_data = current_data
+        
         # Compute and display diff
-        diff = diff_engine.compare(snapshot1_data, snapshot2_data)
+        try:
+            diff = diff_engine.compare(snapshot1_data, snapshot2_data)
+        finally:
+            if not snap2:
+                close_spools(current_data)
         formatter.format_diff(diff, snap1, snap2_id)
         
         # Exit with code 1 if there are changes (like git diff)
@@ -109,6 +139,47 @@ def compare(snap1: str, snap2: Optional[str], storage: Optional[str]):
         sys.exit(1)
 
 
+@cli.command()
+@click.option('--since', help='Start: age (e.g. 24h, 30m, 7d), ISO date/time or Unix time')
+@click.option('--until', help='End: age, ISO date/time or Unix time')
+@click.option('--storage', help='Path to snapshot database')
+def timeline(since: Optional[str], until: Optional[str], storage: Optional[str]):
+    """Show what changed between each pair of consecutive snapshots."""
+    formatter = SnapshotFormatter()
+    
+    bounds = {}
+    for option, value in (('since', since), ('until', until)):
+        if value is not None:
+            try:
+                bounds[option] = parse_time(value)
+            except ValueError as e:
+                raise click.BadParameter(str(e), param_hint=f'--{option}')
+    
+    try:
+        storage_engine = SnapshotStorage(storage)
+        diff_engine = SnapshotDiff()
+        
+        steps = 0
+        changed = 0
+        for step in Timeline(storage_engine, diff_engine).steps(**bounds):
+            steps += 1
+            summary = {section: diff_engine.summarize(section_diff, section)
+                       for section, section_diff in step['diff'].items()}
+            summary = {section: counts for section, counts in summary.items() if counts}
+            if summary:
+                changed += 1
+                formatter.format_timeline_step(step, summary)
+        
+        if steps == 0:
+            formatter.print_info("Fewer than two snapshots in range; nothing to compare")
+        else:
+            formatter.print_info(f"{changed} of {steps} consecutive snapshot pairs changed")
+        
+    except Exception as e:
+        formatter.print_error(f"Failed to build timeline: {str(e)}")
+        sys.exit(1)
+
+
 @cli.command()
 @click.argument('name')
 @click.option('--storage', help='Path to snapshot database')
@@ -134,6 +205,13 @@ def delete(name: str, storage: Optional[str]):
         sys.exit(1)
 
 
+def _expand_entries(value):
+    """Serialise stored file entries as the full list rather than their reference."""
+    if isinstance(value, EntryStream):
+        return [*value]
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
 @cli.command()
 @click.argument('name')
 @click.option('--format', 'output_format', default='json', type=click.Choice(['json']), 
@@ -153,22 +231,77 @@ def export(name: str, output_format: str, storage: Optional[str]):
         
         if output_format == 'json':
             # Pretty print JSON to stdout
-            print(json.dumps(snapshot_data, indent=2))
+            print(json.dumps(snapshot_data, indent=2, default=_expand_entries))
         
     except Exception as e:
         formatter.print_error(f"Failed to export snapshot: {str(e)}")
         sys.exit(1)
 
 
+@cli.group(name='storage')
+def storage_group():
+    """Manage the snapshot database."""
+    pass
+
+
+@storage_group.command()
+@click.option('--storage', help='Path to snapshot database')
+@click.option('--vacuum/--no-vacuum', default=True, help='Reclaim freed space afterwards')
+def migrate(storage: Optional[str], vacuum: bool):
+    """Rewrite stored snapshots into the current compact format."""
+    formatter = SnapshotFormatter()
+    
+    try:
+        storage_engine = SnapshotStorage(storage)
+        stats = storage_engine.migrate(vacuum=vacuum)
+        
+        if stats['migrated']:
+            formatter.print_success(
+                f"Migrated {stats['migrated']} snapshot(s): "
+                f"{stats['bytes_before']:,} → {stats['bytes_after']:,} bytes"
+            )
+        else:
+            formatter.print_info("All snapshots already use the current format")
+        
+    except Exception as e:
+        formatter.print_error(f"Failed to migrate storage: {str(e)}")
+        sys.exit(1)
+
+
 @cli.command()
-@click.option('--interval', default=60, help='Monitoring interval in seconds')
+@click.option('--interval', type=click.FloatRange(min=0, min_open=True),
+              help='Run every collector at this interval in seconds instead of per-collector cadences')
+@click.option('--every', 'every', multiple=True, metavar='SECTION=SECONDS',
+              help='Cadence for one section, e.g. --every packages=3600 (repeatable)')
+@click.option('--events/--poll', default=True,
+              help='Track files with inotify between intervals (Linux) or poll only')
 @click.option('--storage', help='Path to snapshot database')
-def watch(interval: int, storage: Optional[str]):
+def watch(interval: Optional[float], every: tuple, events: bool, storage: Optional[str]):
     """Continuously monitor environment changes."""
     formatter = SnapshotFormatter()
-    formatter.print_info(f"Starting continuous monitoring (interval: {interval}s)")
+    
+    sections = [collector_name(c) for c in ALL_COLLECTORS]
+    cadences = {}
+    for spec in every:
+        section, _, seconds = spec.partition('=')
+        section = section.strip()
+        try:
+            cadences[section] = float(seconds)
+        except ValueError:
+            raise click.BadParameter(f"expected SECTION=SECONDS, got '{spec}'", param_hint='--every')
+        if section not in sections:
+            raise click.BadParameter(f"unknown section '{section}', expected one of: {', '.join(sections)}",
+                                     param_hint='--every')
+        if not cadences[section] > 0:
+            raise click.BadParameter(f"seconds must be greater than 0, got '{spec}'", param_hint='--every')
+    
+    if interval is not None:
+        formatter.print_info(f"Starting continuous monitoring (interval: {interval:g}s)")
+    else:
+        formatter.print_info("Starting continuous monitoring (per-collector cadences)")
     formatter.print_info("Press Ctrl+C to stop")
     
+    file_events = None
     try:
         import time
         
@@ -176,36 +309,35 @@ def watch(interval: int, storage: Optional[str]):
         storage_engine = SnapshotStorage(storage)
         diff_engine = SnapshotDiff()
         
-        # Take initial snapshot
-        initial_id, initial_data = engine.capture_named(f"watch-baseline")
-        storage_engine.save_snapshot(initial_id, initial_id, initial_data)
-        last_snapshot_data = initial_data
+        # Start watching before the baseline walk so no change slips in between
+        if events:
+            file_events = FileEventSource.create(engine.find_collector(FilesCollector))
+        if file_events:
+            formatter.print_info("Tracking file changes with inotify")
+        
+        if interval is not None:
+            # A single interval applies to every section not given its own cadence
+            cadences = {**{name: interval for name in engine.section_names()}, **cadences}
+        pipeline = WatchPipeline(engine, storage_engine, diff_engine, file_events, cadences)
         
+        # Take initial snapshot
+        initial_id = pipeline.baseline()
         formatter.print_success(f"Baseline snapshot '{initial_id}' created")
         
-        while True:
-            time.sleep(interval)
-            
-            # Capture current state
-            current_data = engine.capture()
-            
-            # Compare with last snapshot
-            diff = diff_engine.compare(last_snapshot_data, current_data)
-            
-            if diff_engine.has_changes(diff):
-                formatter.print_info(f"Changes detected at {time.strftime('%Y-%m-%d %H:%M:%S')}")
-                formatter.format_diff(diff, "previous", "current")
-                
-                # Save new snapshot
-                new_id, _ = engine.capture_named(f"watch-{int(time.time())}")
-                storage_engine.save_snapshot(new_id, new_id, current_data)
-                last_snapshot_data = current_data
+        def report(snapshot_id, diff):
+            formatter.print_info(f"Changes detected at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+            formatter.format_diff(diff, "previous", "current")
+        
+        pipeline.run(report)
             
     except KeyboardInterrupt:
         formatter.print_info("Monitoring stopped")
     except Exception as e:
         formatter.print_error(f"Watch failed: {str(e)}")
         sys.exit(1)
+    finally:
+        if file_events is not None:
+            file_events.close()
 
 
 def main():
@@ -0,0 +1,166 @@
+"""
+Codec module - versioned, compressed encoding of snapshot data.
+"""
+
+import hashlib
+import json
+import lzma
+import zlib
+from typing import Any, Dict, Iterable, Optional
+
+# Blob layout: MAGIC + format version byte + codec byte + compressed compact JSON.
+# Rows written before the format existed hold pretty-printed JSON text.
+MAGIC = b'EDS'
+FORMAT_VERSION = 1
+
+_COMPRESSORS = {
+    'zlib': (b'z', lambda raw: zlib.compress(raw, 6)),
+    'lzma': (b'x', lambda raw: lzma.compress(raw, preset=6)),
+}
+
+_DECOMPRESSORS = {
+    b'z': zlib.decompress,
+    b'x': lzma.decompress,
+}
+
+
+def _encode_default(value: Any) -> Any:
+    """Serialize objects that stand in for stored data (e.g. entry streams) by their __json__."""
+    if hasattr(value, '__json__'):
+        return value.__json__()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Non-ASCII is written as \u escapes: names and values read through os.environ or
+# os.fsdecode carry lone surrogates for non-UTF-8 bytes, which UTF-8 cannot encode.
+
+def dumps_compact(data: Any) -> bytes:
+    """Serialize data as compact ASCII JSON."""
+    return json.dumps(data, separators=(',', ':'), default=_encode_default).encode('ascii')
+
+
+def canonical_json(data: Any) -> bytes:
+    """Serialize data as canonical JSON: sorted keys, compact separators, ASCII."""
+    return json.dumps(data, sort_keys=True, separators=(',', ':'),
+                      default=_encode_default).encode('ascii')
+
+
+def section_hash(data: Any) -> str:
+    """Return the content address of a snapshot section (SHA-256 of its canonical JSON)."""
+    return hashlib.sha256(canonical_json(data)).hexdigest()
+
+
+def fingerprints_of(snapshot: Dict[str, Any]) -> Dict[str, str]:
+    """Return the per-section fingerprints of a snapshot, computing any that are missing."""
+    known = getattr(snapshot, 'fingerprints', None) or {}
+    return {name: known.get(name) or section_hash(data) for name, data in snapshot.items()}
+
+
+class SnapshotData(dict):
+    """
+    Snapshot sections plus a canonical fingerprint per section.
+
+    Behaves exactly like the plain section dict it wraps. fingerprints may
+    list sections that were not loaded: a partially loaded snapshot carries
+    the fingerprints of every section it has in storage.
+    """
+
+    def __init__(self, sections: Optional[Dict[str, Any]] = None,
+                 fingerprints: Optional[Dict[str, str]] = None):
+        super().__init__(sections or {})
+        if fingerprints is None:
+            fingerprints = {name: section_hash(data) for name, data in self.items()}
+        self.fingerprints = dict(fingerprints)
+
+    # Every mutator drops the fingerprints of the sections it replaces or
+    # removes; fingerprints_of recomputes those still present
+
+    def __setitem__(self, name: str, data: Any) -> None:
+        super().__setitem__(name, data)
+        self.fingerprints.pop(name, None)
+
+    def __delitem__(self, name: str) -> None:
+        super().__delitem__(name)
+        self.fingerprints.pop(name, None)
+
+    def __ior__(self, other: Any) -> 'SnapshotData':
+        self.update(other)
+        return self
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for name, data in dict(*args, **kwargs).items():
+            self[name] = data
+
+    def setdefault(self, name: str, default: Any = None) -> Any:
+        if name not in self:
+            self[name] = default
+        return self[name]
+
+    def pop(self, name: str, *default: Any) -> Any:
+        self.fingerprints.pop(name, None)
+        return super().pop(name, *default)
+
+    def popitem(self) -> Any:
+        name, data = super().popitem()
+        self.fingerprints.pop(name, None)
+        return name, data
+
+    def clear(self) -> None:
+        super().clear()
+        self.fingerprints.clear()
+
+
+def changed_sections(fingerprints1: Dict[str, str], fingerprints2: Dict[str, str]) -> Iterable[str]:
+    """Return the names of sections whose fingerprints differ or exist on one side only."""
+    return [name for name in dict.fromkeys([*fingerprints1, *fingerprints2])
+            if fingerprints1.get(name) != fingerprints2.get(name)]
+
+
+def encode_blob(data: Any, codec: str = 'zlib') -> bytes:
+    """
+    Encode data into a versioned, compressed blob.
+    
+    Args:
+        data: JSON-serializable data.
+        codec: 'zlib' (fast, the default) or 'lzma' (smaller, slower).
+        
+    Returns:
+        Encoded blob bytes.
+    """
+    try:
+        marker, compress = _COMPRESSORS[codec]
+    except KeyError:
+        raise ValueError(f"Unknown codec: {codec}")
+    
+    return MAGIC + bytes([FORMAT_VERSION]) + marker + compress(dumps_compact(data))
+
+
+def decode_blob(blob: Any) -> Any:
+    """
+    Decode a stored blob, accepting both the versioned format and legacy JSON text.
+    
+    Args:
+        blob: Value read from a data column.
+        
+    Returns:
+        The decoded data.
+    """
+    if isinstance(blob, str):
+        return json.loads(blob)
+    
+    blob = bytes(blob)
+    if not blob.startswith(MAGIC):
+        return json.loads(blob.decode('utf-8'))
+    
+    version = blob[len(MAGIC)]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version: {version}")
+    
+    marker = blob[len(MAGIC) + 1:len(MAGIC) + 2]
+    try:
+        decompress = _DECOMPRESSORS[marker]
+    except KeyError:
+        raise ValueError(f"Unknown snapshot codec marker: {marker!r}")
+    
+    return json.loads(decompress(blob[len(MAGIC) + 2:]).decode('utf-8'))
+
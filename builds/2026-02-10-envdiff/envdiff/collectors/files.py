@@ -4,108 +4,487 @@ Files collector - captures file checksums and metadata for watched directories.
 
 import hashlib
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+
+from ..entrystore import EntrySpool, sweep_spools
+from ..gitindex import GIT_BLOB, GitIndex, find_git_dir, new_blob_hash
+from ..hashcache import FileHashCache
+from ..ignore import DEFAULT_PATTERNS, IGNORE_FILES, IgnoreMatcher
+from ..merkle import build_tree
+from ..storage import get_data_dir
+
+# Read buffer for streaming hashes; memory use per hashing thread is bounded by it
+CHUNK_SIZE = 1024 * 1024
+
+# Files stat'ed, looked up in the hash cache and hashed together
+BATCH_SIZE = 512
+
+# Entries a collect keeps in memory before spilling them to disk
+SPILL_THRESHOLD = 20000
+
+# Entry hash for files above the size ceiling; size and mtime are still tracked
+TOO_LARGE = 'too_large'
+
+
+def new_hash(algorithm: str):
+    """Create a hash object; 'blake2b' uses a 256-bit digest."""
+    if algorithm == 'blake2b':
+        return hashlib.blake2b(digest_size=32)
+    return hashlib.new(algorithm)
+
+
+def hash_file(file_path: str, algorithm: str = 'blake2b', chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    Hash a file's contents by streaming it through a fixed-size buffer.
+    
+    hashlib releases the GIL while hashing large buffers, so several files
+    can be hashed in parallel threads.
+    
+    Args:
+        file_path: File to hash.
+        algorithm: hashlib algorithm name, or GIT_BLOB for git's blob SHA-1.
+        chunk_size: Size of the read buffer in bytes.
+        
+    Returns:
+        Hex digest.
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        if algorithm == GIT_BLOB:
+            digest = new_blob_hash(os.fstat(f.fileno()).st_size)
+        else:
+            digest = new_hash(algorithm)
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.hexdigest()
 
 
 class FilesCollector:
-    """Collector for file checksums and metadata."""
+    """
+    Collector for file checksums and metadata.
+
+    What is collected follows .gitignore semantics: the default patterns,
+    .git/info/exclude and every .gitignore and .envdiffignore met on the
+    way down. Ignored directories are pruned during the walk.
 
-    def __init__(self, watch_dirs: List[str] = None, max_files: int = 1000):
+    The section pairs the entries with a Merkle tree of directory digests
+    (see envdiff.merkle), so comparisons only descend into directories
+    whose contents changed.
+
+    Files flow through the collector in batches: walked, stat'ed, hashed
+    and handed on. Beyond spill_threshold entries they are spilled to an
+    on-disk EntrySpool, which storage copies page by page, so memory does
+    not grow with the number of files.
+
+    In a git checkout, files are fingerprinted by their git blob SHA-1 and
+    tracked files whose stat data matches .git/index reuse the SHA recorded
+    there, so a clean checkout costs one stat per file.
+    """
+
+    def __init__(self, watch_dirs: List[str] = None, max_files: Optional[int] = None,
+                 hash_cache: bool = True, cache_path: Optional[str] = None,
+                 algorithm: str = 'blake2b', max_file_size: Optional[int] = 1024 ** 3,
+                 hash_workers: Optional[int] = None,
+                 ignore_patterns: Optional[Iterable[str]] = None,
+                 ignore_files: Iterable[str] = IGNORE_FILES,
+                 spill_threshold: Optional[int] = SPILL_THRESHOLD,
+                 git_index: bool = True):
         """
         Initialize file collector.
         
         Args:
             watch_dirs: List of directories to watch. Defaults to current working directory.
-            max_files: Maximum number of files to track.
+            max_files: Maximum number of files to track. None tracks every file.
+            hash_cache: Reuse digests of files whose stat data is unchanged.
+            cache_path: Path to the hash cache database. Defaults to the data directory.
+            algorithm: hashlib algorithm for file digests. blake2b is the
+                fastest secure hash in hashlib on 64-bit machines.
+            max_file_size: Files larger than this are tracked by size and
+                mtime only, with hash 'too_large'. None hashes every file.
+            hash_workers: Threads hashing files in parallel. Defaults to
+                the CPU count, capped at 8.
+            ignore_patterns: Patterns in .gitignore syntax applied below any
+                ignore file. Defaults to DEFAULT_PATTERNS (hidden files,
+                bytecode, editor temporaries, node_modules, venv).
+            ignore_files: Per-directory ignore files to honour. Empty ignores
+                only ignore_patterns.
+            spill_threshold: Entries kept in memory before the section is
+                spilled to disk. None always keeps them in memory.
+            git_index: In watched directories inside a git checkout, use git
+                blob SHAs as fingerprints and take those of clean tracked
+                files from .git/index instead of reading the files.
         """
         self.watch_dirs = watch_dirs or [os.getcwd()]
         self.max_files = max_files
+        self.hash_cache = hash_cache
+        self.cache_path = cache_path
+        self.algorithm = algorithm
+        self.max_file_size = max_file_size
+        self.hash_workers = hash_workers or min(8, os.cpu_count() or 1)
+        self.ignore_patterns = list(DEFAULT_PATTERNS if ignore_patterns is None else ignore_patterns)
+        self.ignore_files = tuple(ignore_files)
+        self.spill_threshold = spill_threshold
+        self.git_index = git_index
+        # Fail at construction on an unknown algorithm, not on every file
+        new_hash(algorithm)
         
-        # File extensions to ignore
-        self.ignore_extensions = {
-            '.pyc', '.pyo', '.pyd', '__pycache__',
-            '.git', '.svn', '.hg',
-            '.DS_Store', '.localized',
-            '.tmp', '.temp', '.swp', '.swo',
-            'node_modules', '.venv', 'venv', '.env'
-        }
+        # Stale spools in the data directory are swept on the first spill
+        self._swept = False
+        # watch_dir -> matcher caching the ignore files read so far
+        self._matchers: Dict[str, IgnoreMatcher] = {}
+        # watch_dir -> (work tree root, git dir), or None outside a checkout
+        self._git_dirs: Dict[str, Optional[Tuple[str, str]]] = {}
+        # git dir -> (index file signature, parsed index or None if unusable)
+        self._git_indexes: Dict[str, Tuple[Tuple[int, int, int], Optional[GitIndex]]] = {}
 
-    def collect(self) -> List[Dict[str, Any]]:
+    def collect(self) -> Dict[str, Any]:
         """
-        Collect file information from watched directories.
+        Collect the files section of a snapshot.
         
         Returns:
-            List of file dictionaries with path, hash, size, mtime.
+            {'tree': digest tree, 'entries': file entries sorted by path},
+            or an error marker. Entries are a list, or an EntrySpool when
+            there are more than spill_threshold of them.
+        """
+        try:
+            entries = self._gather()
+            tree = build_tree(entries)
+        except Exception as e:
+            return {'error': f'FilesCollector failed: {str(e)}'}
+        
+        if isinstance(entries, EntrySpool):
+            # Identical entries share one copy in storage
+            entries.key = tree['hash']
+        return {'tree': tree, 'entries': entries}
+
+    def collect_entries(self) -> List[Dict[str, Any]]:
         """
-        files = []
-        file_count = 0
+        Collect file information from watched directories, in memory.
         
+        Returns:
+            List of file dictionaries with path, hash, size, mtime, sorted by path.
+        """
         try:
-            for watch_dir in self.watch_dirs:
-                if not os.path.exists(watch_dir):
-                    continue
-                    
-                for root, dirs, filenames in os.walk(watch_dir):
-                    # Skip hidden and ignored directories
-                    dirs[:] = [d for d in dirs if not d.startswith('.') and d not in self.ignore_extensions]
-                    
-                    for filename in filenames:
-                        if file_count >= self.max_files:
-                            break
-                            
-                        # Skip hidden files and ignored extensions
-                        if filename.startswith('.'):
-                            continue
-                            
-                        file_path = os.path.join(root, filename)
-                        
-                        # Skip if extension is ignored
-                        if any(ignored in file_path for ignored in self.ignore_extensions):
-                            continue
-                            
-                        try:
-                            # Get file stats
-                            stat = os.stat(file_path)
-                            
-                            # Skip very large files (>10MB) to avoid memory issues
-                            if stat.st_size > 10 * 1024 * 1024:
-                                continue
-                                
-                            # Calculate file hash for small files only
-                            file_hash = None
-                            if stat.st_size < 1024 * 1024:  # 1MB limit
-                                try:
-                                    with open(file_path, 'rb') as f:
-                                        content = f.read()
-                                        file_hash = hashlib.md5(content).hexdigest()
-                                except (IOError, OSError):
-                                    file_hash = 'unreadable'
-                            else:
-                                file_hash = 'large_file'
-                                
-                            # Make path relative to watch directory
-                            rel_path = os.path.relpath(file_path, watch_dir)
-                            
-                            files.append({
-                                'path': rel_path,
-                                'hash': file_hash,
-                                'size': stat.st_size,
-                                'mtime': stat.st_mtime
-                            })
-                            
-                            file_count += 1
-                            
-                        except (OSError, IOError):
-                            # Skip files we can't read
-                            continue
-                            
-                    if file_count >= self.max_files:
-                        break
-                        
+            files = [entry for batch in self._entry_batches() for entry in batch]
         except Exception as e:
             return [{'error': f'FilesCollector failed: {str(e)}'}]
         
         # Sort by path for consistent ordering
         files.sort(key=lambda x: x.get('path', ''))
-        return files
\ No newline at end of file
+        return files
+
+    def _gather(self) -> Union[List[Dict[str, Any]], EntrySpool]:
+        """Collect entries in memory, spilling them to disk past spill_threshold."""
+        files: List[Dict[str, Any]] = []
+        spool = None
+        try:
+            for batch in self._entry_batches():
+                if spool is not None:
+                    spool.add(batch)
+                    continue
+                files.extend(batch)
+                if self.spill_threshold is not None and len(files) > self.spill_threshold:
+                    spool_dir = str(get_data_dir())
+                    self._sweep_spools(spool_dir)
+                    spool = EntrySpool(spool_dir)
+                    spool.add(files)
+                    files = []
+        except BaseException:
+            if spool is not None:
+                spool.close()
+            raise
+        
+        if spool is None:
+            files.sort(key=lambda x: x.get('path', ''))
+            return files
+        spool.finish()
+        return spool
+
+    def _sweep_spools(self, directory: str) -> None:
+        """Delete stale spools from earlier processes, once per collector; best effort."""
+        if self._swept:
+            return
+        self._swept = True
+        sweep_spools(directory)
+
+    def _entry_batches(self) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Walk the watched directories and yield entries a batch at a time.
+        
+        Each batch is stat'ed during the walk, then looked up in the hash
+        cache and hashed on a thread pool shared by the whole walk.
+        """
+        cache = FileHashCache(self.cache_path) if self.hash_cache else None
+        pool = None
+        if self.hash_workers > 1:
+            pool = ThreadPoolExecutor(max_workers=self.hash_workers, thread_name_prefix='envdiff-hash')
+        # Ignore files and checkouts may have changed since the last collect
+        self._matchers = {}
+        self._git_dirs = {}
+        
+        try:
+            batch = []
+            total = 0
+            for watch_dir in self.watch_dirs:
+                if not os.path.isdir(watch_dir):
+                    continue
+                
+                # Ignored directories and files never reach this loop
+                for entry in self._matcher(watch_dir).walk():
+                    if self.max_files is not None and total >= self.max_files:
+                        break
+                    try:
+                        # Get file stats
+                        stat = entry.stat()
+                    except (OSError, IOError):
+                        # Skip files we can't read
+                        continue
+                    batch.append((entry.path, watch_dir, stat))
+                    total += 1
+                    if len(batch) >= BATCH_SIZE:
+                        yield self._hashed_batch(batch, cache, pool)
+                        batch = []
+            
+            if batch:
+                yield self._hashed_batch(batch, cache, pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if cache is not None:
+                try:
+                    cache.close()
+                except Exception:
+                    # A broken cache must never fail the snapshot
+                    pass
+
+    def _hashed_batch(self, batch: List[Tuple[str, str, os.stat_result]], cache: Optional[FileHashCache],
+                      pool: Optional[ThreadPoolExecutor]) -> List[Dict[str, Any]]:
+        """Build the entries of one batch, then write its cache updates so they never pile up."""
+        entries = self._file_entries(batch, cache, pool)
+        if cache is not None:
+            try:
+                cache.flush(evict=False)
+            except Exception:
+                # A broken cache must never fail the snapshot
+                pass
+        return entries
+
+    def skip_dir(self, path: str) -> bool:
+        """Check whether a directory, or one above it, is excluded from collection."""
+        return self._skip(path, True)
+
+    def skip_file(self, file_path: str) -> bool:
+        """Check whether a file, or a directory above it, is excluded from collection."""
+        return self._skip(file_path, False)
+
+    def _skip(self, path: str, is_dir: bool) -> bool:
+        """Match a path against the ignore rules of the watched directory containing it."""
+        path = os.path.abspath(path)
+        for watch_dir in self.watch_dirs:
+            root = os.path.abspath(watch_dir)
+            if path.startswith(root.rstrip(os.sep) + os.sep):
+                return self._matcher(watch_dir).is_ignored(os.path.relpath(path, root), is_dir)
+        return False
+
+    def _matcher(self, watch_dir: str) -> IgnoreMatcher:
+        """Return the ignore matcher of a watched directory."""
+        matcher = self._matchers.get(watch_dir)
+        if matcher is None:
+            matcher = IgnoreMatcher(watch_dir, self.ignore_patterns, self.ignore_files)
+            self._matchers[watch_dir] = matcher
+        return matcher
+
+    def _checkout(self, watch_dir: str) -> Optional[Tuple[Optional[GitIndex], str]]:
+        """
+        Return the git index of the checkout holding a watched directory.
+        
+        Returns:
+            (parsed index, or None if it is missing or unusable; prefix of
+            the watched directory within the work tree), or None if the
+            directory is not in a git checkout or git_index is off.
+        """
+        if not self.git_index:
+            return None
+        if watch_dir not in self._git_dirs:
+            self._git_dirs[watch_dir] = find_git_dir(watch_dir)
+        found = self._git_dirs[watch_dir]
+        if found is None:
+            return None
+        root, git_dir = found
+        
+        prefix = os.path.relpath(os.path.abspath(watch_dir), root)
+        prefix = '' if prefix == '.' else prefix + os.sep
+        try:
+            stat = os.stat(os.path.join(git_dir, 'index'))
+        except OSError:
+            return None, prefix
+        # Reparse only when git has rewritten the index
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        cached = self._git_indexes.get(git_dir)
+        if cached is None or cached[0] != signature:
+            cached = (signature, GitIndex.load(root, git_dir))
+            self._git_indexes[git_dir] = cached
+        return cached[1], prefix
+
+    def _file_entry(self, file_path: str, watch_dir: str,
+                    cache: Optional[FileHashCache]) -> Optional[Dict[str, Any]]:
+        """Stat and hash one file, returning its entry or None if it is skipped."""
+        try:
+            # Get file stats
+            stat = os.stat(file_path)
+        except (OSError, IOError):
+            # Skip files we can't read
+            return None
+        
+        entries = self._file_entries([(file_path, watch_dir, stat)], cache)
+        return entries[0] if entries else None
+
+    def _file_entries(self, candidates: List[Tuple[str, str, os.stat_result]],
+                      cache: Optional[FileHashCache],
+                      pool: Optional[ThreadPoolExecutor] = None) -> List[Dict[str, Any]]:
+        """
+        Build entries for stat'ed files, hashing cache misses on the pool if given.
+        
+        Cache lookups and writes stay on the calling thread (the cache's
+        SQLite connection is not shared); only hashing runs on the pool.
+        """
+        hashes: Dict[str, str] = {}
+        to_hash = []
+        checkouts = {watch_dir: self._checkout(watch_dir) for _, watch_dir, _ in candidates}
+        
+        for file_path, watch_dir, stat in candidates:
+            if self.max_file_size is not None and stat.st_size > self.max_file_size:
+                hashes[file_path] = TOO_LARGE
+                continue
+            checkout = checkouts[watch_dir]
+            algorithm = self.algorithm if checkout is None else GIT_BLOB
+            if checkout is not None and checkout[0] is not None:
+                # Clean tracked files take their blob SHA from the index
+                indexed = checkout[0].lookup(checkout[1] + os.path.relpath(file_path, watch_dir), stat)
+                if indexed is not None:
+                    hashes[file_path] = indexed
+                    continue
+            cached = self._cached_hash(stat, algorithm, cache)
+            if cached is not None:
+                hashes[file_path] = cached
+            else:
+                to_hash.append((file_path, stat, algorithm))
+        
+        paths = [path for path, _, _ in to_hash]
+        algorithms = [algorithm for _, _, algorithm in to_hash]
+        if len(to_hash) > 1 and pool is not None:
+            digests = list(pool.map(self._hash_file, paths, algorithms))
+        else:
+            digests = [self._hash_file(path, algorithm) for path, algorithm in zip(paths, algorithms)]
+        
+        for (file_path, stat, algorithm), digest in zip(to_hash, digests):
+            hashes[file_path] = digest
+            if cache is not None and digest != 'unreadable':
+                cache.store(stat, algorithm, digest)
+        
+        return [{
+            # Make path relative to watch directory
+            'path': os.path.relpath(file_path, watch_dir),
+            'hash': hashes[file_path],
+            'size': stat.st_size,
+            'mtime': stat.st_mtime
+        } for file_path, watch_dir, stat in candidates]
+
+    def refresh(self, entries: List[Dict[str, Any]], paths: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Update a previously collected file list for a set of touched paths.
+        
+        Only the given paths are re-stat'ed and, if their stat data changed,
+        re-hashed. A touched directory is walked, since files may have been
+        moved into it. A touched ignore file changes what is collected, so
+        it triggers a full collect instead.
+        
+        Args:
+            entries: File list returned by an earlier collect() or refresh().
+            paths: Absolute paths reported as created, modified, moved or deleted.
+            
+        Returns:
+            New sorted file list.
+        """
+        paths = [os.path.abspath(path) for path in paths]
+        if any(os.path.basename(path) in self.ignore_files for path in paths):
+            return self.collect_entries()
+        
+        by_path = {entry['path']: entry for entry in entries if 'path' in entry}
+        cache = FileHashCache(self.cache_path) if self.hash_cache else None
+        
+        try:
+            for path in paths:
+                watch_dir = self._owning_watch_dir(path)
+                if watch_dir is None:
+                    continue
+                rel_path = os.path.relpath(path, watch_dir)
+                
+                if os.path.isdir(path):
+                    if not self.skip_dir(path):
+                        for entry in self._matcher(watch_dir).walk(rel_path if rel_path != '.' else ''):
+                            self._refresh_one(by_path, entry.path, watch_dir, cache)
+                    continue
+                
+                # A deleted or moved-away directory drops everything beneath it
+                prefix = rel_path + os.sep
+                for stale in [p for p in by_path if p.startswith(prefix)]:
+                    del by_path[stale]
+                self._refresh_one(by_path, path, watch_dir, cache)
+        finally:
+            if cache is not None:
+                try:
+                    cache.close()
+                except Exception:
+                    pass
+        
+        return sorted(by_path.values(), key=lambda x: x.get('path', ''))
+
+    def _refresh_one(self, by_path: Dict[str, Dict[str, Any]], file_path: str,
+                     watch_dir: str, cache: Optional[FileHashCache]) -> None:
+        """Re-stat a single file and update or drop its entry."""
+        rel_path = os.path.relpath(file_path, watch_dir)
+        entry = None
+        if not self.skip_file(file_path) and os.path.isfile(file_path):
+            if rel_path in by_path or self.max_files is None or len(by_path) < self.max_files:
+                entry = self._file_entry(file_path, watch_dir, cache)
+        
+        if entry is None:
+            by_path.pop(rel_path, None)
+        else:
+            by_path[rel_path] = entry
+
+    def _owning_watch_dir(self, path: str) -> Optional[str]:
+        """Return the watched directory containing a path, if any."""
+        for watch_dir in self.watch_dirs:
+            root = os.path.abspath(watch_dir)
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                # Paths under ignored directories are never collected
+                parent = os.path.dirname(os.path.relpath(path, root))
+                if parent and self._matcher(watch_dir).is_ignored(parent, True):
+                    return None
+                return watch_dir
+        return None
+
+    def _cached_hash(self, stat: os.stat_result, algorithm: str,
+                     cache: Optional[FileHashCache]) -> Optional[str]:
+        """Return the cached digest for a file whose stat data is unchanged, if any."""
+        if cache is None:
+            return None
+        try:
+            return cache.lookup(stat, algorithm)
+        except Exception:
+            return None
+
+    def _hash_file(self, file_path: str, algorithm: str) -> str:
+        """Hash a file's contents, or return 'unreadable' if it cannot be read."""
+        try:
+            return hash_file(file_path, algorithm)
+        except (IOError, OSError):
+            return 'unreadable'
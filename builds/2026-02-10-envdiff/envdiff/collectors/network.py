@@ -2,52 +2,278 @@
 Network collector - captures network connections and listening ports.
 """
 
+import os
+import socket
+import struct
+import sys
+import threading
 import psutil
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
+
+PROC_NET = '/proc/net'
+
+# /proc/net/<table> -> (address family, is TCP)
+PROC_NET_TABLES = {
+    'tcp': (socket.AF_INET, True),
+    'tcp6': (socket.AF_INET6, True),
+    'udp': (socket.AF_INET, False),
+    'udp6': (socket.AF_INET6, False),
+}
+
+# TCP states from include/net/tcp_states.h, named as psutil names them
+TCP_STATES = {
+    0x01: 'ESTABLISHED',
+    0x02: 'SYN_SENT',
+    0x03: 'SYN_RECV',
+    0x04: 'FIN_WAIT1',
+    0x05: 'FIN_WAIT2',
+    0x06: 'TIME_WAIT',
+    0x07: 'CLOSE',
+    0x08: 'CLOSE_WAIT',
+    0x09: 'LAST_ACK',
+    0x0A: 'LISTEN',
+    0x0B: 'CLOSING',
+    0x0C: 'NEW_SYN_RECV',
+}
+
+# psutil reports UDP sockets without a state
+UDP_STATUS = 'NONE'
+
+# (is TCP, (local ip, local port) or None, (remote ip, remote port) or None, status, inode or pid)
+SocketRow = Tuple[bool, Optional[Tuple[str, int]], Optional[Tuple[str, int]], str, Optional[int]]
+
+
+def proc_net_available() -> bool:
+    """Check whether the /proc/net backend can be used."""
+    return sys.platform.startswith('linux') and os.path.isfile(os.path.join(PROC_NET, 'tcp'))
+
+
+def _decode_address(address: str, family: int) -> Optional[Tuple[str, int]]:
+    """
+    Decode a /proc/net address such as '0100007F:1F90'.
+
+    The IP is hex in host byte order, one 32-bit word at a time; the port
+    is big-endian hex. Port 0 means no address, as in psutil.
+    """
+    ip_hex, port_hex = address.split(':')
+    port = int(port_hex, 16)
+    if not port:
+        return None
+
+    packed = bytes.fromhex(ip_hex)
+    if sys.byteorder == 'little':
+        words = len(packed) // 4
+        packed = struct.pack(f'>{words}I', *struct.unpack(f'<{words}I', packed))
+    return socket.inet_ntop(family, packed), port
+
+
+def read_proc_net(proc_net: Optional[str] = None) -> Iterator[SocketRow]:
+    """
+    Parse the TCP and UDP socket tables under /proc/net.
+
+    Reading these tables costs time proportional to the number of sockets
+    only; unlike psutil.net_connections it does not walk every process's
+    file descriptors.
+
+    Args:
+        proc_net: Directory holding the tables. Defaults to PROC_NET.
+
+    Yields:
+        (is TCP, local, remote, status, inode) per socket.
+    """
+    proc_net = proc_net or PROC_NET
+    for table, (family, is_tcp) in PROC_NET_TABLES.items():
+        try:
+            with open(os.path.join(proc_net, table), 'r') as f:
+                lines = f.readlines()[1:]
+        except OSError:
+            # IPv6 disabled, or table not present in this namespace
+            continue
+
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 10:
+                continue
+            status = TCP_STATES.get(int(fields[3], 16), 'UNKNOWN') if is_tcp else UDP_STATUS
+            yield (
+                is_tcp,
+                _decode_address(fields[1], family),
+                _decode_address(fields[2], family),
+                status,
+                int(fields[9]),
+            )
+
+
+def scan_socket_owners(proc_dir: str = '/proc') -> Dict[int, int]:
+    """
+    Map socket inodes to the pid holding them, by reading /proc/<pid>/fd links.
+
+    Processes that exit or whose fds are not readable are skipped.
+    """
+    owners: Dict[int, int] = {}
+    with os.scandir(proc_dir) as entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            pid = int(entry.name)
+            fd_dir = f"{proc_dir}/{entry.name}/fd"
+            try:
+                fds = os.listdir(fd_dir)
+            except OSError:
+                continue
+            for fd in fds:
+                try:
+                    target = os.readlink(f"{fd_dir}/{fd}")
+                except OSError:
+                    continue
+                if target.startswith('socket:['):
+                    owners.setdefault(int(target[8:-1]), pid)
+    return owners
+
+
+def _format_address(address: Optional[Tuple[str, int]]) -> str:
+    """Format an (ip, port) pair as the collector reports it."""
+    return f"{address[0]}:{address[1]}" if address else ""
 
 
 class NetworkCollector:
-    """Collector for network connections and listening ports."""
+    """
+    Collector for network connections and listening ports.
+
+    On Linux the socket tables are parsed from /proc/net directly and
+    owning pids are resolved from /proc/<pid>/fd, with the result cached
+    by socket inode. In aggregate mode listeners are recorded in full and
+    all other connections are counted per (local port, remote host,
+    status), which keeps the section small however many sockets are open.
+    """
+
+    def __init__(self, backend: str = 'auto', resolve_pids: bool = True,
+                 aggregate: bool = False, limit: Optional[int] = 200):
+        """
+        Initialize the collector.
+
+        Args:
+            backend: 'proc' parses /proc/net (Linux), 'psutil' uses
+                psutil.net_connections, 'auto' uses /proc/net when available.
+            resolve_pids: Look up the pid owning each reported socket.
+            aggregate: Record listeners in full and count other connections
+                per (local port, remote host, status).
+            limit: Maximum connections reported when not aggregating.
+                None reports every connection.
+        """
+        self.backend = backend
+        self.resolve_pids = resolve_pids
+        self.aggregate = aggregate
+        self.limit = limit
+        # inode -> pid (None when no readable process holds it)
+        self._owners: Dict[int, Optional[int]] = {}
+        self._lock = threading.Lock()
 
     def collect(self) -> List[Dict[str, Any]]:
         """
         Collect information about network connections.
-        
+
         Returns:
-            List of connection dictionaries with local, remote, status, pid.
+            List of connection dictionaries with local, remote, status, pid,
+            or in aggregate mode listeners plus per-group connection counts.
         """
-        connections = []
-        
         try:
-            # Get all network connections
-            for conn in psutil.net_connections(kind='inet'):
-                try:
-                    # Format local address
-                    local = f"{conn.laddr.ip}:{conn.laddr.port}" if conn.laddr else ""
-                    
-                    # Format remote address  
-                    remote = f"{conn.raddr.ip}:{conn.raddr.port}" if conn.raddr else ""
-                    
-                    # Get connection status
-                    status = conn.status if conn.status else "UNKNOWN"
-                    
-                    connections.append({
-                        'local': local,
-                        'remote': remote,
-                        'status': status,
-                        'pid': conn.pid if conn.pid else None
-                    })
-                    
-                except (AttributeError, psutil.AccessDenied):
-                    # Some connections may not have full info - skip them
-                    continue
-                    
+            use_proc = self.backend == 'proc' or (self.backend == 'auto' and proc_net_available())
+            rows = list(read_proc_net() if use_proc else self._read_psutil())
+
+            if self.aggregate:
+                return self._aggregate(rows, use_proc)
+
+            # Sort by local address for consistent ordering, and limit to a
+            # reasonable number before resolving pids, which may scan /proc
+            rows.sort(key=lambda row: (_format_address(row[1]), row[3]))
+            if self.limit is not None:
+                rows = rows[:self.limit]
+            return self._connections(rows, use_proc)
+
         except Exception as e:
             # If network collection fails entirely, return error marker
             return [{'error': f'NetworkCollector failed: {str(e)}'}]
-        
-        # Sort by local port for consistent ordering
-        connections.sort(key=lambda x: (x.get('local', ''), x.get('status', '')))
-        
-        # Limit to reasonable number to avoid huge snapshots
-        return connections[:200]
\ No newline at end of file
+
+    def _read_psutil(self) -> Iterator[SocketRow]:
+        """Read connections through psutil.net_connections."""
+        # Get all network connections
+        for conn in psutil.net_connections(kind='inet'):
+            try:
+                yield (
+                    conn.type == socket.SOCK_STREAM,
+                    (conn.laddr.ip, conn.laddr.port) if conn.laddr else None,
+                    (conn.raddr.ip, conn.raddr.port) if conn.raddr else None,
+                    # Get connection status
+                    conn.status if conn.status else "UNKNOWN",
+                    conn.pid if conn.pid else None,
+                )
+            except (AttributeError, psutil.AccessDenied):
+                # Some connections may not have full info - skip them
+                continue
+
+    def _connections(self, rows: List[SocketRow], use_proc: bool) -> List[Dict[str, Any]]:
+        """Build one entry per socket, resolving /proc inodes to pids if enabled."""
+        pids: Dict[int, Optional[int]] = {}
+        if use_proc and self.resolve_pids:
+            pids = self._resolve([row[4] for row in rows])
+
+        return [{
+            'local': _format_address(local),
+            'remote': _format_address(remote),
+            'status': status,
+            'pid': pids.get(owner) if use_proc else owner,
+        } for _, local, remote, status, owner in rows]
+
+    def _resolve(self, inodes: Iterable[int]) -> Dict[int, Optional[int]]:
+        """
+        Return the owning pid of each socket inode.
+
+        Owners are cached by inode. /proc is only scanned when an inode has
+        not been seen before, and inodes that no longer exist are dropped.
+        """
+        wanted = {inode for inode in inodes if inode}
+        with self._lock:
+            if wanted - self._owners.keys():
+                owners = scan_socket_owners()
+                # Remember misses too, so unreadable sockets do not force a rescan
+                self._owners.update({inode: owners.get(inode) for inode in wanted})
+            self._owners = {inode: self._owners.get(inode) for inode in wanted}
+            return dict(self._owners)
+
+    def _aggregate(self, rows: List[SocketRow], use_proc: bool) -> List[Dict[str, Any]]:
+        """
+        Summarise sockets as full listener entries plus counted connection groups.
+
+        Connections to a local listening port are grouped under that port and
+        the remote host. Outgoing connections use ephemeral local ports, so
+        they are grouped under '*' and the remote host:port instead.
+        """
+        listeners = []
+        listening_ports: Set[int] = set()
+        connected = []
+
+        for row in rows:
+            is_tcp, local, remote, status, _ = row
+            if status == 'LISTEN' or (not is_tcp and remote is None):
+                listeners.append(row)
+                if local:
+                    listening_ports.add(local[1])
+            else:
+                connected.append(row)
+
+        entries = self._connections(listeners, use_proc)
+
+        counts: Dict[Tuple[str, str, str], int] = {}
+        for _, local, remote, status, _ in connected:
+            if local and local[1] in listening_ports:
+                group = (f"*:{local[1]}", remote[0] if remote else "", status)
+            else:
+                group = ("*", _format_address(remote), status)
+            counts[group] = counts.get(group, 0) + 1
+
+        for (local, remote, status), count in counts.items():
+            entries.append({'local': local, 'remote': remote, 'status': status, 'count': count})
+
+        entries.sort(key=lambda x: (x.get('local', ''), x.get('status', ''), x.get('remote', '')))
+        return entries
@@ -2,85 +2,608 @@
 Packages collector - captures installed package versions for pip, npm, brew.
 """
 
-import subprocess
+import asyncio
+import functools
+import glob
+import os
+import shutil
+import site
+import sqlite3
+import sys
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+
+from ..pkgcache import PackageCache, directory_fingerprint
+
+# (returncode, stdout), or None if the tool is missing, failed to start or timed out
+CommandResult = Optional[Tuple[int, str]]
+
+PIP_COMMAND = ['pip3', 'list', '--format=json']
+NPM_COMMAND = ['npm', 'list', '-g', '--depth=0', '--json']
+BREW_COMMAND = ['brew', 'list', '--versions']
+
+# Package managers in the order they appear in the section
+MANAGERS = ('pip', 'npm', 'brew')
+
+
+@functools.lru_cache(maxsize=None)
+def _which(tool: str, path: Optional[str]) -> Optional[str]:
+    """Cached shutil.which, keyed on PATH as well as the tool."""
+    return shutil.which(tool, path=path)
+
+
+def which(tool: str) -> Optional[str]:
+    """
+    Locate a tool on PATH, once per process.
+    
+    Missing package managers are remembered, so they cost nothing on later
+    snapshots. The lookup is repeated only if PATH itself changes.
+    """
+    return _which(tool, os.environ.get('PATH'))
+
+
+async def _run_command(argv: List[str]) -> CommandResult:
+    """Run one command, killing it if the caller cancels."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+    except OSError:
+        return None
+    
+    try:
+        stdout, _ = await proc.communicate()
+    except asyncio.CancelledError:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+        raise
+    
+    return proc.returncode, stdout.decode('utf-8', 'replace')
+
+
+async def _run_all(commands: Dict[str, List[str]], timeout: float) -> Dict[str, CommandResult]:
+    """Run commands concurrently and cancel whatever is still running at the deadline."""
+    tasks = {name: asyncio.ensure_future(_run_command(argv)) for name, argv in commands.items()}
+    _, pending = await asyncio.wait(list(tasks.values()), timeout=timeout)
+    
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    
+    return {name: None if task in pending or task.exception() else task.result()
+            for name, task in tasks.items()}
+
+
+def run_commands(commands: Dict[str, List[str]], timeout: float = 30.0) -> Dict[str, CommandResult]:
+    """
+    Run several commands concurrently as asyncio subprocesses.
+    
+    Args:
+        commands: Command argv per name.
+        timeout: Overall deadline in seconds; commands still running then are killed.
+        
+    Returns:
+        (returncode, stdout) per name, or None for tools that are not
+        installed, failed to start or missed the deadline.
+    """
+    results: Dict[str, CommandResult] = {name: None for name in commands}
+    
+    runnable = {}
+    for name, argv in commands.items():
+        executable = which(argv[0])
+        if executable:
+            runnable[name] = [executable, *argv[1:]]
+    
+    if runnable:
+        results.update(asyncio.run(_run_all(runnable, timeout)))
+    return results
+
+
+def find_site_packages(location: str) -> List[str]:
+    """
+    Resolve a venv, prefix, interpreter or site-packages path to its site-packages dirs.
+    
+    Args:
+        location: A site-packages directory, a venv/prefix directory, or the
+            path of a python executable inside one.
+            
+    Returns:
+        List of existing site-packages directories.
+    """
+    location = os.path.abspath(os.path.expanduser(location))
+    
+    if os.path.isfile(location):
+        # bin/python -> prefix (POSIX), Scripts/python.exe -> prefix (Windows)
+        location = os.path.dirname(os.path.dirname(location))
+    
+    if os.path.basename(location) in ('site-packages', 'dist-packages'):
+        return [location] if os.path.isdir(location) else []
+    
+    patterns = [
+        os.path.join(location, 'lib', 'python*', 'site-packages'),
+        os.path.join(location, 'lib64', 'python*', 'site-packages'),
+        os.path.join(location, 'Lib', 'site-packages'),
+    ]
+    found = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            if os.path.isdir(path) and path not in found:
+                found.append(path)
+    return found
+
+
+def default_site_packages() -> List[str]:
+    """
+    Return the site-packages directories of the python3 on PATH, as pip3 would list them.
+    
+    When python3 lives next to the running interpreter, the site module
+    answers (including the user site). Any other python3 is resolved
+    through its prefix; an empty list (a shim, a Debian system python)
+    leaves the auto backend to run pip3 itself.
+    """
+    python = which('python3')
+    if python is None:
+        return []
+    if os.path.dirname(os.path.abspath(python)) != os.path.dirname(os.path.abspath(sys.executable)):
+        return find_site_packages(python)
+    
+    paths = []
+    try:
+        paths.extend(site.getsitepackages())
+    except AttributeError:
+        # Old virtualenv builds ship a site module without getsitepackages
+        pass
+    try:
+        paths.append(site.getusersitepackages())
+    except AttributeError:
+        pass
+    return [p for p in dict.fromkeys(paths) if os.path.isdir(p)]
+
+
+def _read_metadata_header(path: str) -> Dict[str, str]:
+    """Read the Name and Version headers from a METADATA or PKG-INFO file."""
+    headers = {}
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if not line.strip():
+                # Headers end at the first blank line; the body is the long description
+                break
+            key, sep, value = line.partition(':')
+            if sep and key in ('Name', 'Version'):
+                headers[key] = value.strip()
+                if len(headers) == 2:
+                    break
+    return headers
+
+
+def read_distributions(site_dirs: List[str]) -> Dict[str, str]:
+    """
+    Enumerate installed distributions from dist-info and egg-info metadata.
+    
+    Args:
+        site_dirs: site-packages directories to scan. Earlier directories win
+            when a distribution is installed in more than one of them.
+            
+    Returns:
+        Dictionary of distribution name to version.
+    """
+    packages = {}
+    
+    for site_dir in site_dirs:
+        try:
+            entries = os.listdir(site_dir)
+        except OSError:
+            continue
+        
+        for entry in entries:
+            if entry.endswith('.dist-info'):
+                metadata_path = os.path.join(site_dir, entry, 'METADATA')
+            elif entry.endswith('.egg-info'):
+                metadata_path = os.path.join(site_dir, entry)
+                if os.path.isdir(metadata_path):
+                    metadata_path = os.path.join(metadata_path, 'PKG-INFO')
+            else:
+                continue
+            
+            try:
+                headers = _read_metadata_header(metadata_path)
+            except OSError:
+                continue
+            
+            name = headers.get('Name')
+            version = headers.get('Version')
+            if name and version and name not in packages:
+                packages[name] = version
+    
+    return packages
+
+
+def find_npm_global_modules() -> Optional[str]:
+    """
+    Locate the global node_modules directory without running npm.
+    
+    The prefix comes from NPM_CONFIG_PREFIX, a prefix= line in ~/.npmrc, or
+    the install prefix of the node binary on PATH, as npm itself defaults.
+    
+    Returns:
+        The global node_modules directory, or None if it cannot be found.
+    """
+    prefix = os.environ.get('NPM_CONFIG_PREFIX') or os.environ.get('npm_config_prefix')
+    
+    if not prefix:
+        try:
+            with open(os.path.expanduser('~/.npmrc'), 'r', encoding='utf-8') as f:
+                for line in f:
+                    key, sep, value = line.partition('=')
+                    if sep and key.strip() == 'prefix':
+                        prefix = os.path.expanduser(value.strip())
+        except OSError:
+            pass
+    
+    if not prefix:
+        node = which('node')
+        if not node:
+            return None
+        node = os.path.realpath(node)
+        # <prefix>/bin/node on POSIX, <prefix>/node.exe on Windows
+        prefix = os.path.dirname(node) if os.name == 'nt' else os.path.dirname(os.path.dirname(node))
+    
+    modules = os.path.join(prefix, 'node_modules') if os.name == 'nt' else os.path.join(prefix, 'lib', 'node_modules')
+    return modules if os.path.isdir(modules) else None
+
+
+def find_brew_cellars() -> List[str]:
+    """
+    Locate the Homebrew Cellar and Caskroom directories without running brew.
+    
+    Returns:
+        Existing directories under the prefix of the brew on PATH (or
+        HOMEBREW_CELLAR), empty when Homebrew is not installed.
+    """
+    cellar = os.environ.get('HOMEBREW_CELLAR')
+    if not cellar:
+        brew = which('brew')
+        if not brew:
+            return []
+        # <prefix>/bin/brew; not resolved, since bin/brew links into <prefix>/Homebrew on Intel Macs
+        cellar = os.path.join(os.path.dirname(os.path.dirname(brew)), 'Cellar')
+    
+    candidates = [cellar, os.path.join(os.path.dirname(cellar), 'Caskroom')]
+    return [path for path in candidates if os.path.isdir(path)]
+
+
+def _package_dirs(node_modules: str) -> Tuple[List[str], List[str]]:
+    """
+    List the package directories directly under a node_modules directory.
+    
+    Returns:
+        (package directories, @scope directories), with scoped packages
+        such as @org/name included in the package directories.
+    """
+    packages = []
+    scopes = []
+    for entry in sorted(os.listdir(node_modules)):
+        if entry.startswith('.'):
+            # .bin, .package-lock.json, npm's staging directories
+            continue
+        path = os.path.join(node_modules, entry)
+        if entry.startswith('@'):
+            try:
+                scoped = sorted(os.listdir(path))
+            except OSError:
+                continue
+            scopes.append(path)
+            packages.extend(os.path.join(path, name) for name in scoped if not name.startswith('.'))
+        else:
+            packages.append(path)
+    return packages, scopes
+
+
+def read_node_modules(node_modules: str) -> Dict[str, str]:
+    """
+    Read top-level package names and versions from a node_modules directory.
+    
+    Args:
+        node_modules: Directory to scan, e.g. the global or a project node_modules.
+        
+    Returns:
+        Dictionary of package name to version.
+    """
+    packages = {}
+    try:
+        package_dirs, _ = _package_dirs(node_modules)
+    except OSError:
+        return packages
+    
+    for package_dir in package_dirs:
+        try:
+            with open(os.path.join(package_dir, 'package.json'), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(manifest, dict) or not isinstance(manifest.get('version'), str):
+            continue
+        
+        name = manifest.get('name')
+        if not isinstance(name, str):
+            name = os.path.relpath(package_dir, node_modules).replace(os.sep, '/')
+        packages[name] = manifest['version']
+    
+    return packages
 
 
 class PackagesCollector:
     """Collector for installed packages across different package managers."""
 
+    def __init__(self, python_envs: Optional[List[str]] = None, pip_backend: str = 'auto',
+                 timeout: float = 30.0, npm_backend: str = 'auto',
+                 npm_projects: Optional[List[str]] = None,
+                 package_cache: bool = True, cache_path: Optional[str] = None):
+        """
+        Initialize packages collector.
+        
+        Args:
+            python_envs: Venvs, prefixes, interpreters or site-packages dirs to
+                inventory. Defaults to those of the python3 on PATH.
+            pip_backend: 'metadata' reads dist-info/egg-info directly,
+                'subprocess' runs pip3, 'auto' reads metadata and falls back
+                to pip3 when no site-packages directory is found.
+            timeout: Overall deadline in seconds for the package-manager
+                subprocesses, which run concurrently.
+            npm_backend: 'manifest' reads package.json files under the global
+                node_modules, 'subprocess' runs npm list -g, 'auto' reads
+                manifests and falls back to npm when no global node_modules
+                directory is found.
+            npm_projects: Project directories whose node_modules are also
+                inventoried, reported under 'npm_projects'.
+            package_cache: Reuse inventories, persisted between runs, while the
+                install directories they were read from are unchanged.
+            cache_path: Path to the package cache database. Defaults to the data directory.
+        """
+        self.python_envs = python_envs
+        self.pip_backend = pip_backend
+        self.timeout = timeout
+        self.npm_backend = npm_backend
+        self.npm_projects = npm_projects
+        self.package_cache = package_cache
+        self.cache_path = cache_path
+        # node_modules path -> (@scope dirs, mtimes of node_modules and scopes, packages)
+        self._npm_cache: Dict[str, Tuple[List[str], Tuple[int, ...], Dict[str, str]]] = {}
+
+    def _site_dirs(self) -> List[str]:
+        """Return the site-packages directories to inventory."""
+        if not self.python_envs:
+            return default_site_packages()
+        
+        dirs = []
+        for location in self.python_envs:
+            for path in find_site_packages(location):
+                if path not in dirs:
+                    dirs.append(path)
+        return dirs
+
     def collect(self) -> Dict[str, Dict[str, str]]:
         """
         Collect installed packages from pip, npm, and brew.
         
+        The package managers that have to be run as subprocesses run
+        concurrently under one overall deadline.
+        
         Returns:
             Dictionary with package managers as keys and package:version dicts as values.
         """
-        packages = {
-            'pip': {},
-            'npm': {},  
-            'brew': {}
-        }
+        cache = PackageCache(self.cache_path) if self.package_cache else None
         
-        # Collect pip packages
         try:
-            result = subprocess.run(
-                ['pip3', 'list', '--format=json'], 
-                capture_output=True, 
-                text=True, 
-                timeout=30
-            )
-            if result.returncode == 0:
-                pip_packages = json.loads(result.stdout)
+            # Resolved once per collect: fingerprinting and reading both use them
+            site_dirs = self._site_dirs() if self.pip_backend != 'subprocess' else []
+            fingerprints = self._fingerprints(site_dirs) if cache is not None else {}
+            packages = self._cached_inventories(cache, fingerprints)
+            fresh = [manager for manager in MANAGERS if manager not in packages]
+            
+            commands = {}
+            if 'pip' in fresh:
+                pip = self._read_pip_metadata(site_dirs)
+                if pip is None:
+                    commands['pip'] = PIP_COMMAND
+                else:
+                    packages['pip'] = pip
+            if 'npm' in fresh:
+                npm = self._read_npm_manifests()
+                if npm is None:
+                    commands['npm'] = NPM_COMMAND
+                else:
+                    packages['npm'] = npm
+            if 'brew' in fresh:
+                commands['brew'] = BREW_COMMAND
+            
+            results = run_commands(commands, self.timeout) if commands else {}
+            parsers = {'pip': self._parse_pip, 'npm': self._parse_npm, 'brew': self._parse_brew}
+            for manager, result in results.items():
+                packages[manager] = parsers[manager](result)
+            
+            self._store_inventories(cache, fingerprints, {m: packages[m] for m in fresh})
+        finally:
+            if cache is not None:
+                try:
+                    cache.close()
+                except Exception:
+                    pass
+        
+        packages = {manager: packages[manager] for manager in MANAGERS}
+        
+        if self.npm_projects:
+            packages['npm_projects'] = {
+                os.path.abspath(project): self._read_node_modules_cached(
+                    os.path.join(os.path.abspath(project), 'node_modules'))
+                for project in self.npm_projects
+            }
+        
+        return packages
+
+    def _fingerprints(self, site_dirs: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Fingerprint each package manager's install directories.
+        
+        Args:
+            site_dirs: The site-packages directories pip packages are read from.
+        
+        A manager whose inventory cannot be tied to directories (pip3 or npm
+        run as subprocesses) gets None and is never cached.
+        """
+        fingerprints: Dict[str, Optional[str]] = {'pip': None, 'npm': None, 'brew': None}
+        
+        if site_dirs:
+            fingerprints['pip'] = directory_fingerprint(site_dirs)
+        
+        if self.npm_backend != 'subprocess':
+            node_modules = find_npm_global_modules()
+            if node_modules is not None:
+                try:
+                    _, scopes = _package_dirs(node_modules)
+                    fingerprints['npm'] = directory_fingerprint([node_modules, *scopes])
+                except OSError:
+                    pass
+        
+        cellars = find_brew_cellars()
+        if cellars:
+            fingerprints['brew'] = directory_fingerprint(cellars, children_of=cellars)
+        
+        return fingerprints
+
+    def _cached_inventories(self, cache: Optional[PackageCache],
+                            fingerprints: Dict[str, Optional[str]]) -> Dict[str, Dict[str, str]]:
+        """Return the inventories whose install directories are unchanged since they were cached."""
+        found = {}
+        for manager, fingerprint in fingerprints.items():
+            if fingerprint is None:
+                continue
+            try:
+                inventory = cache.get(manager, fingerprint)
+            except sqlite3.Error:
+                # A broken cache only costs a fresh collection
+                return found
+            if inventory is not None:
+                found[manager] = inventory
+        return found
+
+    def _store_inventories(self, cache: Optional[PackageCache], fingerprints: Dict[str, Optional[str]],
+                           inventories: Dict[str, Dict[str, str]]) -> None:
+        """Cache freshly collected inventories; failed collections are not cached."""
+        for manager, inventory in inventories.items():
+            fingerprint = fingerprints.get(manager)
+            if fingerprint is None or 'error' in inventory:
+                continue
+            try:
+                cache.put(manager, fingerprint, inventory)
+            except sqlite3.Error:
+                return
+
+    def _read_pip_metadata(self, site_dirs: List[str]) -> Optional[Dict[str, str]]:
+        """Read pip packages from the metadata in site_dirs, or return None if pip3 has to be run."""
+        if self.pip_backend != 'subprocess' and (site_dirs or self.pip_backend == 'metadata'):
+            return read_distributions(site_dirs)
+        return None
+
+    def _read_npm_manifests(self) -> Optional[Dict[str, str]]:
+        """Read global npm packages from their manifests, or return None if npm has to be run."""
+        if self.npm_backend == 'subprocess':
+            return None
+        
+        node_modules = find_npm_global_modules()
+        if node_modules is None:
+            return {} if self.npm_backend == 'manifest' else None
+        return self._read_node_modules_cached(node_modules)
+
+    def _read_node_modules_cached(self, node_modules: str) -> Dict[str, str]:
+        """
+        Read a node_modules directory, reusing the last result while it is unchanged.
+        
+        npm installs, upgrades and removes packages by renaming directories
+        into place, which updates the mtime of node_modules (or of the
+        @scope directory for scoped packages).
+        """
+        cached = self._npm_cache.get(node_modules)
+        if cached is not None:
+            scopes, mtimes, packages = cached
+            try:
+                if tuple(os.stat(path).st_mtime_ns for path in [node_modules, *scopes]) == mtimes:
+                    return dict(packages)
+            except OSError:
+                pass
+        
+        try:
+            _, scopes = _package_dirs(node_modules)
+            mtimes = tuple(os.stat(path).st_mtime_ns for path in [node_modules, *scopes])
+        except OSError:
+            return {}
+        
+        packages = read_node_modules(node_modules)
+        self._npm_cache[node_modules] = (scopes, mtimes, packages)
+        return dict(packages)
+
+    def _parse_pip(self, result: CommandResult) -> Dict[str, str]:
+        """Parse the output of pip3 list --format=json."""
+        if result is None:
+            return {'error': 'pip collection failed'}
+        
+        returncode, stdout = result
+        if returncode == 0:
+            try:
+                pip_packages = json.loads(stdout)
                 if isinstance(pip_packages, list):
-                    packages['pip'] = {
+                    return {
                         pkg['name']: pkg['version'] 
                         for pkg in pip_packages 
                         if isinstance(pkg, dict) and 'name' in pkg and 'version' in pkg
                     }
-        except (subprocess.TimeoutExpired, subprocess.CalledProcessError, json.JSONDecodeError, FileNotFoundError, TypeError, KeyError):
-            packages['pip'] = {'error': 'pip collection failed'}
+            except (json.JSONDecodeError, TypeError, KeyError):
+                return {'error': 'pip collection failed'}
+        
+        return {}
 
-        # Collect npm global packages
-        try:
-            result = subprocess.run(
-                ['npm', 'list', '-g', '--depth=0', '--json'], 
-                capture_output=True, 
-                text=True, 
-                timeout=30
-            )
-            if result.returncode == 0:
-                npm_data = json.loads(result.stdout)
-                if 'dependencies' in npm_data:
-                    packages['npm'] = {
-                        name: info['version'] 
-                        for name, info in npm_data['dependencies'].items()
-                        if isinstance(info, dict) and 'version' in info
-                    }
-        except (subprocess.TimeoutExpired, subprocess.CalledProcessError, json.JSONDecodeError, FileNotFoundError):
-            packages['npm'] = {'error': 'npm collection failed'}
+    def _parse_npm(self, result: CommandResult) -> Dict[str, str]:
+        """Parse the output of npm list -g --json."""
+        if result is None:
+            return {'error': 'npm collection failed'}
+        
+        returncode, stdout = result
+        if returncode == 0:
+            try:
+                npm_data = json.loads(stdout)
+            except json.JSONDecodeError:
+                return {'error': 'npm collection failed'}
+            if isinstance(npm_data, dict) and 'dependencies' in npm_data:
+                return {
+                    name: info['version'] 
+                    for name, info in npm_data['dependencies'].items()
+                    if isinstance(info, dict) and 'version' in info
+                }
+        
+        return {}
 
-        # Collect brew packages (macOS only)
-        try:
-            result = subprocess.run(
-                ['brew', 'list', '--versions'], 
-                capture_output=True, 
-                text=True, 
-                timeout=30
-            )
-            if result.returncode == 0:
-                brew_packages = {}
-                for line in result.stdout.strip().split('\n'):
-                    if line.strip():
-                        parts = line.split()
-                        if len(parts) >= 2:
-                            name = parts[0]
-                            # Take the last version if multiple exist
-                            version = parts[-1]
-                            brew_packages[name] = version
-                packages['brew'] = brew_packages
-        except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
-            packages['brew'] = {'error': 'brew collection failed (not installed or not macOS)'}
-
-        return packages
\ No newline at end of file
+    def _parse_brew(self, result: CommandResult) -> Dict[str, str]:
+        """Parse the output of brew list --versions (macOS only)."""
+        if result is None:
+            return {'error': 'brew collection failed (not installed or not macOS)'}
+        
+        returncode, stdout = result
+        if returncode == 0:
+            brew_packages = {}
+            for line in stdout.strip().split('\n'):
+                if line.strip():
+                    parts = line.split()
+                    if len(parts) >= 2:
+                        name = parts[0]
+                        # Take the last version if multiple exist
+                        version = parts[-1]
+                        brew_packages[name] = version
+            return brew_packages
+        
+        return {}
@@ -2,56 +2,266 @@
 Process collector - captures running processes and their details.
 """
 
+import heapq
+import json
+import os
+import sys
+import threading
+import time
 import psutil
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+from ..storage import get_data_dir
+
+# (pid, create_time) identifies a process across pid reuse
+ProcessKey = Tuple[int, float]
+
+
+# (pid, name, cmdline, create_time, cpu seconds, rss bytes)
+ProcessRow = Tuple[int, str, str, float, float, int]
+
+PROC_DIR = '/proc'
+
+# Indexes into the fields of /proc/<pid>/stat after the ")" closing comm
+_STAT_UTIME = 11
+_STAT_STIME = 12
+_STAT_STARTTIME = 19
+_STAT_RSS = 21
+
+# The kernel truncates comm to 15 characters
+_COMM_LEN = 15
+
+
+def _process_key(pid: int, create_time: float) -> ProcessKey:
+    """Return the identity of a process, rounding create_time to survive JSON round trips."""
+    return pid, round(create_time, 2)
+
+
+def proc_available() -> bool:
+    """Check whether the /proc fast path can be used."""
+    return sys.platform.startswith('linux') and os.path.isdir(PROC_DIR)
+
+
+def read_proc_processes(proc_dir: str = PROC_DIR) -> Iterator[ProcessRow]:
+    """
+    Read every user-space process from /proc in one pass.
+
+    Opens only /proc/<pid>/cmdline and /proc/<pid>/stat per process; the
+    resident set size is taken from stat, which reports the same value as
+    statm. Kernel threads (empty cmdline) are skipped before stat is read,
+    and processes that exit mid-read are skipped.
+
+    Yields:
+        (pid, name, cmdline, create_time, cpu seconds, rss bytes)
+        with create_time computed the way psutil does.
+    """
+    clock_ticks = os.sysconf('SC_CLK_TCK')
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    boot_time = psutil.boot_time()
+
+    with os.scandir(proc_dir) as entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            base = f"{proc_dir}/{entry.name}"
+            try:
+                with open(f"{base}/cmdline", 'rb') as f:
+                    raw_cmdline = f.read()
+                if not raw_cmdline:
+                    continue
+                with open(f"{base}/stat", 'rb') as f:
+                    stat = f.read()
+            except OSError:
+                # Exited (ENOENT/ESRCH) or not readable
+                continue
+
+            # comm may contain spaces and parentheses; it ends at the last ")"
+            close = stat.rfind(b')')
+            fields = stat[close + 2:].split()
+            if close < 0 or len(fields) <= _STAT_RSS:
+                continue
+
+            # Arguments are NUL-separated; processes that rewrite their
+            # cmdline may use spaces instead
+            args = raw_cmdline.rstrip(b'\0').split(b'\0')
+            cmdline = ' '.join(os.fsdecode(arg) for arg in args)
+
+            name = os.fsdecode(stat[stat.find(b'(') + 1:close])
+            if len(name) >= _COMM_LEN:
+                # Recover the full name from argv[0], as psutil does
+                exe = os.path.basename(os.fsdecode(args[0]))
+                if exe.startswith(name):
+                    name = exe
+
+            yield (
+                int(entry.name),
+                name,
+                cmdline,
+                boot_time + int(fields[_STAT_STARTTIME]) / clock_ticks,
+                (int(fields[_STAT_UTIME]) + int(fields[_STAT_STIME])) / clock_ticks,
+                int(fields[_STAT_RSS]) * page_size,
+            )
 
 
 class ProcessCollector:
-    """Collector for running processes and their metadata."""
+    """
+    Collector for running processes and their metadata.
+
+    The last CPU-times reading of each process is kept in a table
+    keyed by (pid, create_time), so CPU usage is the real utilisation since
+    the previous collect. The readings are persisted between runs; a
+    process seen for the first time reports its average usage since it
+    started.
+    """
+
+    def __init__(self, state_path: Optional[str] = None, persist: bool = True,
+                 limit: Optional[int] = 100, backend: str = 'auto'):
+        """
+        Initialize the collector.
+
+        Args:
+            state_path: File holding the last CPU-times reading per process.
+                Defaults to process_cpu.json in the envdiff data directory.
+            persist: Persist the readings between runs.
+            limit: Report only this many processes, largest resident memory
+                first. None reports every process.
+            backend: 'proc' reads /proc directly (Linux), 'psutil' uses
+                psutil.process_iter, 'auto' uses /proc when available.
+        """
+        self.state_path = state_path
+        self.persist = persist
+        self.limit = limit
+        self.backend = backend
+        # key -> (cpu seconds, wall time of the reading)
+        self._table: Dict[ProcessKey, Tuple[float, float]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
 
     def collect(self) -> List[Dict[str, Any]]:
         """
         Collect information about all running processes.
-        
+
         Returns:
             List of process dictionaries with pid, name, cmdline, cpu, memory.
         """
         processes = []
-        
-        try:
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'cpu_percent', 'memory_info']):
-                try:
-                    # Get process info
-                    info = proc.info
-                    
-                    # Skip kernel processes and those without cmdline
-                    if not info['cmdline']:
-                        continue
-                    
-                    # Get memory in MB
-                    mem_mb = 0
-                    if info['memory_info']:
-                        mem_mb = round(info['memory_info'].rss / 1024 / 1024, 1)
-                    
-                    # Join cmdline arguments
-                    cmdline = ' '.join(info['cmdline']) if info['cmdline'] else ''
-                    
+
+        with self._lock:
+            previous = self._previous_readings()
+            table = {}
+
+            try:
+                for pid, name, cmdline, create_time, cpu_time, rss in self._read_processes():
+                    key = _process_key(pid, create_time)
+                    now = time.time()
+                    table[key] = (cpu_time, now)
+
                     processes.append({
-                        'pid': info['pid'],
-                        'name': info['name'],
+                        'pid': pid,
+                        'name': name,
                         'cmdline': cmdline,
-                        'cpu': info.get('cpu_percent', 0.0),
-                        'mem_mb': mem_mb
+                        'cpu': self._cpu_percent(previous.get(key), cpu_time, now, create_time),
+                        'mem_mb': round(rss / 1024 / 1024, 1)
                     })
-                    
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                    # Process disappeared or access denied - skip it
+
+            except Exception as e:
+                # If process enumeration fails entirely, return empty list with error marker
+                return [{'error': f'ProcessCollector failed: {str(e)}'}]
+
+            # Exited processes drop out of the table
+            self._table = table
+            self._save_readings()
+
+        # Largest resident memory first, limited to the top processes
+        by_memory = lambda x: x.get('mem_mb', 0)
+        if self.limit is None:
+            processes.sort(key=by_memory, reverse=True)
+            return processes
+        return heapq.nlargest(self.limit, processes, key=by_memory)
+
+    def _read_processes(self) -> Iterator[ProcessRow]:
+        """Read processes with the configured backend."""
+        if self.backend == 'proc' or (self.backend == 'auto' and proc_available()):
+            return read_proc_processes()
+        return self._read_psutil()
+
+    def _read_psutil(self) -> Iterator[ProcessRow]:
+        """Read processes through psutil.process_iter."""
+        for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'create_time',
+                                         'cpu_times', 'memory_info']):
+            try:
+                # Get process info
+                info = proc.info
+
+                # Skip kernel processes and those without cmdline
+                if not info['cmdline'] or info['create_time'] is None:
                     continue
-                    
-        except Exception as e:
-            # If psutil fails entirely, return empty list with error marker
-            return [{'error': f'ProcessCollector failed: {str(e)}'}]
-        
-        # Sort by memory usage (descending) and limit to top 100 processes
-        processes.sort(key=lambda x: x.get('mem_mb', 0), reverse=True)
-        return processes[:100]
\ No newline at end of file
+
+                cpu_time = 0.0
+                if info['cpu_times']:
+                    cpu_time = info['cpu_times'].user + info['cpu_times'].system
+                rss = info['memory_info'].rss if info['memory_info'] else 0
+
+                yield (info['pid'], info['name'], ' '.join(info['cmdline']),
+                       info['create_time'], cpu_time, rss)
+
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                # Process disappeared or access denied - skip it
+                continue
+
+    def _cpu_percent(self, previous: Optional[Tuple[float, float]], cpu_time: float,
+                     now: float, create_time: float) -> float:
+        """
+        Return CPU usage as a percentage of one core.
+
+        Uses the delta since the previous reading of the same process, or the
+        average since the process started when there is none.
+        """
+        if previous is not None:
+            prev_cpu, prev_time = previous
+            elapsed = now - prev_time
+            if elapsed > 0 and cpu_time >= prev_cpu:
+                return round(100.0 * (cpu_time - prev_cpu) / elapsed, 1)
+
+        lifetime = now - create_time
+        if lifetime <= 0:
+            return 0.0
+        return round(100.0 * cpu_time / lifetime, 1)
+
+    def _previous_readings(self) -> Dict[ProcessKey, Tuple[float, float]]:
+        """Return the last (cpu seconds, wall time) per process, from memory or the state file."""
+        if self._table or self._loaded:
+            return dict(self._table)
+
+        self._loaded = True
+        if not self.persist:
+            return {}
+        try:
+            with open(self._state_file(), 'r') as f:
+                rows = json.load(f)
+            return {_process_key(pid, create_time): (cpu_time, when)
+                    for pid, create_time, cpu_time, when in rows}
+        except (OSError, ValueError, TypeError):
+            return {}
+
+    def _state_file(self) -> str:
+        """Return the path of the persisted readings."""
+        return self.state_path or str(get_data_dir() / "process_cpu.json")
+
+    def _save_readings(self) -> None:
+        """Persist the readings for the next run; failures only cost first-sight averages."""
+        if not self.persist:
+            return
+        rows = [[pid, create_time, cpu_time, when]
+                for (pid, create_time), (cpu_time, when) in self._table.items()]
+        path = self._state_file()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(rows, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
@@ -2,38 +2,79 @@
 System collector - captures CPU, memory, and disk usage statistics.
 """
 
+import json
+import os
+import threading
+import time
 import psutil
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+from ..storage import get_data_dir
+
+# cpu_times fields that double-count time already included in 'user'/'nice'
+GUEST_FIELDS = ('guest', 'guest_nice')
 
 
 class SystemCollector:
-    """Collector for system resource usage statistics."""
+    """
+    Collector for system resource usage statistics.
+
+    CPU utilisation is computed from the delta between two cpu_times()
+    readings. The previous reading is kept in process and persisted between
+    runs, so a collect normally returns immediately; only when no usable
+    earlier reading exists does it block for sample_interval seconds.
+    """
+
+    # Readings closer together than this are too noisy to report
+    MIN_INTERVAL = 0.1
+
+    def __init__(self, state_path: Optional[str] = None, sample_interval: float = 1.0,
+                 max_reading_age: float = 3600.0, persist: bool = True):
+        """
+        Initialize the collector.
+
+        Args:
+            state_path: File holding the last CPU-times reading. Defaults to
+                cpu_times.json in the envdiff data directory.
+            sample_interval: Seconds to sample for when no earlier reading exists.
+            max_reading_age: Earlier readings older than this are discarded.
+            persist: Persist the last reading between runs.
+        """
+        self.state_path = state_path
+        self.sample_interval = sample_interval
+        self.max_reading_age = max_reading_age
+        self.persist = persist
+        self._last: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
 
     def collect(self) -> Dict[str, Any]:
         """
         Collect system resource usage information.
-        
+
         Returns:
             Dictionary with CPU, memory, and disk usage percentages.
         """
         try:
-            # Get CPU usage percentage
-            cpu_percent = psutil.cpu_percent(interval=1)
-            
+            # CPU usage since the previous reading
+            cpu = self._sample_cpu()
+
             # Get memory usage
             memory = psutil.virtual_memory()
             mem_percent = round(memory.percent, 1)
-            
+
             # Get disk usage for root partition
             disk = psutil.disk_usage('/')
             disk_percent = round((disk.used / disk.total) * 100, 1)
-            
+
             # Get additional system info
             boot_time = psutil.boot_time()
             cpu_count = psutil.cpu_count()
-            
+
             return {
-                'cpu_percent': round(cpu_percent, 1),
+                'cpu_percent': cpu['cpu_percent'],
+                'cpu_percent_per_core': cpu['per_core'],
+                'iowait_percent': cpu['iowait_percent'],
+                'load_avg': self._load_avg(),
                 'mem_percent': mem_percent,
                 'disk_percent': disk_percent,
                 'cpu_count': cpu_count,
@@ -43,6 +84,113 @@ class SystemCollector:
                 'total_disk_gb': round(disk.total / (1024**3), 2),
                 'available_disk_gb': round(disk.free / (1024**3), 2),
             }
-            
+
         except Exception as e:
-            return {'error': f'SystemCollector failed: {str(e)}'}
\ No newline at end of file
+            return {'error': f'SystemCollector failed: {str(e)}'}
+
+    def _sample_cpu(self) -> Dict[str, Any]:
+        """Return CPU utilisation since the previous reading, sampling if there is none."""
+        with self._lock:
+            previous = self._last or self._load_reading()
+            current = self._read_cpu()
+
+            if previous is not None and current['time'] - previous['time'] < self.MIN_INTERVAL:
+                time.sleep(self.MIN_INTERVAL - (current['time'] - previous['time']))
+                current = self._read_cpu()
+
+            usage = self._usage(previous, current) if previous is not None else None
+            if usage is None:
+                # No usable earlier reading: sample for a full interval
+                time.sleep(self.sample_interval)
+                previous, current = current, self._read_cpu()
+                usage = self._usage(previous, current)
+
+            self._last = current
+            self._save_reading(current)
+            return usage
+
+    def _read_cpu(self) -> Dict[str, Any]:
+        """Take one per-core CPU-times reading."""
+        return {
+            'time': time.time(),
+            'boot_time': psutil.boot_time(),
+            'per_cpu': [times._asdict() for times in psutil.cpu_times(percpu=True)],
+        }
+
+    def _usage(self, previous: Dict[str, Any], current: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Compute utilisation between two readings.
+
+        Returns:
+            cpu_percent, per_core and iowait_percent, or None when the
+            readings cannot be compared (reboot, CPU hotplug, stale reading).
+        """
+        if (previous.get('boot_time') != current['boot_time']
+                or len(previous.get('per_cpu', ())) != len(current['per_cpu'])
+                or current['time'] - previous['time'] > self.max_reading_age):
+            return None
+
+        per_core: List[float] = []
+        total_delta = busy_delta = iowait_delta = 0.0
+
+        for old, new in zip(previous['per_cpu'], current['per_cpu']):
+            deltas = {field: new[field] - old.get(field, 0.0) for field in new}
+            if any(delta < 0 for delta in deltas.values()):
+                return None
+
+            # guest time is already counted in user time on Linux
+            total = sum(delta for field, delta in deltas.items() if field not in GUEST_FIELDS)
+            # Same accounting as psutil.cpu_percent: idle and iowait are not busy
+            idle = deltas.get('idle', 0.0) + deltas.get('iowait', 0.0)
+            per_core.append(round(100.0 * (total - idle) / total, 1) if total else 0.0)
+
+            total_delta += total
+            busy_delta += total - idle
+            iowait_delta += deltas.get('iowait', 0.0)
+
+        if not total_delta:
+            return None
+
+        return {
+            'cpu_percent': round(100.0 * busy_delta / total_delta, 1),
+            'per_core': per_core,
+            'iowait_percent': round(100.0 * iowait_delta / total_delta, 1),
+        }
+
+    def _load_avg(self) -> Optional[List[float]]:
+        """Return the 1, 5 and 15 minute load averages, if the platform has them."""
+        try:
+            return [round(load, 2) for load in psutil.getloadavg()]
+        except (AttributeError, OSError):
+            return None
+
+    def _state_file(self) -> str:
+        """Return the path of the persisted reading."""
+        return self.state_path or str(get_data_dir() / "cpu_times.json")
+
+    def _load_reading(self) -> Optional[Dict[str, Any]]:
+        """Load the reading persisted by an earlier run, if any."""
+        if not self.persist:
+            return None
+        try:
+            with open(self._state_file(), 'r') as f:
+                reading = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return reading if isinstance(reading, dict) and 'time' in reading else None
+
+    def _save_reading(self, reading: Dict[str, Any]) -> None:
+        """Persist a reading for the next run; failures only cost a blocking sample."""
+        if not self.persist:
+            return
+        path = self._state_file()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(reading, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
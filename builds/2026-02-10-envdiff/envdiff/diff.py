@@ -2,116 +2,438 @@
 Diff module - compares snapshots and computes differences.
 """
 
-from deepdiff import DeepDiff
-from typing import Dict, Any, List
+import json
+import os
+from itertools import groupby
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from .codec import changed_sections
+from .merkle import changed_dirs, entries_in, is_tree_section, section_entries
+
+
+# Natural keys used to join list sections item by item. SnapshotEngine emits
+# 'process'; 'processes' is the name used in exported and hand-written snapshots.
+LIST_KEYS = {
+    'files': ('path',),
+    'process': ('pid', 'cmdline'),
+    'processes': ('pid', 'cmdline'),
+    'network': ('local', 'remote', 'status'),
+}
+
+# File hashes that say nothing about the contents, so never pair a move;
+# 'large_file' is the placeholder in snapshots taken by older versions
+_OPAQUE_HASHES = ('too_large', 'large_file', 'unreadable')
+
+
+def _canonical(value: Any) -> str:
+    """Return a stable string form of a value, used as a fallback join key."""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def _is_number(value: Any) -> bool:
+    """Check for int/float values, excluding bool."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _path_groups(entries: Iterable[Dict[str, Any]]) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """Group path-sorted entries by path."""
+    for path, group in groupby(entries, key=lambda entry: entry['path']):
+        yield path, list(group)
+
+
+def _content_key(item: Any) -> Optional[Tuple]:
+    """
+    Return the join key of a file on content and size, or None if it cannot pair on content.
+
+    Empty files all share one hash, so, as in git, they never pair on content.
+    """
+    digest = item.get('hash') if isinstance(item, dict) else None
+    if not digest or digest in _OPAQUE_HASHES or not item.get('size'):
+        return None
+    return digest, item['size']
+
+
+def _content_name_key(item: Any) -> Optional[Tuple]:
+    """Return the join key of a file on content and file name."""
+    key = _content_key(item)
+    return None if key is None else key + (os.path.basename(item['path']),)
+
+
+def _name_size_key(item: Any) -> Optional[Tuple]:
+    """Return the join key of a file on file name and size."""
+    if not isinstance(item, dict) or 'size' not in item:
+        return None
+    return os.path.basename(item['path']), item['size']
 
 
 class SnapshotDiff:
     """Engine for comparing snapshots and computing differences."""
 
-    def __init__(self):
-        """Initialize diff engine."""
-        pass
+    def __init__(self, list_keys: Optional[Dict[str, Tuple[str, ...]]] = None,
+                 detect_moves: bool = True, detect_similar: bool = False):
+        """
+        Initialize diff engine.
+
+        Args:
+            list_keys: Natural key fields per list section. Defaults to LIST_KEYS.
+            detect_moves: Report a removed and an added file with the same
+                content hash as one moved or renamed file.
+            detect_similar: Also pair removed and added files that share a
+                name and size but not a hash (moved and edited in place).
+        """
+        self.list_keys = dict(LIST_KEYS)
+        if list_keys:
+            self.list_keys.update(list_keys)
+        self.detect_moves = detect_moves
+        self.detect_similar = detect_similar
 
     def compare(self, snapshot1: Dict[str, Any], snapshot2: Dict[str, Any]) -> Dict[str, Any]:
         """
         Compare two snapshots and return the differences.
-        
+
         Args:
             snapshot1: First snapshot data
             snapshot2: Second snapshot data
-            
+
         Returns:
             Dictionary containing organized differences by category.
         """
-        # Use deepdiff to get raw differences
-        raw_diff = DeepDiff(
-            snapshot1, 
-            snapshot2,
-            ignore_order=True,
-            verbose_level=2
-        )
-        
-        # Organize differences by collector type
         organized_diff = {}
-        
-        for collector_name in set(list(snapshot1.keys()) + list(snapshot2.keys())):
+
+        # Sections whose stored fingerprints match are identical; skip them
+        fingerprints1 = getattr(snapshot1, 'fingerprints', None)
+        fingerprints2 = getattr(snapshot2, 'fingerprints', None)
+        identical = set()
+        if fingerprints1 and fingerprints2:
+            identical = {name for name, digest in fingerprints1.items()
+                         if fingerprints2.get(name) == digest}
+
+        for collector_name in dict.fromkeys([*snapshot1.keys(), *snapshot2.keys()]):
+            if collector_name in identical:
+                continue
+
             collector_diff = self._compare_collector_data(
                 snapshot1.get(collector_name, {}),
-                snapshot2.get(collector_name, {})
+                snapshot2.get(collector_name, {}),
+                collector_name
             )
-            
+
             if collector_diff:
                 organized_diff[collector_name] = collector_diff
-        
+
         return organized_diff
 
-    def _compare_collector_data(self, data1: Any, data2: Any) -> Dict[str, Any]:
+    def changed_sections(self, fingerprints1: Dict[str, str],
+                         fingerprints2: Dict[str, str]) -> List[str]:
+        """Return the sections that need a full comparison, given both sides' fingerprints."""
+        return changed_sections(fingerprints1, fingerprints2)
+
+    def _compare_collector_data(self, data1: Any, data2: Any,
+                                section: Optional[str] = None) -> Dict[str, Any]:
         """Compare data from a specific collector."""
-        diff = DeepDiff(data1, data2, ignore_order=True, verbose_level=2)
-        
-        if not diff:
+        if is_tree_section(data1) and is_tree_section(data2):
+            return self._compare_trees(data1, data2, section)
+        # A flat files section from an older snapshot compares against the entries
+        data1, data2 = section_entries(data1), section_entries(data2)
+
+        # A section missing from one snapshot defaults to {}; treat it as an
+        # empty list when the other side is a list section
+        if isinstance(data2, list) and data1 == {}:
+            data1 = []
+        if isinstance(data1, list) and data2 == {}:
+            data2 = []
+
+        if isinstance(data1, dict) and isinstance(data2, dict):
+            result = {}
+            self._compare_dicts(data1, data2, '', result)
+            return result
+
+        if isinstance(data1, list) and isinstance(data2, list):
+            return self._compare_lists(data1, data2, section)
+
+        if data1 == data2:
             return {}
-            
+
+        result = {}
+        self._record_value_change('root', data1, data2, result)
+        return result
+
+    def _compare_dicts(self, data1: Dict[str, Any], data2: Dict[str, Any],
+                       prefix: str, result: Dict[str, Any]) -> None:
+        """Compare two dicts key by key, recursing into nested dicts."""
+        for key, value in data1.items():
+            path = f"{prefix}[{key}]" if prefix else str(key)
+
+            if key not in data2:
+                result.setdefault('removed', {})[path] = value
+                continue
+
+            other = data2[key]
+            if value == other:
+                continue
+
+            if isinstance(value, dict) and isinstance(other, dict):
+                self._compare_dicts(value, other, path, result)
+            else:
+                self._record_value_change(path, value, other, result)
+
+        for key, value in data2.items():
+            if key not in data1:
+                path = f"{prefix}[{key}]" if prefix else str(key)
+                result.setdefault('added', {})[path] = value
+
+    def _record_value_change(self, path: str, old: Any, new: Any,
+                             result: Dict[str, Any]) -> None:
+        """Record a changed value, or a type change when the types differ."""
+        if type(old) is type(new) or (_is_number(old) and _is_number(new)):
+            result.setdefault('changed', {})[path] = {'old': old, 'new': new}
+        else:
+            result.setdefault('type_changed', {})[path] = {
+                'old_type': str(type(old)),
+                'new_type': str(type(new)),
+                'old_value': old,
+                'new_value': new
+            }
+
+    def _item_key(self, item: Any, key_fields: Optional[Tuple[str, ...]]) -> Tuple:
+        """Return the join key for a list item."""
+        if key_fields and isinstance(item, dict) and all(f in item for f in key_fields):
+            return tuple(item[f] for f in key_fields)
+        # Items without a natural key are matched on their full content
+        return ('__item__', _canonical(item))
+
+    def _item_label(self, item: Dict[str, Any], key_fields: Tuple[str, ...]) -> str:
+        """Return a readable label for a keyed list item."""
+        if 'path' in key_fields:
+            return str(item['path'])
+        if 'pid' in key_fields:
+            return f"{item.get('name', item['cmdline'])} (PID: {item['pid']})"
+        if 'local' in key_fields:
+            return f"{item['local']} → {item['remote'] or 'N/A'} ({item['status']})"
+        return " ".join(str(item[f]) for f in key_fields)
+
+    def _compare_lists(self, items1: List[Any], items2: List[Any],
+                       section: Optional[str]) -> Dict[str, Any]:
+        """
+        Compare two lists by hash-joining items on their natural key.
+
+        Items present on one side only are reported as items_added or
+        items_removed; keyed items present on both sides are compared field by
+        field. Runs in linear time in the number of items.
+        """
+        key_fields = self.list_keys.get(section)
+
+        index1: Dict[Tuple, List[Any]] = {}
+        for item in items1:
+            index1.setdefault(self._item_key(item, key_fields), []).append(item)
+
+        index2: Dict[Tuple, List[Any]] = {}
+        for item in items2:
+            index2.setdefault(self._item_key(item, key_fields), []).append(item)
+
         result = {}
-        
-        # Handle added items
-        if 'dictionary_item_added' in diff:
-            result['added'] = {}
-            for key in diff['dictionary_item_added']:
-                # Extract the key from the deepdiff path
-                clean_key = key.replace("root['", "").replace("']", "")
-                result['added'][clean_key] = diff['dictionary_item_added'][key]
-        
-        # Handle removed items  
-        if 'dictionary_item_removed' in diff:
-            result['removed'] = {}
-            for key in diff['dictionary_item_removed']:
-                clean_key = key.replace("root['", "").replace("']", "")
-                result['removed'][clean_key] = diff['dictionary_item_removed'][key]
-                
-        # Handle changed values
-        if 'values_changed' in diff:
-            result['changed'] = {}
-            for path, change in diff['values_changed'].items():
-                clean_path = path.replace("root['", "").replace("']", "").replace("'", "")
-                result['changed'][clean_path] = {
-                    'old': change['old_value'],
-                    'new': change['new_value']
-                }
-        
-        # Handle type changes
-        if 'type_changes' in diff:
-            result['type_changed'] = {}
-            for path, change in diff['type_changes'].items():
-                clean_path = path.replace("root['", "").replace("']", "").replace("'", "")
-                result['type_changed'][clean_path] = {
-                    'old_type': str(change['old_type']),
-                    'new_type': str(change['new_type']),
-                    'old_value': change['old_value'],
-                    'new_value': change['new_value']
-                }
-        
-        # Handle iterable changes (for lists like processes, files)
-        if 'iterable_item_added' in diff:
-            result['items_added'] = []
-            for item in diff['iterable_item_added'].values():
-                result['items_added'].append(item)
-                
-        if 'iterable_item_removed' in diff:
-            result['items_removed'] = []
-            for item in diff['iterable_item_removed'].values():
-                result['items_removed'].append(item)
-        
+        added = []
+        removed = []
+
+        for key, group1 in index1.items():
+            group2 = index2.get(key)
+            if group2 is None:
+                removed.extend(group1)
+            elif len(group1) == 1 and len(group2) == 1 and key[0] != '__item__':
+                if group1[0] != group2[0]:
+                    self._compare_items(group1[0], group2[0], key_fields, result)
+            else:
+                # Duplicate keys: match the groups as multisets of full items
+                extra_removed, extra_added = self._compare_groups(group1, group2)
+                removed.extend(extra_removed)
+                added.extend(extra_added)
+
+        for key, group2 in index2.items():
+            if key not in index1:
+                added.extend(group2)
+
+        if key_fields == ('path',) and self.detect_moves:
+            removed, added = self._pair_moves(removed, added, result)
+
+        if added:
+            result['items_added'] = added
+        if removed:
+            result['items_removed'] = removed
+
         return result
 
+    def _compare_trees(self, section1: Dict[str, Any], section2: Dict[str, Any],
+                       section: Optional[str]) -> Dict[str, Any]:
+        """
+        Compare two files sections by merge-joining their path-sorted entries.
+
+        Only directories whose digests differ are read, and each is read as
+        two sorted streams joined in one pass, so neither side has to fit in
+        memory. The result matches _compare_lists keyed on path.
+        """
+        key_fields = ('path',)
+        result: Dict[str, Any] = {}
+        added: List[Any] = []
+        removed: List[Any] = []
+
+        for directory, recursive in changed_dirs(section1['tree'], section2['tree']):
+            groups1 = _path_groups(entries_in(section1['entries'], directory, recursive))
+            groups2 = _path_groups(entries_in(section2['entries'], directory, recursive))
+            group1 = next(groups1, None)
+            group2 = next(groups2, None)
+            while group1 is not None or group2 is not None:
+                if group2 is None or (group1 is not None and group1[0] < group2[0]):
+                    removed.extend(group1[1])
+                    group1 = next(groups1, None)
+                elif group1 is None or group2[0] < group1[0]:
+                    added.extend(group2[1])
+                    group2 = next(groups2, None)
+                else:
+                    items1, items2 = group1[1], group2[1]
+                    if len(items1) == 1 and len(items2) == 1:
+                        if items1[0] != items2[0]:
+                            self._compare_items(items1[0], items2[0], key_fields, result)
+                    else:
+                        # Same path under several watch directories
+                        extra_removed, extra_added = self._compare_groups(items1, items2)
+                        removed.extend(extra_removed)
+                        added.extend(extra_added)
+                    group1 = next(groups1, None)
+                    group2 = next(groups2, None)
+
+        if self.detect_moves:
+            removed, added = self._pair_moves(removed, added, result)
+
+        if added:
+            result['items_added'] = added
+        if removed:
+            result['items_removed'] = removed
+
+        return result
+
+    def _pair_moves(self, removed: List[Any], added: List[Any],
+                    result: Dict[str, Any]) -> Tuple[List[Any], List[Any]]:
+        """
+        Pair removed and added files into moves and renames.
+
+        Files are hash-joined on content: first on (hash, size, name), so
+        that e.g. identical __init__.py files pair with their own kind, then
+        on (hash, size), then, with detect_similar, on (name, size). Empty
+        files and placeholder hashes never pair on content. Each pass
+        is linear in the number of files. A pair in the same directory is
+        recorded under 'renamed', any other under 'moved'.
+
+        Returns:
+            The (removed, added) files left unpaired.
+        """
+        if not removed or not added:
+            return removed, added
+
+        keys = [_content_name_key, _content_key]
+        if self.detect_similar:
+            keys.append(_name_size_key)
+
+        paired_removed = [None] * len(removed)
+        paired_added = [False] * len(added)
+        for key in keys:
+            # Unpaired added files per key, in reverse so pop() keeps list order
+            candidates: Dict[Tuple, List[int]] = {}
+            for index in range(len(added) - 1, -1, -1):
+                if not paired_added[index]:
+                    item_key = key(added[index])
+                    if item_key is not None:
+                        candidates.setdefault(item_key, []).append(index)
+            if not candidates:
+                continue
+            for index, item in enumerate(removed):
+                if paired_removed[index] is None:
+                    item_key = key(item)
+                    waiting = candidates.get(item_key) if item_key is not None else None
+                    if waiting:
+                        paired_removed[index] = waiting.pop()
+                        paired_added[paired_removed[index]] = True
+
+        for index, match in enumerate(paired_removed):
+            if match is None:
+                continue
+            old, new = removed[index], added[match]
+            move = {'from': old['path'], 'to': new['path'], 'hash': new.get('hash'), 'size': new.get('size')}
+            if old.get('hash') != new.get('hash'):
+                move['old_hash'] = old.get('hash')
+                move['similar'] = True
+            kind = 'renamed' if os.path.dirname(old['path']) == os.path.dirname(new['path']) else 'moved'
+            result.setdefault(kind, []).append(move)
+
+        return ([item for index, item in enumerate(removed) if paired_removed[index] is None],
+                [item for index, item in enumerate(added) if not paired_added[index]])
+
+    def _compare_items(self, item1: Dict[str, Any], item2: Dict[str, Any],
+                       key_fields: Tuple[str, ...], result: Dict[str, Any]) -> None:
+        """Compare two keyed list items field by field."""
+        label = self._item_label(item1, key_fields)
+
+        for field in dict.fromkeys([*item1.keys(), *item2.keys()]):
+            path = f"{label}[{field}]"
+            if field not in item2:
+                result.setdefault('removed', {})[path] = item1[field]
+            elif field not in item1:
+                result.setdefault('added', {})[path] = item2[field]
+            elif item1[field] != item2[field]:
+                self._record_value_change(path, item1[field], item2[field], result)
+
+    def _compare_groups(self, group1: List[Any], group2: List[Any]) -> Tuple[List[Any], List[Any]]:
+        """Match two groups of items as multisets, returning (removed, added)."""
+        remaining: Dict[str, int] = {}
+        for item in group2:
+            canonical = _canonical(item)
+            remaining[canonical] = remaining.get(canonical, 0) + 1
+
+        removed = []
+        for item in group1:
+            canonical = _canonical(item)
+            if remaining.get(canonical):
+                remaining[canonical] -= 1
+            else:
+                removed.append(item)
+
+        added = []
+        for item in group2:
+            canonical = _canonical(item)
+            if remaining.get(canonical):
+                remaining[canonical] -= 1
+                added.append(item)
+
+        return removed, added
+
+    def summarize(self, section_diff: Dict[str, Any], section: Optional[str] = None) -> Dict[str, int]:
+        """
+        Count the changes in one section's diff.
+
+        A list item with several changed fields counts once.
+
+        Returns:
+            Counts of added, removed, changed and moved (incl. renamed) items;
+            zero counts are left out.
+        """
+        changed = [*section_diff.get('changed', {}), *section_diff.get('type_changed', {})]
+        if self.list_keys.get(section):
+            # Changed fields of list items are recorded as "label[field]"
+            changed = {path.rsplit('[', 1)[0] for path in changed}
+        counts = {
+            'added': len(section_diff.get('added', {})) + len(section_diff.get('items_added', [])),
+            'removed': len(section_diff.get('removed', {})) + len(section_diff.get('items_removed', [])),
+            'changed': len(changed),
+            'moved': len(section_diff.get('moved', [])) + len(section_diff.get('renamed', [])),
+        }
+        return {kind: count for kind, count in counts.items() if count}
+
     def has_changes(self, diff: Dict[str, Any]) -> bool:
         """Check if diff contains any actual changes."""
         if not diff:
             return False
-            
+
         for collector_diff in diff.values():
-            if any(collector_diff.get(key, {}) for key in ['added', 'removed', 'changed', 'type_changed', 'items_added', 'items_removed']):
+            if any(collector_diff.get(key, {}) for key in ['added', 'removed', 'changed', 'type_changed', 'items_added', 'items_removed', 'moved', 'renamed']):
                 return True
-                
-        return False
\ No newline at end of file
+
+        return False
@@ -0,0 +1,284 @@
+"""
+Entry store module - on-disk, path-sorted streams of file entries.
+
+Large files sections do not hold their entries in memory. The collector
+spills them into an EntrySpool (a temporary SQLite file), storage copies
+them in batches into its file_entries table, and a loaded snapshot reads
+them back as StoredEntries. Both are re-iterable, sorted by path, and
+fetch a page of rows at a time, so memory stays bounded however many
+files a section covers.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Key under which a section blob references its stored entries
+ENTRIES_KEY = '$entries'
+
+# Columns of an entry, in storage order
+ENTRY_FIELDS = ('path', 'hash', 'size', 'mtime')
+
+# Rows fetched or written per round trip
+PAGE_SIZE = 1000
+
+# Spool files are named entries-<random>.spool
+_SPOOL_PREFIX = 'entries-'
+_SPOOL_SUFFIX = '.spool'
+
+# Spools untouched for this long were left behind by a process that died
+STALE_SPOOL_AGE = 86400.0
+
+# Sorts directly after the path separator (see merkle._AFTER_SEP)
+_AFTER_SEP = chr(ord(os.sep) + 1)
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS file_entries (
+        entries_key TEXT NOT NULL,
+        path TEXT NOT NULL,
+        hash TEXT,
+        size INTEGER,
+        mtime REAL
+    )
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS idx_file_entries_path ON file_entries (entries_key, path)"
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    """Create the file_entries table and its index."""
+    conn.execute(_SCHEMA)
+    conn.execute(_INDEX)
+
+
+def _row(entry: Dict[str, Any]) -> Tuple:
+    """Return the column values of an entry."""
+    return tuple(entry.get(field) for field in ENTRY_FIELDS)
+
+
+class EntryStream:
+    """
+    Path-sorted file entries read from a file_entries table page by page.
+
+    Subclasses provide the connection. Entries with the same path (from
+    different watch directories) are kept and returned in insertion order.
+    """
+
+    def __init__(self, key: str, count: int):
+        self.key = key
+        self.count = count
+        # entries_key of the rows; a spool's rows keep '' while key becomes its tree hash
+        self._rows_key = key
+
+    def _connection(self) -> Tuple[sqlite3.Connection, Any]:
+        """Return (connection, lock) holding the rows."""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self._query('', None, None)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, EntryStream):
+            return self.key == other.key and self.count == other.count
+        if isinstance(other, list):
+            return len(other) == self.count and list(self) == other
+        return NotImplemented
+
+    def __ne__(self, other: Any) -> bool:
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def rows(self) -> Iterator[List[Tuple]]:
+        """Yield the column values of every entry in path order, one page per list."""
+        page = []
+        for entry in self:
+            page.append(_row(entry))
+            if len(page) >= PAGE_SIZE:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def ref(self) -> Dict[str, Any]:
+        """Return the reference stored in the section blob in place of the entries."""
+        return {ENTRIES_KEY: self.key, 'count': self.count}
+
+    # Serialised as its reference by codec.canonical_json and codec.encode_blob
+    __json__ = ref
+
+    def under(self, directory: str, recursive: bool) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the entries inside a directory, in path order.
+
+        Args:
+            directory: Path relative to the watch directory; '' for the top.
+            recursive: Include entries in subdirectories.
+        """
+        if not directory:
+            return self._query('', None, None if recursive else 1)
+        prefix = directory + os.sep
+        return self._query(prefix, directory + _AFTER_SEP, None if recursive else len(prefix) + 1)
+
+    def _query(self, low: str, high: Optional[str], direct_from: Optional[int]) -> Iterator[Dict[str, Any]]:
+        """
+        Page through entries with low <= path < high.
+
+        direct_from, if set, is the 1-based character offset after which a
+        path must not contain a separator: only files directly inside the
+        directory are returned. Pages are fetched by keyset on (path, rowid),
+        so the lock is held for one page at a time.
+        """
+        where = "entries_key = ? AND path >= ?"
+        params: List[Any] = [self._rows_key, low]
+        if high is not None:
+            where += " AND path < ?"
+            params.append(high)
+        if direct_from is not None:
+            where += " AND instr(substr(path, ?), ?) = 0"
+            params.extend([direct_from, os.sep])
+
+        last: Optional[Tuple[str, int]] = None
+        while True:
+            sql = f"SELECT path, hash, size, mtime, rowid FROM file_entries WHERE {where}"
+            page_params = list(params)
+            if last is not None:
+                sql += " AND (path, rowid) > (?, ?)"
+                page_params.extend(last)
+            sql += f" ORDER BY path, rowid LIMIT {PAGE_SIZE}"
+
+            conn, lock = self._connection()
+            with lock:
+                rows = conn.execute(sql, page_params).fetchall()
+            for row in rows:
+                yield dict(zip(ENTRY_FIELDS, row[:4]))
+            if len(rows) < PAGE_SIZE:
+                return
+            last = (rows[-1][0], rows[-1][4])
+
+
+class EntrySpool(EntryStream):
+    """
+    Temporary on-disk buffer for the entries of one collect.
+
+    Entries are appended in any order, in batches; once finished they read
+    back sorted by path. The file lives in the envdiff data directory (not
+    a possibly memory-backed /tmp) and is deleted with the spool.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Create an empty spool.
+
+        Args:
+            directory: Where to create the spool file.
+        """
+        super().__init__('', 0)
+        fd, self.path = tempfile.mkstemp(prefix=_SPOOL_PREFIX, suffix=_SPOOL_SUFFIX, dir=directory)
+        os.close(fd)
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        # The spool is scratch data: no journal, no fsync
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(_SCHEMA)
+        self._lock = threading.RLock()
+        self._finalizer = weakref.finalize(self, EntrySpool._remove, self._conn, self.path)
+
+    @staticmethod
+    def _remove(conn: sqlite3.Connection, path: str) -> None:
+        """Close the spool's connection and delete its file."""
+        conn.close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def _connection(self) -> Tuple[sqlite3.Connection, Any]:
+        return self._conn, self._lock
+
+    def add(self, entries: Iterable[Dict[str, Any]]) -> None:
+        """Append a batch of entries."""
+        rows = [('',) + _row(entry) for entry in entries]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO file_entries VALUES (?, ?, ?, ?, ?)", rows)
+        self.count += len(rows)
+
+    def finish(self) -> None:
+        """Index the entries by path; call once every batch has been added."""
+        with self._lock, self._conn:
+            self._conn.execute(_INDEX)
+
+    def close(self) -> None:
+        """Delete the spool now instead of when it is garbage collected."""
+        self._finalizer()
+
+
+class StoredEntries(EntryStream):
+    """Entries of a stored files section, read from the snapshot database on demand."""
+
+    def __init__(self, connect: Callable[[], Tuple[sqlite3.Connection, Any]], key: str, count: int):
+        """
+        Reference stored entries.
+
+        Args:
+            connect: Returns the (connection, lock) of the snapshot database,
+                called once per page so a reopened pool is picked up.
+            key: entries_key of the rows.
+            count: Number of entries.
+        """
+        super().__init__(key, count)
+        self._connect = connect
+
+    def _connection(self) -> Tuple[sqlite3.Connection, Any]:
+        return self._connect()
+
+
+def close_spools(data: Dict[str, Any], keep: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Delete the spools holding the entries of a snapshot's sections.
+
+    Call once the snapshot has been stored or compared; until then its
+    spools are only deleted when garbage collected.
+
+    Args:
+        data: Snapshot sections.
+        keep: Another snapshot still in use; spools it shares are left open.
+    """
+    kept = {id(section.get('entries')) for section in (keep or {}).values() if isinstance(section, dict)}
+    for section in data.values():
+        entries = section.get('entries') if isinstance(section, dict) else None
+        if isinstance(entries, EntrySpool) and id(entries) not in kept:
+            entries.close()
+
+
+def sweep_spools(directory: str, max_age: float = STALE_SPOOL_AGE) -> None:
+    """
+    Delete spool files left in a directory by processes that exited without closing them.
+
+    Spools modified within max_age may belong to a running collect and are kept.
+    """
+    cutoff = time.time() - max_age
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if not (name.startswith(_SPOOL_PREFIX) and name.endswith(_SPOOL_SUFFIX)):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.stat(path).st_mtime < cutoff:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+def is_entries_ref(value: Any) -> bool:
+    """Check whether a decoded value is a reference to stored entries."""
+    return isinstance(value, dict) and ENTRIES_KEY in value
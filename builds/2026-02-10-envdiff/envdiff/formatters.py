@@ -7,9 +7,13 @@ from rich.table import Table
 from rich.panel import Panel
 from rich.text import Text
 from rich import box
+from rich.markup import escape
 from typing import Dict, Any, List
 from datetime import datetime
 
+# Numeric lists up to this long are printed in full instead of as a count
+MAX_INLINE_ITEMS = 16
+
 
 class SnapshotFormatter:
     """Formatter for snapshot and diff output using Rich."""
@@ -54,6 +58,9 @@ class SnapshotFormatter:
         for category, category_data in data.items():
             if isinstance(category_data, dict) and 'error' in category_data:
                 table.add_row(category.title(), "[red]Error[/red]", category_data['error'])
+            elif isinstance(category_data, dict) and 'entries' in category_data:
+                entries = category_data['entries']
+                table.add_row(category.title(), str(len(entries)), f"{len(entries)} items")
             elif isinstance(category_data, list):
                 table.add_row(category.title(), str(len(category_data)), f"{len(category_data)} items")
             elif isinstance(category_data, dict):
@@ -86,31 +93,39 @@ class SnapshotFormatter:
             if 'added' in changes and changes['added']:
                 content.append("[bold green]Added:[/bold green]")
                 for key, value in changes['added'].items():
-                    content.append(f"  [green]+[/green] {key}: {self._format_value(value)}")
+                    content.append(f"  [green]+[/green] {escape(key)}: {self._format_value(value)}")
             
             # Show removed items
             if 'removed' in changes and changes['removed']:
                 content.append("[bold red]Removed:[/bold red]")
                 for key, value in changes['removed'].items():
-                    content.append(f"  [red]-[/red] {key}: {self._format_value(value)}")
+                    content.append(f"  [red]-[/red] {escape(key)}: {self._format_value(value)}")
             
             # Show changed items
             if 'changed' in changes and changes['changed']:
                 content.append("[bold blue]Changed:[/bold blue]")
                 for key, change in changes['changed'].items():
-                    content.append(f"  [blue]~[/blue] {key}: {self._format_value(change['old'])} → {self._format_value(change['new'])}")
+                    content.append(f"  [blue]~[/blue] {escape(key)}: {self._format_value(change['old'])} → {self._format_value(change['new'])}")
             
             # Show added list items (for processes, files, etc.)
             if 'items_added' in changes and changes['items_added']:
                 content.append("[bold green]Items Added:[/bold green]")
                 for item in changes['items_added']:
-                    content.append(f"  [green]+[/green] {self._format_list_item(item)}")
+                    content.append(f"  [green]+[/green] {escape(self._format_list_item(item))}")
             
             # Show removed list items
             if 'items_removed' in changes and changes['items_removed']:
                 content.append("[bold red]Items Removed:[/bold red]")
                 for item in changes['items_removed']:
-                    content.append(f"  [red]-[/red] {self._format_list_item(item)}")
+                    content.append(f"  [red]-[/red] {escape(self._format_list_item(item))}")
+            
+            # Show files moved or renamed with their contents
+            for kind in ('moved', 'renamed'):
+                if changes.get(kind):
+                    content.append(f"[bold magenta]{kind.title()}:[/bold magenta]")
+                    for move in changes[kind]:
+                        edited = " (edited)" if move.get('similar') else ""
+                        content.append(f"  [magenta]→[/magenta] {escape(move['from'])} → {escape(move['to'])}{edited}")
             
             if content:
                 panel_content = "\n".join(content)
@@ -122,21 +137,43 @@ class SnapshotFormatter:
                 )
                 self.console.print(panel)
 
+    def format_timeline_step(self, step: Dict[str, Any], summary: Dict[str, Dict[str, int]]) -> None:
+        """Print one line of a timeline: when, which snapshot, and change counts per section."""
+        start = datetime.fromtimestamp(step['from']['timestamp'])
+        end = datetime.fromtimestamp(step['to']['timestamp'])
+        end_format = "%H:%M:%S" if end.date() == start.date() else "%Y-%m-%d %H:%M:%S"
+        symbols = {'added': '[green]+{}[/green]', 'removed': '[red]-{}[/red]',
+                   'changed': '[blue]~{}[/blue]', 'moved': '[magenta]→{}[/magenta]'}
+        
+        sections = []
+        for section, counts in summary.items():
+            changes = " ".join(symbols[kind].format(count) for kind, count in counts.items())
+            sections.append(f"[yellow]{escape(section)}[/yellow] {changes}")
+        
+        self.console.print(
+            f"[dim]{start.strftime('%Y-%m-%d %H:%M:%S')} → {end.strftime(end_format)}[/dim] "
+            f"[cyan]{escape(step['to']['name'])}[/cyan]  " + " · ".join(sections)
+        )
+
     def _format_value(self, value: Any) -> str:
-        """Format a value for display."""
+        """Format a value for display, escaped for rich markup."""
         if isinstance(value, str):
             # Truncate long strings
             if len(value) > 50:
-                return f'"{value[:47]}..."'
-            return f'"{value}"'
+                return escape(f'"{value[:47]}..."')
+            return escape(f'"{value}"')
         elif isinstance(value, (int, float)):
             return str(value)
         elif isinstance(value, list):
-            return f"[list with {len(value)} items]"
+            # Short numeric lists (per-core CPU, load averages) are shown in full
+            if len(value) <= MAX_INLINE_ITEMS and all(
+                    isinstance(item, (int, float)) and not isinstance(item, bool) for item in value):
+                return escape(str(value))
+            return escape(f"[list with {len(value)} items]")
         elif isinstance(value, dict):
-            return f"[dict with {len(value)} keys]"
+            return escape(f"[dict with {len(value)} keys]")
         else:
-            return str(value)
+            return escape(str(value))
 
     def _format_list_item(self, item: Any) -> str:
         """Format a list item for display."""
@@ -149,7 +186,9 @@ class SnapshotFormatter:
                 return f"{item['path']} ({item.get('size', 'unknown')} bytes)"
             # Format network-like items
             elif 'local' in item:
-                return f"{item['local']} → {item.get('remote', 'N/A')} ({item.get('status', 'unknown')})"
+                label = f"{item['local']} → {item.get('remote', 'N/A')} ({item.get('status', 'unknown')})"
+                # Aggregated connection groups carry a count instead of a pid
+                return f"{label} × {item['count']}" if 'count' in item else label
             # Generic dict formatting
             else:
                 key_items = list(item.items())[:2]  # Show first 2 key-value pairs
@@ -0,0 +1,218 @@
+"""
+Git index module - blob SHAs of clean files read straight from .git/index.
+
+A git checkout records, for every tracked file, the stat data it had when
+last staged and the SHA-1 of its contents as a blob. A file whose stat
+data still matches is unchanged, so its blob SHA can serve as the file's
+fingerprint without reading it. The index is parsed directly; the git CLI
+is never run.
+"""
+
+import hashlib
+import os
+import re
+import struct
+from typing import Dict, Optional, Tuple
+
+# Fingerprint algorithm of files in a git checkout: SHA-1 over "blob <size>\0" + contents
+GIT_BLOB = 'git-blob'
+
+# Entry flags
+_EXTENDED = 0x4000
+_ASSUME_VALID = 0x8000
+_STAGE_MASK = 0x3000
+# Extended flags (index version 3+)
+_SKIP_WORKTREE = 0x4000
+_INTENT_TO_ADD = 0x2000
+
+# Mode of a regular (possibly executable) file; symlinks and submodules are skipped
+_REGULAR_FILE = 0o100000
+_OBJECT_TYPE_MASK = 0o170000
+
+# ctime, mtime (seconds and nanoseconds), dev, ino, mode, uid, gid, size
+_STAT = struct.Struct('>10I')
+
+# (mtime s, mtime ns, ctime s, ctime ns, ino, uid, gid, size), as git truncates them to 32 bits
+StatKey = Tuple[int, int, int, int, int, int, int, int]
+
+
+def new_blob_hash(size: int):
+    """Return a SHA-1 object primed with the header of a blob of the given size."""
+    digest = hashlib.sha1()
+    digest.update(b'blob %d\0' % size)
+    return digest
+
+
+def stat_key(stat: os.stat_result) -> StatKey:
+    """Return the stat fields git compares, truncated to 32 bits as in the index."""
+    mask = 0xFFFFFFFF
+    return (
+        (stat.st_mtime_ns // 10 ** 9) & mask, stat.st_mtime_ns % 10 ** 9,
+        (stat.st_ctime_ns // 10 ** 9) & mask, stat.st_ctime_ns % 10 ** 9,
+        stat.st_ino & mask, stat.st_uid & mask, stat.st_gid & mask, stat.st_size & mask,
+    )
+
+
+def find_git_dir(directory: str) -> Optional[Tuple[str, str]]:
+    """
+    Find the git checkout containing a directory.
+
+    Args:
+        directory: Directory inside a work tree, or its root.
+
+    Returns:
+        (work tree root, git directory), or None outside a checkout. A .git
+        file (worktrees, submodules) is followed to the directory it names.
+    """
+    current = os.path.abspath(directory)
+    while True:
+        dot_git = os.path.join(current, '.git')
+        if os.path.isdir(dot_git):
+            return current, dot_git
+        if os.path.isfile(dot_git):
+            try:
+                with open(dot_git, 'r', encoding='utf-8') as f:
+                    line = f.readline().strip()
+            except OSError:
+                return None
+            if not line.startswith('gitdir:'):
+                return None
+            return current, os.path.normpath(os.path.join(current, line[len('gitdir:'):].strip()))
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def _varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Decode git's offset varint used by index version 4; returns (value, new position)."""
+    byte = data[pos]
+    pos += 1
+    value = byte & 0x7F
+    while byte & 0x80:
+        byte = data[pos]
+        pos += 1
+        value = ((value + 1) << 7) | (byte & 0x7F)
+    return value, pos
+
+
+def _uses_sha1(git_dir: str) -> bool:
+    """Check that a repository uses SHA-1 object names (not extensions.objectFormat=sha256)."""
+    try:
+        with open(os.path.join(git_dir, 'config'), 'r', encoding='utf-8', errors='replace') as f:
+            config = f.read()
+    except OSError:
+        return True
+    match = re.search(r'^\s*objectformat\s*=\s*(\S+)', config, re.IGNORECASE | re.MULTILINE)
+    return match is None or match.group(1).lower() == 'sha1'
+
+
+class GitIndex:
+    """
+    Clean-file lookup over a parsed .git/index.
+
+    Only stage-0 regular files are kept. Entries that git itself would not
+    trust are left out and so get hashed: assume-valid, skip-worktree and
+    intent-to-add entries, and "racily clean" entries modified no earlier
+    than the index was written (their contents may have changed within
+    the same timestamp).
+    """
+
+    def __init__(self, entries: Dict[str, Tuple[StatKey, str]], root: str):
+        """
+        Wrap parsed entries.
+
+        Args:
+            entries: '/'-separated path relative to the work tree -> (stat key, blob SHA).
+            root: Work tree root.
+        """
+        self.entries = entries
+        self.root = root
+
+    @classmethod
+    def load(cls, root: str, git_dir: str) -> Optional['GitIndex']:
+        """
+        Parse the index of a checkout.
+
+        Returns:
+            The index, or None if it is missing, unreadable, in an
+            unsupported format (split index, SHA-256 repository) or corrupt.
+        """
+        path = os.path.join(git_dir, 'index')
+        if not _uses_sha1(git_dir):
+            return None
+        try:
+            index_stat = os.stat(path)
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            entries = _parse(data, index_stat.st_mtime_ns)
+        except (struct.error, IndexError, ValueError):
+            return None
+        if entries is None:
+            return None
+        return cls(entries, root)
+
+    def lookup(self, rel_path: str, stat: os.stat_result) -> Optional[str]:
+        """
+        Return the blob SHA of a tracked file whose stat data matches the index.
+
+        Args:
+            rel_path: Path relative to the work tree root.
+            stat: Current stat of the file.
+        """
+        found = self.entries.get(rel_path.replace(os.sep, '/'))
+        if found is None or found[0] != stat_key(stat):
+            return None
+        return found[1]
+
+
+def _parse(data: bytes, index_mtime_ns: int) -> Optional[Dict[str, Tuple[StatKey, str]]]:
+    """Parse index file contents; None for formats the fast path does not handle."""
+    signature, version, count = struct.unpack_from('>4sII', data, 0)
+    if signature != b'DIRC' or version not in (2, 3, 4):
+        raise ValueError('not a git index')
+
+    racy_from = (index_mtime_ns // 10 ** 9, index_mtime_ns % 10 ** 9)
+    entries: Dict[str, Tuple[StatKey, str]] = {}
+    pos = 12
+    name = b''
+    for _ in range(count):
+        start = pos
+        (ctime_s, ctime_ns, mtime_s, mtime_ns, _dev, ino,
+         mode, uid, gid, size) = _STAT.unpack_from(data, pos)
+        sha = data[pos + 40:pos + 60]
+        flags, = struct.unpack_from('>H', data, pos + 60)
+        pos += 62
+        extended = 0
+        if flags & _EXTENDED:
+            extended, = struct.unpack_from('>H', data, pos)
+            pos += 2
+
+        if version == 4:
+            strip, pos = _varint(data, pos)
+            end = data.index(b'\0', pos)
+            name = name[:len(name) - strip] + data[pos:end]
+            pos = end + 1
+        else:
+            end = data.index(b'\0', pos)
+            name = data[pos:end]
+            # Entries are NUL-padded to a multiple of 8 bytes
+            pos = start + ((end - start + 8) & ~7)
+
+        if (flags & (_STAGE_MASK | _ASSUME_VALID) or extended & (_SKIP_WORKTREE | _INTENT_TO_ADD)
+                or mode & _OBJECT_TYPE_MASK != _REGULAR_FILE
+                or (mtime_s, mtime_ns) >= racy_from):
+            continue
+        key = (mtime_s, mtime_ns, ctime_s, ctime_ns, ino, uid, gid, size)
+        entries[name.decode('utf-8', 'surrogateescape')] = (key, sha.hex())
+
+    # A split index keeps most entries in a shared index file
+    while pos + 8 <= len(data) - 20:
+        extension, length = struct.unpack_from('>4sI', data, pos)
+        if extension == b'link':
+            return None
+        pos += 8 + length
+    return entries
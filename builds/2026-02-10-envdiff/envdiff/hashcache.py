@@ -0,0 +1,155 @@
+"""
+Hash cache module - persistent file digests keyed on file identity and stat data.
+"""
+
+import os
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+from .storage import get_data_dir
+
+
+class FileHashCache:
+    """
+    SQLite-backed cache of file digests.
+
+    Entries are keyed by (device, inode, algorithm) and validated against
+    size, mtime_ns and ctime_ns, so a file whose stat data is unchanged can
+    reuse its digest without being opened. Entries not seen for max_age
+    seconds are evicted on flush.
+    """
+
+    # Files modified this recently are not cached: a write landing within the
+    # same timestamp granularity would otherwise go unnoticed.
+    RACY_WINDOW = 2.0
+
+    # Only refresh last_seen when it is older than this, to keep hits read-only
+    TOUCH_INTERVAL = 3600.0
+
+    def __init__(self, db_path: Optional[str] = None, max_age: float = 30 * 86400):
+        """
+        Initialize the cache.
+        
+        Args:
+            db_path: Path to the cache database. Defaults to file_hashes.db
+                next to the snapshot database.
+            max_age: Seconds an unseen entry is kept before eviction.
+        """
+        if db_path is None:
+            db_path = str(get_data_dir() / "file_hashes.db")
+        
+        self.db_path = db_path
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._pending: List[Tuple] = []
+        self._touched: List[Tuple] = []
+
+    def open(self) -> None:
+        """Open the cache database, creating the table if needed."""
+        if self._conn is not None:
+            return
+        
+        self._conn = sqlite3.connect(self.db_path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                algorithm TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                ctime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                last_seen REAL NOT NULL,
+                PRIMARY KEY (dev, ino, algorithm)
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_file_hashes_last_seen ON file_hashes (last_seen)"
+        )
+        self._conn.commit()
+
+    def lookup(self, stat: os.stat_result, algorithm: str) -> Optional[str]:
+        """
+        Return the cached digest for a file if its stat data still matches.
+        
+        Args:
+            stat: Result of os.stat() for the file.
+            algorithm: Name of the hash algorithm the digest was made with.
+            
+        Returns:
+            Cached digest, or None on a miss.
+        """
+        self.open()
+        row = self._conn.execute(
+            "SELECT size, mtime_ns, ctime_ns, digest, last_seen FROM file_hashes "
+            "WHERE dev = ? AND ino = ? AND algorithm = ?",
+            (stat.st_dev, stat.st_ino, algorithm)
+        ).fetchone()
+        
+        if row and row[:3] == (stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns):
+            self.hits += 1
+            now = time.time()
+            if now - row[4] > self.TOUCH_INTERVAL:
+                self._touched.append((now, stat.st_dev, stat.st_ino, algorithm))
+            return row[3]
+        
+        self.misses += 1
+        return None
+
+    def store(self, stat: os.stat_result, algorithm: str, digest: str) -> None:
+        """Queue a freshly computed digest to be written on flush."""
+        now = time.time()
+        if now - stat.st_mtime < self.RACY_WINDOW:
+            return
+        
+        self._pending.append((
+            stat.st_dev, stat.st_ino, algorithm, stat.st_size,
+            stat.st_mtime_ns, stat.st_ctime_ns, digest, now
+        ))
+
+    def flush(self, evict: bool = True) -> None:
+        """
+        Write queued entries and evict entries that have not been seen recently.
+
+        Args:
+            evict: Also delete entries older than max_age. Batched writes
+                during a walk skip this; the final flush on close does it.
+        """
+        if self._conn is None and not self._pending:
+            return
+        
+        self.open()
+        with self._conn:
+            if self._pending:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO file_hashes "
+                    "(dev, ino, algorithm, size, mtime_ns, ctime_ns, digest, last_seen) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._pending
+                )
+            if self._touched:
+                self._conn.executemany(
+                    "UPDATE file_hashes SET last_seen = ? "
+                    "WHERE dev = ? AND ino = ? AND algorithm = ?",
+                    self._touched
+                )
+            if evict:
+                self._conn.execute(
+                    "DELETE FROM file_hashes WHERE last_seen < ?",
+                    (time.time() - self.max_age,)
+                )
+        
+        self._pending = []
+        self._touched = []
+
+    def close(self) -> None:
+        """Flush pending writes and close the database."""
+        try:
+            self.flush()
+        finally:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,317 @@
+"""
+Ignore module - compiled .gitignore-style rules deciding which files are collected.
+"""
+
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Pattern, Tuple
+
+# Per-directory ignore files, lowest precedence first
+IGNORE_FILES = ('.gitignore', '.envdiffignore')
+
+# Repository-wide excludes read from the root of a watched directory
+GIT_EXCLUDE = os.path.join('.git', 'info', 'exclude')
+
+# Rules applied below every per-directory ignore file
+DEFAULT_PATTERNS = (
+    # Hidden files and directories: .git, .svn, .hg, .venv, .env, .DS_Store, ...
+    '.*',
+    '__pycache__/', '*.pyc', '*.pyo', '*.pyd',
+    '*.tmp', '*.temp', '*.swp', '*.swo',
+    'node_modules/', 'venv/',
+)
+
+# (negated, regex for files, regex for directories), in evaluation order
+_Block = Tuple[bool, Optional[Pattern[str]], Optional[Pattern[str]]]
+
+
+def translate(glob: str) -> str:
+    """
+    Translate a gitignore glob into a regular expression.
+
+    '*' and '?' never match '/', '[...]' is a character class ('!' or '^'
+    negates it), and '**' as a whole path component matches any number of
+    directories. A backslash escapes the next character.
+
+    Args:
+        glob: Pattern without its '!' prefix or trailing '/'.
+
+    Returns:
+        Regular expression source, unanchored.
+    """
+    out: List[str] = []
+    i, n = 0, len(glob)
+    while i < n:
+        c = glob[i]
+        if c == '*':
+            if glob.startswith('**', i) and (i == 0 or glob[i - 1] == '/'):
+                if i + 2 == n:
+                    # Trailing '/**' (or a lone '**') matches everything inside
+                    out.append('.*')
+                    i += 2
+                    continue
+                if glob[i + 2] == '/':
+                    # Leading or inner '**/' matches zero or more directories
+                    out.append('(?:.*/)?')
+                    i += 3
+                    continue
+            while i + 1 < n and glob[i + 1] == '*':
+                i += 1
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = i + 1
+            if j < n and glob[j] in '!^':
+                j += 1
+            if j < n and glob[j] == ']':
+                j += 1
+            while j < n and glob[j] != ']':
+                j += 1
+            if j >= n:
+                out.append(re.escape(c))
+            else:
+                body = glob[i + 1:j]
+                if body[0] in '!^':
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(glob[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+def parse_pattern(line: str) -> Optional[Tuple[str, bool, bool]]:
+    """
+    Parse one line of an ignore file.
+
+    Blank lines and '#' comments are skipped, '!' negates the pattern,
+    a trailing '/' restricts it to directories, and a pattern containing
+    any other '/' is anchored to the directory of its ignore file; all
+    others match a name at any depth.
+
+    Returns:
+        (regex matching the path relative to the ignore file's directory,
+        negated, directories only), or None for lines without a pattern.
+    """
+    line = line.rstrip('\r\n')
+    if not line or line.startswith('#'):
+        return None
+
+    # Trailing spaces are ignored unless escaped
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '
+    line = stripped
+
+    negated = line.startswith('!')
+    if negated:
+        line = line[1:]
+    elif line.startswith(('\\!', '\\#')):
+        line = line[1:]
+
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+
+    regex = translate(line.lstrip('/'))
+    if '/' not in line:
+        regex = '(?:.*/)?' + regex
+    return regex, negated, dir_only
+
+
+class IgnoreRules:
+    """
+    One ordered list of ignore patterns, compiled for matching.
+
+    Later patterns override earlier ones, so consecutive patterns with the
+    same polarity are merged into a single alternation and the blocks are
+    tried last to first: a match costs one regex per change of polarity,
+    not one per pattern.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        """
+        Compile patterns.
+
+        Args:
+            patterns: Lines in .gitignore syntax.
+        """
+        groups: List[Tuple[bool, List[str], List[str]]] = []
+        for line in patterns:
+            parsed = parse_pattern(line)
+            if parsed is None:
+                continue
+            regex, negated, dir_only = parsed
+            if not groups or groups[-1][0] != negated:
+                groups.append((negated, [], []))
+            if not dir_only:
+                groups[-1][1].append(regex)
+            groups[-1][2].append(regex)
+
+        self._blocks: List[_Block] = [
+            (negated, _compile(file_regexes), _compile(dir_regexes))
+            for negated, file_regexes, dir_regexes in reversed(groups)
+        ]
+
+    def __bool__(self) -> bool:
+        return bool(self._blocks)
+
+    @classmethod
+    def from_file(cls, path: str) -> Optional['IgnoreRules']:
+        """Read an ignore file, returning None if it is missing, unreadable or empty."""
+        try:
+            with open(path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+                rules = cls(f.read().splitlines())
+        except OSError:
+            return None
+        return rules or None
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Match a '/'-separated path relative to the rules' directory.
+
+        Returns:
+            True if the last matching pattern ignores the path, False if it
+            re-includes it, None if no pattern matches.
+        """
+        for negated, file_regex, dir_regex in self._blocks:
+            regex = dir_regex if is_dir else file_regex
+            if regex is not None and regex.match(rel_path):
+                return not negated
+        return None
+
+
+def _compile(regexes: List[str]) -> Optional[Pattern[str]]:
+    """Compile alternatives into one fully-anchored regex."""
+    if not regexes:
+        return None
+    return re.compile('(?:' + '|'.join(regexes) + r')\Z', re.DOTALL)
+
+
+class IgnoreMatcher:
+    """
+    .gitignore/.envdiffignore semantics for one watched directory.
+
+    Ignore files are read lazily, once per directory, as paths beneath them
+    are matched. Rules in deeper directories take precedence over those
+    above them, .envdiffignore over .gitignore in the same directory, and
+    all of them over .git/info/exclude and the default patterns. As in git,
+    a file inside an ignored directory cannot be re-included.
+    """
+
+    def __init__(self, root: str, patterns: Iterable[str] = DEFAULT_PATTERNS,
+                 ignore_files: Iterable[str] = IGNORE_FILES):
+        """
+        Initialize the matcher.
+
+        Args:
+            root: Watched directory that paths are relative to.
+            patterns: Default rules, applied below every ignore file.
+            ignore_files: Names of per-directory ignore files to honour.
+                Empty disables them, along with .git/info/exclude.
+        """
+        self.root = root
+        self.ignore_files = tuple(ignore_files)
+        self._defaults = IgnoreRules(patterns)
+        # '/'-separated directory relative to root -> its rules, lowest precedence first
+        self._rules: Dict[str, List[IgnoreRules]] = {}
+
+    def _rules_in(self, rel_dir: str, listing: Optional[Iterable[str]] = None) -> List[IgnoreRules]:
+        """
+        Return the rules read from a directory's ignore files.
+
+        Args:
+            rel_dir: '/'-separated directory relative to root.
+            listing: Names in the directory, when the caller has already
+                listed it; only ignore files present in it are opened.
+        """
+        rules = self._rules.get(rel_dir)
+        if rules is None:
+            rules = []
+            names = ([GIT_EXCLUDE] if not rel_dir else []) + list(self.ignore_files)
+            if not self.ignore_files:
+                names = []
+            elif listing is not None:
+                present = set(listing)
+                names = [name for name in names if name.split(os.sep)[0] in present]
+
+            directory = os.path.join(self.root, rel_dir) if rel_dir else self.root
+            for name in names:
+                loaded = IgnoreRules.from_file(os.path.join(directory, name))
+                if loaded is not None:
+                    rules.append(loaded)
+            self._rules[rel_dir] = rules
+        return rules
+
+    def match(self, rel_path: str, is_dir: bool) -> bool:
+        """
+        Check whether a path is ignored, assuming its parent directories are not.
+
+        Args:
+            rel_path: Path relative to root.
+            is_dir: The path is a directory; directory-only patterns apply.
+        """
+        rel_path = rel_path.replace(os.sep, '/')
+        parts = rel_path.split('/')
+        for depth in range(len(parts) - 1, -1, -1):
+            rules = self._rules_in('/'.join(parts[:depth]))
+            if not rules:
+                continue
+            sub_path = '/'.join(parts[depth:])
+            for ruleset in reversed(rules):
+                result = ruleset.match(sub_path, is_dir)
+                if result is not None:
+                    return result
+        return bool(self._defaults.match(rel_path, is_dir))
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        """Check whether a path is ignored, itself or through any parent directory."""
+        parts = rel_path.replace(os.sep, '/').split('/')
+        for depth in range(1, len(parts)):
+            if self.match('/'.join(parts[:depth]), True):
+                return True
+        return self.match('/'.join(parts), is_dir)
+
+    def walk(self, rel_dir: str = '') -> Iterator[os.DirEntry]:
+        """
+        Yield the files under a directory that are not ignored.
+
+        Ignored directories are pruned as they are reached, so nothing
+        beneath them is listed. A directory's files are yielded in name
+        order before its subdirectories are descended into; symlinked
+        directories are not followed and unreadable directories are skipped.
+
+        Args:
+            rel_dir: Directory relative to root to start from. It is assumed
+                not to be ignored itself.
+        """
+        stack = [rel_dir.replace(os.sep, '/')]
+        while stack:
+            current = stack.pop()
+            directory = os.path.join(self.root, current) if current else self.root
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError:
+                continue
+            self._rules_in(current, [entry.name for entry in entries])
+
+            subdirs = []
+            for entry in entries:
+                rel_path = f"{current}/{entry.name}" if current else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not self.match(rel_path, True):
+                            subdirs.append(rel_path)
+                    elif entry.is_file() and not self.match(rel_path, False):
+                        yield entry
+                except OSError:
+                    continue
+            # Push in reverse so directories are visited in name order
+            stack.extend(reversed(subdirs))
@@ -0,0 +1,226 @@
+"""
+Inotify module - minimal ctypes binding to Linux inotify for recursive directory watches.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from typing import Callable, Dict, Iterable, Optional, Set
+
+# Event masks from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+# struct inotify_event { int wd; uint32_t mask, cookie, len; char name[]; }
+_EVENT = struct.Struct('iIII')
+
+_libc = None
+
+
+def _load_libc():
+    """Load libc with inotify symbols, or return None when unavailable."""
+    global _libc
+    if _libc is None:
+        if not sys.platform.startswith('linux'):
+            _libc = False
+        else:
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+                _libc = libc
+            except (OSError, AttributeError):
+                _libc = False
+    return _libc or None
+
+
+def is_available() -> bool:
+    """Check whether inotify can be used on this platform."""
+    return _load_libc() is not None
+
+
+class InotifyOverflow(Exception):
+    """Raised when the kernel event queue overflowed and events were lost."""
+
+
+class InotifyWatcher:
+    """
+    Recursive inotify watcher returning the set of touched paths.
+
+    Every directory under the roots gets its own watch (inotify is not
+    recursive); directories created or moved in later are added as their
+    events arrive. If one of those cannot be watched (typically ENOSPC:
+    fs.inotify.max_user_watches is exhausted), the watcher is marked
+    degraded: its events no longer cover the whole tree.
+    """
+
+    def __init__(self, roots: Iterable[str], skip_dir: Optional[Callable[[str], bool]] = None):
+        """
+        Initialize the watcher.
+
+        Args:
+            roots: Directories to watch recursively.
+            skip_dir: Predicate on a directory's absolute path; matching
+                directories are neither watched nor descended into.
+        """
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.skip_dir = skip_dir or (lambda path: False)
+        self._fd = -1
+        self._watches: Dict[int, str] = {}
+        self.degraded = False
+
+    def start(self) -> None:
+        """Create the inotify instance and watch every directory under the roots."""
+        libc = _load_libc()
+        if libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._fd = fd
+
+        for root in self.roots:
+            if os.path.isdir(root):
+                self._add_tree(root)
+
+    def fileno(self) -> int:
+        """Return the inotify file descriptor."""
+        return self._fd
+
+    def _add_watch(self, path: str) -> None:
+        """Add a watch on a single directory."""
+        wd = _libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                # Directory vanished or is unreadable; nothing to watch
+                return
+            raise OSError(err, f"inotify_add_watch failed for {path}: {os.strerror(err)}")
+        self._watches[wd] = path
+
+    def _add_tree(self, top: str) -> None:
+        """Watch a directory and every non-skipped directory beneath it."""
+        for root, dirs, _ in os.walk(top):
+            dirs[:] = [d for d in dirs if not self.skip_dir(os.path.join(root, d))]
+            self._add_watch(root)
+
+    def read_events(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Wait up to timeout seconds for events and return the touched paths.
+
+        Returns:
+            Absolute paths that were created, modified, moved or deleted.
+            Empty if nothing happened within the timeout.
+
+        Raises:
+            InotifyOverflow: The kernel queue overflowed; callers must rescan.
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        touched: Set[str] = set()
+        overflow = False
+
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+
+            offset = 0
+            while offset + _EVENT.size <= len(buf):
+                wd, mask, _cookie, length = _EVENT.unpack_from(buf, offset)
+                name = buf[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+                offset += _EVENT.size + length
+
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+
+                directory = self._watches.get(wd)
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                if directory is None:
+                    continue
+
+                path = os.path.join(directory, os.fsdecode(name)) if name else directory
+                if name and mask & IN_ISDIR and self.skip_dir(path):
+                    continue
+                touched.add(path)
+
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._add_tree(path)
+                    except OSError:
+                        # Changes below path would go unseen; callers must stop relying on events
+                        self.degraded = True
+
+        if overflow:
+            raise InotifyOverflow("inotify event queue overflowed")
+        return touched
+
+    def collect(self, timeout: float, debounce: float = 0.2, max_latency: float = 2.0) -> Set[str]:
+        """
+        Wait for a burst of events and return all paths touched during it.
+
+        Blocks up to timeout for the first event, then keeps reading until no
+        event arrives for debounce seconds or max_latency seconds have passed
+        since the first event, whichever comes first.
+        """
+        touched = self.read_events(timeout)
+        if not touched:
+            return touched
+
+        first = time.monotonic()
+        while True:
+            remaining = max_latency - (time.monotonic() - first)
+            if remaining <= 0:
+                break
+            more = self.read_events(min(debounce, remaining))
+            if not more:
+                break
+            touched |= more
+        return touched
+
+    def close(self) -> None:
+        """Close the inotify instance, dropping all watches."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+            self._watches.clear()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
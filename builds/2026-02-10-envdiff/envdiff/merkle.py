@@ -0,0 +1,201 @@
+"""
+Merkle module - directory digest trees over the files section.
+
+A files section is {'tree': node, 'entries': ...}, with entries sorted by
+path: a list, or an EntryStream (see envdiff.entrystore) for large
+sections. Each node holds a 'hash' over its whole subtree, a 'files'
+digest of the entries directly inside it (if any) and its subdirectories
+under 'dirs' (if any). Two sections whose root hashes match are identical; when
+they differ, only subtrees whose hashes differ need to be compared.
+"""
+
+import hashlib
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .codec import canonical_json
+
+# Sorts directly after the path separator: prefix + _AFTER_SEP bounds every
+# path under prefix + os.sep in a path-sorted list
+_AFTER_SEP = chr(ord(os.sep) + 1)
+
+
+def _digest(data: Any) -> str:
+    """Return the SHA-256 of a value's canonical JSON."""
+    return hashlib.sha256(canonical_json(data)).hexdigest()
+
+
+class TreeBuilder:
+    """
+    Builds the digest tree from entries fed in path order, in one pass.
+
+    A directory's entries are contiguous in path order, so only the
+    directories on the current path are open at any time: memory grows
+    with the number of directories, not the number of files.
+    """
+
+    def __init__(self):
+        # Open directories from the root down: (name, files digest or None, subdirectory nodes)
+        self._stack: List[Tuple[str, Any, Dict[str, Dict[str, Any]]]] = [('', None, {})]
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        """Add the next entry in path order."""
+        parts = entry['path'].split(os.sep)[:-1]
+
+        # Close the open directories that do not contain this entry
+        depth = 0
+        while depth < len(parts) and depth + 1 < len(self._stack) \
+                and self._stack[depth + 1][0] == parts[depth]:
+            depth += 1
+        while len(self._stack) > depth + 1:
+            self._close()
+        for name in parts[depth:]:
+            self._stack.append((name, None, {}))
+
+        name, files, dirs = self._stack[-1]
+        if files is None:
+            files = hashlib.sha256()
+            self._stack[-1] = (name, files, dirs)
+        files.update(canonical_json(entry) + b'\n')
+
+    def _close(self) -> None:
+        """Finish the innermost open directory and attach it to its parent."""
+        name, files, dirs = self._stack.pop()
+        self._stack[-1][2][name] = _node(files, dirs)
+
+    def finish(self) -> Dict[str, Any]:
+        """Close every open directory and return the root node."""
+        while len(self._stack) > 1:
+            self._close()
+        _, files, dirs = self._stack[0]
+        return _node(files, dirs)
+
+
+def _node(files: Any, dirs: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Build a node from its files digest object and finished subdirectories."""
+    node: Dict[str, Any] = {}
+    if files is not None:
+        node['files'] = files.hexdigest()
+    if dirs:
+        node['dirs'] = dict(sorted(dirs.items()))
+    node['hash'] = _digest([node.get('files', ''),
+                            [[name, subdir['hash']] for name, subdir in node.get('dirs', {}).items()]])
+    return node
+
+
+def build_tree(entries: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build the digest tree of file entries.
+
+    Args:
+        entries: File entries sorted by path, relative to the watch directory.
+
+    Returns:
+        Root node.
+    """
+    builder = TreeBuilder()
+    for entry in entries:
+        builder.add(entry)
+    return builder.finish()
+
+
+def tree_section(entries: Any) -> Dict[str, Any]:
+    """Return the files section for entries sorted by path (a list or an EntryStream)."""
+    return {'tree': build_tree(entries), 'entries': entries}
+
+
+def is_tree_section(data: Any) -> bool:
+    """Check whether section data is a files section with a digest tree."""
+    return isinstance(data, dict) and 'tree' in data and 'entries' in data
+
+
+def section_entries(data: Any) -> Any:
+    """Return the entries of a tree section; other data (e.g. a legacy flat list) as-is."""
+    return data['entries'] if is_tree_section(data) else data
+
+
+def subtree(tree: Dict[str, Any], rel_dir: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the node of a directory, or None if no file lies beneath it.
+
+    Comparing the 'hash' of the same directory in two trees proves in one
+    comparison whether anything under it changed.
+    """
+    node = tree
+    for name in rel_dir.split(os.sep) if rel_dir not in ('', '.') else ():
+        node = node.get('dirs', {}).get(name)
+        if node is None:
+            return None
+    return node
+
+
+def changed_dirs(node1: Optional[Dict[str, Any]], node2: Optional[Dict[str, Any]],
+                 directory: str = '') -> Iterator[Tuple[str, bool]]:
+    """
+    Descend two trees in step, skipping subtrees whose hashes match.
+
+    Yields:
+        (directory, recursive): recursive is True for a directory present
+        on one side only, whose whole subtree differs; otherwise only the
+        files directly inside the directory differ.
+    """
+    if node1 is None or node2 is None:
+        yield directory, True
+        return
+    if node1['hash'] == node2['hash']:
+        return
+
+    if node1.get('files') != node2.get('files'):
+        yield directory, False
+
+    dirs1 = node1.get('dirs', {})
+    dirs2 = node2.get('dirs', {})
+    prefix = directory + os.sep if directory else ''
+    for name in sorted(dirs1.keys() | dirs2.keys()):
+        yield from changed_dirs(dirs1.get(name), dirs2.get(name), prefix + name)
+
+
+def _bisect(entries: List[Dict[str, Any]], path: str, lo: int, hi: int) -> int:
+    """Return the first index in entries[lo:hi] whose path is not below path."""
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if entries[mid]['path'] < path:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def entries_in(entries: Any, directory: str, recursive: bool) -> Iterable[Dict[str, Any]]:
+    """
+    Return the entries inside a directory of path-sorted entries.
+
+    Entries under subdirectories are skipped with a binary search per
+    subdirectory unless recursive is set, so the cost is proportional to
+    the directory's own files, not to its subtree. An EntryStream answers
+    with a range query instead.
+    """
+    if not isinstance(entries, list):
+        return entries.under(directory, recursive)
+
+    if directory:
+        prefix = directory + os.sep
+        lo = _bisect(entries, prefix, 0, len(entries))
+        hi = _bisect(entries, directory + _AFTER_SEP, lo, len(entries))
+    else:
+        prefix, lo, hi = '', 0, len(entries)
+
+    if recursive:
+        return entries[lo:hi]
+
+    found = []
+    index = lo
+    while index < hi:
+        name, sep, _ = entries[index]['path'][len(prefix):].partition(os.sep)
+        if sep:
+            index = _bisect(entries, prefix + name + _AFTER_SEP, index, hi)
+            continue
+        found.append(entries[index])
+        index += 1
+    return found
+
@@ -0,0 +1,153 @@
+"""
+Package cache module - persistent package inventories keyed by install-directory fingerprints.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from .storage import get_data_dir
+
+
+def directory_fingerprint(paths: Iterable[str], children_of: Iterable[str] = ()) -> Optional[str]:
+    """
+    Fingerprint install directories by their mtimes and entry counts.
+
+    Package managers install, upgrade and remove packages by adding,
+    renaming or deleting entries in these directories, which changes their
+    mtime and usually their entry count.
+
+    Args:
+        paths: Directories whose mtime and entry count are fingerprinted.
+        children_of: Directories whose immediate subdirectories' mtimes are
+            fingerprinted too (e.g. the Homebrew Cellar, where an upgrade
+            adds a version directory under the formula's directory).
+
+    Returns:
+        Hex digest, or None if any of the directories cannot be read.
+    """
+    state: List[Any] = []
+    try:
+        for path in paths:
+            state.append([path, os.stat(path).st_mtime_ns, len(os.listdir(path))])
+        for path in children_of:
+            with os.scandir(path) as entries:
+                state.append([path, sorted(
+                    [entry.name, entry.stat(follow_symlinks=False).st_mtime_ns]
+                    for entry in entries if entry.is_dir(follow_symlinks=False)
+                )])
+    except OSError:
+        return None
+    return hashlib.sha256(json.dumps(state, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class PackageCache:
+    """
+    SQLite-backed LRU cache of package inventories.
+
+    Each entry holds one package manager's inventory under the fingerprint
+    of its install directories; a matching fingerprint means the inventory
+    can be reused without running the backend. Least recently used entries
+    are evicted once the stored inventories exceed max_bytes.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_bytes: int = 4 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            db_path: Path to the cache database. Defaults to package_cache.db
+                next to the snapshot database.
+            max_bytes: Upper bound on the total size of stored inventories.
+        """
+        if db_path is None:
+            db_path = str(get_data_dir() / "package_cache.db")
+
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+
+    def open(self) -> None:
+        """Open the cache database, creating the table if needed."""
+        if self._conn is not None:
+            return
+
+        self._conn = sqlite3.connect(self.db_path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS package_cache (
+                manager TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                data TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (manager, fingerprint)
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_package_cache_last_used ON package_cache (last_used)"
+        )
+        self._conn.commit()
+
+    def get(self, manager: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached inventory for a manager's install-directory fingerprint.
+
+        Returns:
+            Cached inventory, or None on a miss.
+        """
+        self.open()
+        row = self._conn.execute(
+            "SELECT data FROM package_cache WHERE manager = ? AND fingerprint = ?",
+            (manager, fingerprint)
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        with self._conn:
+            self._conn.execute(
+                "UPDATE package_cache SET last_used = ? WHERE manager = ? AND fingerprint = ?",
+                (time.time(), manager, fingerprint)
+            )
+        return json.loads(row[0])
+
+    def put(self, manager: str, fingerprint: str, inventory: Dict[str, Any]) -> None:
+        """Store an inventory and evict least recently used entries beyond max_bytes."""
+        self.open()
+        data = json.dumps(inventory, separators=(',', ':'))
+
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO package_cache (manager, fingerprint, data, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (manager, fingerprint, data, len(data), time.time())
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the total size fits max_bytes."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM package_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        victims = []
+        for rowid, size in self._conn.execute(
+                "SELECT rowid, size FROM package_cache ORDER BY last_used ASC"):
+            if total <= self.max_bytes:
+                break
+            victims.append((rowid,))
+            total -= size
+        self._conn.executemany("DELETE FROM package_cache WHERE rowid = ?", victims)
+
+    def close(self) -> None:
+        """Close the database."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
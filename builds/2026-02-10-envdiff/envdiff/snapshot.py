@@ -2,46 +2,183 @@
 Snapshot module - orchestrates data collection from all collectors.
 """
 
+import threading
+import time
 import uuid
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 
+from .codec import SnapshotData, section_hash
 from .collectors import ALL_COLLECTORS
 
 
+# Per-collector deadlines in seconds, keyed by section name (see collector_name)
+DEFAULT_TIMEOUTS = {
+    'process': 15.0,
+    'network': 15.0,
+    'envvars': 5.0,
+    'packages': 60.0,
+    'files': 120.0,
+    'system': 10.0,
+}
+
+
+def collector_name(collector) -> str:
+    """Return the snapshot section name for a collector instance."""
+    return collector.__class__.__name__.replace('Collector', '').lower()
+
+
 class SnapshotEngine:
     """Engine for capturing environment snapshots."""
 
-    def __init__(self, collectors: List = None):
+    def __init__(self, collectors: List = None, concurrent: bool = True,
+                 timeouts: Optional[Dict[str, float]] = None,
+                 default_timeout: float = 30.0):
         """
         Initialize snapshot engine with collectors.
         
         Args:
             collectors: List of collector instances. Defaults to all collectors.
+            concurrent: Run collectors in parallel threads instead of one after another.
+            timeouts: Per-section deadlines in seconds, merged over DEFAULT_TIMEOUTS.
+            default_timeout: Deadline for sections without an explicit timeout.
         """
         self.collectors = collectors or ALL_COLLECTORS
+        self.concurrent = concurrent
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.default_timeout = default_timeout
+        # id(collector) -> worker still running it, possibly left over from an earlier capture
+        self._workers: Dict[int, threading.Thread] = {}
+        self._workers_lock = threading.Lock()
 
-    def capture(self) -> Dict[str, Any]:
+    def capture(self, exclude: Optional[Iterable[str]] = None,
+                include: Optional[Iterable[str]] = None) -> SnapshotData:
         """
         Capture a complete environment snapshot.
         
+        Args:
+            exclude: Section names whose collectors should not run.
+            include: Only run the collectors for these section names.
+            
         Returns:
-            Dictionary containing data from all collectors.
+            Dictionary containing data from all collectors, carrying a
+            canonical fingerprint per section in its fingerprints attribute.
         """
-        snapshot = {}
+        excluded = set(exclude or ())
+        included = None if include is None else set(include)
+        collectors = [c for c in self.collectors
+                      if collector_name(c) not in excluded
+                      and (included is None or collector_name(c) in included)]
         
-        for collector in self.collectors:
-            collector_name = collector.__class__.__name__.replace('Collector', '').lower()
-            
-            try:
-                data = collector.collect()
-                snapshot[collector_name] = data
-            except Exception as e:
-                # If a collector fails, record the error but continue
-                snapshot[collector_name] = {'error': f'Collection failed: {str(e)}'}
+        if self.concurrent:
+            return self._capture_concurrent(collectors)
+
+        snapshot = SnapshotData()
+        
+        for collector in collectors:
+            name = collector_name(collector)
+            data, fingerprint = self._collect_section(collector)
+            snapshot[name] = data
+            snapshot.fingerprints[name] = fingerprint
         
         return snapshot
 
+    def _run_collector(self, collector) -> Any:
+        """Run a single collector, turning exceptions into an error entry."""
+        try:
+            return collector.collect()
+        except Exception as e:
+            # If a collector fails, record the error but continue
+            return {'error': f'Collection failed: {str(e)}'}
+
+    def _collect_section(self, collector) -> Tuple[Any, str]:
+        """Run a collector and fingerprint its data, turning unhashable data into an error entry."""
+        data = self._run_collector(collector)
+        try:
+            return data, section_hash(data)
+        except Exception as e:
+            error = {'error': f'Collection failed: {str(e)}'}
+            return error, section_hash(error)
+
+    def _capture_concurrent(self, collectors: List) -> SnapshotData:
+        """
+        Run every collector on its own worker thread.
+
+        Each collector gets its own deadline measured from the start of the
+        capture, so the total wall time is bounded by the slowest collector
+        rather than the sum of all of them. Workers are daemon threads: a
+        collector that overruns its deadline is abandoned and cannot keep the
+        process alive. While an abandoned worker is still running, its
+        collector is not started again; the section is reported as timed
+        out instead, so a collector that keeps overrunning holds at most
+        one thread and never runs twice at once.
+        """
+        results = {}
+        fingerprints = {}
+        workers = []
+        start = time.monotonic()
+
+        for collector in collectors:
+            name = collector_name(collector)
+
+            def work(collector=collector, name=name):
+                # Fingerprint on the worker so hashing large sections runs in parallel
+                data, fingerprints[name] = self._collect_section(collector)
+                results[name] = data
+
+            with self._workers_lock:
+                previous = self._workers.get(id(collector))
+                if previous is not None and previous.is_alive():
+                    workers.append((name, None))
+                    continue
+                thread = threading.Thread(target=work, name=f'envdiff-{name}', daemon=True)
+                self._workers[id(collector)] = thread
+            thread.start()
+            workers.append((name, thread))
+
+        snapshot = SnapshotData()
+        for name, thread in workers:
+            timeout = self.timeouts.get(name, self.default_timeout)
+            if thread is None:
+                snapshot[name] = {
+                    'error': 'Collection still running from an earlier capture',
+                    'timed_out': True,
+                    'timeout': timeout,
+                }
+                snapshot.fingerprints[name] = section_hash(snapshot[name])
+                continue
+            thread.join(max(0.0, start + timeout - time.monotonic()))
+
+            if thread.is_alive():
+                snapshot[name] = {
+                    'error': f'Collection timed out after {timeout:g}s',
+                    'timed_out': True,
+                    'timeout': timeout,
+                }
+                snapshot.fingerprints[name] = section_hash(snapshot[name])
+            elif name in results:
+                snapshot[name] = results[name]
+                snapshot.fingerprints[name] = fingerprints[name]
+            else:
+                # The worker died without a result
+                snapshot[name] = {'error': 'Collection failed: worker exited without a result'}
+                snapshot.fingerprints[name] = section_hash(snapshot[name])
+
+        return snapshot
+
+    def section_names(self) -> List[str]:
+        """Return the section names produced by this engine's collectors."""
+        return [collector_name(c) for c in self.collectors]
+
+    def find_collector(self, collector_type: type) -> Optional[Any]:
+        """Return the first collector of the given type, if any."""
+        for collector in self.collectors:
+            if isinstance(collector, collector_type):
+                return collector
+        return None
+
     def generate_snapshot_id(self, name: str = None) -> str:
         """
         Generate a unique snapshot ID.
@@ -59,7 +196,7 @@ class SnapshotEngine:
             timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
             return f"snapshot-{timestamp}"
 
-    def capture_named(self, name: str = None) -> tuple[str, Dict[str, Any]]:
+    def capture_named(self, name: str = None) -> tuple[str, SnapshotData]:
         """
         Capture a snapshot with a specific name.
         
@@ -2,31 +2,146 @@
 Storage module for managing SQLite snapshots database.
 """
 
-import json
+import os
 import sqlite3
+import threading
 import time
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .codec import SnapshotData, decode_blob, encode_blob, fingerprints_of
+from .entrystore import ENTRIES_KEY, EntryStream, StoredEntries, create_tables, is_entries_ref
+
+
+# Seconds a writer waits on a locked database before giving up
+BUSY_TIMEOUT = 10.0
+
+# One connection per (process, database), shared by every SnapshotStorage
+_connections: Dict[Tuple[int, str], Tuple[sqlite3.Connection, threading.RLock]] = {}
+# Open SnapshotStorage instances per pooled connection
+_references: Dict[Tuple[int, str], int] = {}
+_connections_lock = threading.RLock()
+
+# Key of the manifest stored in snapshots.data for content-addressed rows
+MANIFEST_KEY = '$sections'
+
+
+def get_data_dir() -> Path:
+    """
+    Return the envdiff data directory, creating it if needed.
+
+    Defaults to ~/.envdiff and can be overridden with ENVDIFF_HOME.
+    """
+    data_dir = Path(os.environ.get('ENVDIFF_HOME') or Path.home() / ".envdiff")
+    data_dir.mkdir(parents=True, exist_ok=True)
+    return data_dir
+
+
+def _pool_key(db_path: str) -> Tuple[int, str]:
+    """Return the pool key for a database path in the current process."""
+    if db_path != ':memory:':
+        db_path = os.path.abspath(db_path)
+    return os.getpid(), db_path
+
+
+def get_connection(db_path: str) -> Tuple[sqlite3.Connection, threading.RLock]:
+    """
+    Return the pooled connection for a database, opening it on first use.
+
+    The pool is keyed by process id so a forked child never reuses its
+    parent's connection. Connections run in WAL mode so readers (compare,
+    list) do not block on a watch loop writing snapshots.
+
+    Returns:
+        Tuple of (connection, lock). Hold the lock for the duration of a
+        transaction; the connection is shared between threads.
+    """
+    key = _pool_key(db_path)
+
+    with _connections_lock:
+        pooled = _connections.get(key)
+        if pooled is None:
+            conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            pooled = (conn, threading.RLock())
+            _connections[key] = pooled
+        return pooled
+
+
+def acquire_connection(db_path: str) -> Tuple[sqlite3.Connection, threading.RLock]:
+    """Return the pooled connection for a database and take a reference to it."""
+    key = _pool_key(db_path)
+    with _connections_lock:
+        pooled = get_connection(db_path)
+        _references[key] = _references.get(key, 0) + 1
+        return pooled
+
+
+def release_connection(db_path: str) -> None:
+    """Drop a reference taken by acquire_connection, closing the connection with the last one."""
+    key = _pool_key(db_path)
+    with _connections_lock:
+        remaining = _references.get(key, 0) - 1
+        if remaining > 0:
+            _references[key] = remaining
+            return
+        _references.pop(key, None)
+        pooled = _connections.pop(key, None)
+    if pooled is not None:
+        pooled[0].close()
+
+
+def _begin_write(conn: sqlite3.Connection) -> None:
+    """
+    Start a write transaction before its first read.
+
+    sqlite3 only opens a transaction at the first data-modifying statement,
+    so reads made earlier (does this section exist? which snapshots match?)
+    would not be isolated from a writer committing in between, e.g. a
+    delete garbage-collecting a section about to be linked.
+    """
+    conn.execute("BEGIN IMMEDIATE")
 
 
 class SnapshotStorage:
-    """SQLite storage for environment snapshots."""
+    """
+    SQLite storage for environment snapshots.
+
+    Each collector section is stored once in the content-addressed sections
+    table, keyed by the SHA-256 of its canonical JSON. A snapshot row holds
+    only a manifest mapping section names to hashes, mirrored in
+    snapshot_sections so unreferenced sections can be garbage collected.
+
+    File entries streamed from disk (EntryStream) are not stored in their
+    section's blob: they are copied page by page into file_entries, keyed
+    by the section's tree hash, and the blob keeps a reference to them.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, codec: str = 'zlib'):
+        """
+        Initialize storage with database path.
 
-    def __init__(self, db_path: Optional[str] = None):
-        """Initialize storage with database path."""
+        Args:
+            db_path: Path to the SQLite database. Defaults to ~/.envdiff/snapshots.db.
+            codec: Compression codec for new rows, 'zlib' or 'lzma'.
+        """
         if db_path is None:
             # Default to ~/.envdiff/snapshots.db
-            home_dir = Path.home()
-            envdiff_dir = home_dir / ".envdiff"
-            envdiff_dir.mkdir(exist_ok=True)
-            db_path = str(envdiff_dir / "snapshots.db")
-        
+            db_path = str(get_data_dir() / "snapshots.db")
+
         self.db_path = db_path
+        self.codec = codec
+        self._conn, self._lock = acquire_connection(db_path)
+        self._closed = False
         self._init_db()
 
     def _init_db(self):
         """Initialize the database with required tables."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS snapshots (
                     id TEXT PRIMARY KEY,
@@ -35,36 +150,217 @@ class SnapshotStorage:
                     data JSON NOT NULL
                 )
             """)
-            conn.commit()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sections (
+                    hash TEXT PRIMARY KEY,
+                    data BLOB NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshot_sections (
+                    snapshot_id TEXT NOT NULL,
+                    section TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    PRIMARY KEY (snapshot_id, section)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS section_entries (
+                    hash TEXT PRIMARY KEY,
+                    entries_key TEXT NOT NULL
+                )
+            """)
+            create_tables(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_name ON snapshots (name)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_timestamp ON snapshots (timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshot_sections_hash ON snapshot_sections (hash)")
+
+    def close(self) -> None:
+        """Release this storage's use of the pooled connection, closing it once no storage uses it."""
+        if self._closed:
+            return
+        self._closed = True
+        release_connection(self.db_path)
+
+    def _store_sections(self, conn: sqlite3.Connection, snapshot_id: str,
+                        data: Dict) -> Tuple[Dict[str, str], int]:
+        """
+        Store each section once by content hash and link it to the snapshot.
+
+        Returns:
+            Tuple of (manifest of section name to hash, bytes of newly stored sections).
+        """
+        manifest = fingerprints_of(data)
+        written = 0
+        for section, section_data in data.items():
+            digest = manifest[section]
+            exists = conn.execute("SELECT 1 FROM sections WHERE hash = ?", (digest,)).fetchone()
+            if not exists:
+                entries = section_data.get('entries') if isinstance(section_data, dict) else None
+                if isinstance(entries, EntryStream):
+                    self._store_entries(conn, entries)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO section_entries (hash, entries_key) VALUES (?, ?)",
+                        (digest, entries.key)
+                    )
+                blob = encode_blob(section_data, self.codec)
+                conn.execute("INSERT INTO sections (hash, data) VALUES (?, ?)", (digest, blob))
+                written += len(blob)
+
+        stale = self._unlink_sections(conn, snapshot_id)
+        conn.executemany(
+            "INSERT INTO snapshot_sections (snapshot_id, section, hash) VALUES (?, ?, ?)",
+            [(snapshot_id, section, digest) for section, digest in manifest.items()]
+        )
+        self._collect_garbage(conn, stale - set(manifest.values()))
+        return manifest, written
+
+    def _store_entries(self, conn: sqlite3.Connection, entries: EntryStream) -> None:
+        """Copy streamed entries into file_entries page by page, unless already stored."""
+        exists = conn.execute(
+            "SELECT 1 FROM file_entries WHERE entries_key = ? LIMIT 1", (entries.key,)
+        ).fetchone()
+        if exists:
+            return
+        for page in entries.rows():
+            conn.executemany(
+                "INSERT INTO file_entries (entries_key, path, hash, size, mtime) VALUES (?, ?, ?, ?, ?)",
+                [(entries.key,) + row for row in page]
+            )
+
+    def _unlink_sections(self, conn: sqlite3.Connection, snapshot_id: str) -> set:
+        """Remove a snapshot's section links, returning the hashes it referenced."""
+        hashes = {row[0] for row in conn.execute(
+            "SELECT hash FROM snapshot_sections WHERE snapshot_id = ?", (snapshot_id,)
+        )}
+        conn.execute("DELETE FROM snapshot_sections WHERE snapshot_id = ?", (snapshot_id,))
+        return hashes
+
+    def _collect_garbage(self, conn: sqlite3.Connection, hashes: set) -> None:
+        """Delete the given sections if no snapshot references them any more."""
+        for digest in hashes:
+            referenced = conn.execute(
+                "SELECT 1 FROM snapshot_sections WHERE hash = ? LIMIT 1", (digest,)
+            ).fetchone()
+            if not referenced:
+                conn.execute("DELETE FROM sections WHERE hash = ?", (digest,))
+                self._collect_entries(conn, digest)
+
+    def _collect_entries(self, conn: sqlite3.Connection, digest: str) -> None:
+        """Delete the entries of a deleted section unless another section shares them."""
+        row = conn.execute(
+            "SELECT entries_key FROM section_entries WHERE hash = ?", (digest,)
+        ).fetchone()
+        if row is None:
+            return
+        conn.execute("DELETE FROM section_entries WHERE hash = ?", (digest,))
+        shared = conn.execute(
+            "SELECT 1 FROM section_entries WHERE entries_key = ? LIMIT 1", (row[0],)
+        ).fetchone()
+        if not shared:
+            conn.execute("DELETE FROM file_entries WHERE entries_key = ?", (row[0],))
+
+    def _load_sections(self, manifest: Dict[str, str]) -> Dict:
+        """Load and decode the sections referenced by a manifest."""
+        hashes = [*dict.fromkeys(manifest.values())]
+        blobs = {}
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT hash, data FROM sections WHERE hash IN ({placeholders})", chunk
+                ).fetchall()
+            blobs.update(rows)
+
+        return {section: self._revive(decode_blob(blobs[digest])) for section, digest in manifest.items()}
+
+    def _revive(self, section_data: Any) -> Any:
+        """Replace a reference to stored file entries with a stream over them."""
+        if isinstance(section_data, dict) and is_entries_ref(section_data.get('entries')):
+            ref = section_data['entries']
+            section_data['entries'] = StoredEntries(partial(get_connection, self.db_path),
+                                                    ref[ENTRIES_KEY], ref['count'])
+        return section_data
+
+    def _get_row(self, snapshot_id: str) -> Optional[Tuple[str, object]]:
+        """Return (id, decoded data column) for a snapshot by ID or name."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, data FROM snapshots WHERE id = ? OR name = ?",
+                (snapshot_id, snapshot_id)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], decode_blob(row[1])
 
     def save_snapshot(self, snapshot_id: str, name: str, data: Dict) -> None:
         """Save a snapshot to the database."""
         timestamp = time.time()
-        data_json = json.dumps(data, indent=2)
-        
-        with sqlite3.connect(self.db_path) as conn:
+
+        with self._lock, self._conn as conn:
+            _begin_write(conn)
+            manifest, _ = self._store_sections(conn, snapshot_id, data)
             conn.execute(
                 "INSERT OR REPLACE INTO snapshots (id, name, timestamp, data) VALUES (?, ?, ?, ?)",
-                (snapshot_id, name, timestamp, data_json)
+                (snapshot_id, name, timestamp, encode_blob({MANIFEST_KEY: manifest}, self.codec))
             )
-            conn.commit()
 
-    def get_snapshot(self, snapshot_id: str) -> Optional[Dict]:
-        """Get a snapshot by ID."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                "SELECT data FROM snapshots WHERE id = ? OR name = ?",
-                (snapshot_id, snapshot_id)
-            )
-            row = cursor.fetchone()
-            if row:
-                return json.loads(row[0])
-        return None
+    def get_snapshot(self, snapshot_id: str,
+                     sections: Optional[Iterable[str]] = None) -> Optional[SnapshotData]:
+        """
+        Get a snapshot by ID or name.
+
+        Args:
+            snapshot_id: Snapshot ID or name.
+            sections: Only load and decode these sections. The returned
+                snapshot still carries the fingerprints of every section.
+
+        Returns:
+            The snapshot, or None if it does not exist.
+        """
+        row = self._get_row(snapshot_id)
+        if row is None:
+            return None
+
+        data = row[1]
+        if isinstance(data, dict) and MANIFEST_KEY in data:
+            manifest = data[MANIFEST_KEY]
+            wanted = manifest
+            if sections is not None:
+                wanted = {name: manifest[name] for name in sections if name in manifest}
+            return SnapshotData(self._load_sections(wanted), manifest)
+
+        # Rows written before content addressing hold the full snapshot
+        snapshot = SnapshotData(data)
+        if sections is not None:
+            wanted = set(sections)
+            for name in [name for name in snapshot if name not in wanted]:
+                del snapshot[name]
+        return snapshot
+
+    def get_section_hashes(self, snapshot_id: str) -> Optional[Dict[str, str]]:
+        """
+        Get the fingerprint of every section of a snapshot without loading them.
+
+        Two snapshots share a section exactly when its hashes are equal.
+
+        Returns:
+            Dictionary of section name to hash, or None if the snapshot does not exist.
+        """
+        row = self._get_row(snapshot_id)
+        if row is None:
+            return None
+
+        data = row[1]
+        if isinstance(data, dict) and MANIFEST_KEY in data:
+            return dict(data[MANIFEST_KEY])
+        return fingerprints_of(data)
 
     def list_snapshots(self) -> List[Dict]:
         """List all snapshots with metadata."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
+        with self._lock:
+            cursor = self._conn.execute(
                 "SELECT id, name, timestamp FROM snapshots ORDER BY timestamp DESC"
             )
             snapshots = []
@@ -76,21 +372,131 @@ class SnapshotStorage:
                 })
             return snapshots
 
+    def iter_snapshots(self, since: Optional[float] = None, until: Optional[float] = None,
+                       page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over snapshots oldest first, without loading their sections.
+
+        Rows are fetched a page at a time (keyset on timestamp and id), so
+        the lock is never held while the caller works on a snapshot.
+
+        Args:
+            since: Only snapshots taken at or after this Unix time.
+            until: Only snapshots taken at or before this Unix time.
+            page_size: Rows fetched per query.
+
+        Yields:
+            Dictionaries with id, name, timestamp and the fingerprint of every section.
+        """
+        where = []
+        params: List[Any] = []
+        if since is not None:
+            where.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("timestamp <= ?")
+            params.append(until)
+
+        last: Optional[Tuple[float, str]] = None
+        while True:
+            conditions = list(where)
+            page_params = list(params)
+            if last is not None:
+                conditions.append("(timestamp, id) > (?, ?)")
+                page_params.extend(last)
+            clause = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT id, name, timestamp, data FROM snapshots {clause}"
+                    f"ORDER BY timestamp, id LIMIT {int(page_size)}",
+                    page_params
+                ).fetchall()
+
+            for snapshot_id, name, timestamp, blob in rows:
+                data = decode_blob(blob)
+                if isinstance(data, dict) and MANIFEST_KEY in data:
+                    fingerprints = dict(data[MANIFEST_KEY])
+                else:
+                    fingerprints = fingerprints_of(data)
+                yield {"id": snapshot_id, "name": name, "timestamp": timestamp,
+                       "fingerprints": fingerprints}
+
+            if len(rows) < page_size:
+                return
+            last = (rows[-1][2], rows[-1][0])
+
     def delete_snapshot(self, snapshot_id: str) -> bool:
         """Delete a snapshot by ID or name."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                "DELETE FROM snapshots WHERE id = ? OR name = ?",
+        with self._lock, self._conn as conn:
+            _begin_write(conn)
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM snapshots WHERE id = ? OR name = ?",
                 (snapshot_id, snapshot_id)
-            )
-            conn.commit()
-            return cursor.rowcount > 0
+            )]
+            for matched_id in ids:
+                conn.execute("DELETE FROM snapshots WHERE id = ?", (matched_id,))
+                self._collect_garbage(conn, self._unlink_sections(conn, matched_id))
+            return len(ids) > 0
 
     def snapshot_exists(self, snapshot_id: str) -> bool:
         """Check if a snapshot exists by ID or name."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
+        with self._lock:
+            cursor = self._conn.execute(
                 "SELECT 1 FROM snapshots WHERE id = ? OR name = ?",
                 (snapshot_id, snapshot_id)
             )
-            return cursor.fetchone() is not None
\ No newline at end of file
+            return cursor.fetchone() is not None
+
+    def migrate(self, batch_size: int = 100, vacuum: bool = False) -> Dict[str, int]:
+        """
+        Rewrite rows stored in an older format into content-addressed sections.
+
+        Rows are converted in place, batch_size rows per transaction, so a
+        running watch loop is never blocked for long.
+
+        Args:
+            batch_size: Number of rows rewritten per transaction.
+            vacuum: Run VACUUM afterwards to return freed pages to the filesystem.
+
+        Returns:
+            Dictionary with the number of migrated rows and bytes before/after.
+        """
+        stats = {'migrated': 0, 'bytes_before': 0, 'bytes_after': 0}
+
+        # Rows without section links are either legacy rows or empty snapshots
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute(
+                "SELECT id FROM snapshots WHERE NOT EXISTS "
+                "(SELECT 1 FROM snapshot_sections WHERE snapshot_sections.snapshot_id = snapshots.id)"
+            )]
+
+        for start in range(0, len(ids), batch_size):
+            with self._lock, self._conn as conn:
+                _begin_write(conn)
+                for snapshot_id in ids[start:start + batch_size]:
+                    row = conn.execute(
+                        "SELECT data FROM snapshots WHERE id = ?", (snapshot_id,)
+                    ).fetchone()
+                    if row is None:
+                        continue
+
+                    old = row[0]
+                    data = decode_blob(old)
+                    if isinstance(data, dict) and MANIFEST_KEY in data:
+                        continue
+
+                    manifest, written = self._store_sections(conn, snapshot_id, data)
+                    blob = encode_blob({MANIFEST_KEY: manifest}, self.codec)
+                    conn.execute(
+                        "UPDATE snapshots SET data = ? WHERE id = ?", (blob, snapshot_id)
+                    )
+
+                    stats['migrated'] += 1
+                    stats['bytes_before'] += len(old.encode('utf-8') if isinstance(old, str) else old)
+                    stats['bytes_after'] += len(blob) + written
+
+        if vacuum:
+            with self._lock:
+                self._conn.execute("VACUUM")
+
+        return stats
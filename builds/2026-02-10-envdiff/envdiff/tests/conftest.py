@@ -0,0 +1,13 @@
+"""
+Shared pytest fixtures.
+"""
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_data_dir(tmp_path, monkeypatch):
+    """Keep caches and state files written during tests out of ~/.envdiff."""
+    data_dir = tmp_path / "envdiff-home"
+    monkeypatch.setenv("ENVDIFF_HOME", str(data_dir))
+    return data_dir
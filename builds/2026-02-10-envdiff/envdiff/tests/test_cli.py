@@ -164,6 +164,7 @@ class TestCLI:
     def test_compare_command_snapshot_not_found(self, mock_storage_class):
         """Test compare command with nonexistent snapshot."""
         mock_storage = Mock()
+        mock_storage.get_section_hashes.return_value = None
         mock_storage.get_snapshot.return_value = None
         mock_storage_class.return_value = mock_storage
         
@@ -171,6 +172,26 @@ class TestCLI:
         assert result.exit_code == 1
         assert 'not found' in result.output
 
+    @patch('envdiff.cli.SnapshotStorage')
+    def test_compare_loads_only_changed_sections(self, mock_storage_class):
+        """Test that sections with equal fingerprints are never loaded."""
+        mock_storage = Mock()
+        mock_storage.get_section_hashes.side_effect = [
+            {'packages': 'aaa', 'system': 'bbb'},
+            {'packages': 'aaa', 'system': 'ccc'},
+        ]
+        mock_storage.get_snapshot.side_effect = [
+            {'system': {'cpu_percent': 1.0}},
+            {'system': {'cpu_percent': 2.0}},
+        ]
+        mock_storage_class.return_value = mock_storage
+        
+        result = self.runner.invoke(cli, ['compare', 'snap1', 'snap2'])
+        assert result.exit_code == 1
+        
+        mock_storage.get_snapshot.assert_any_call('snap1', sections=['system'])
+        mock_storage.get_snapshot.assert_any_call('snap2', sections=['system'])
+
     @patch('envdiff.cli.SnapshotStorage')
     def test_delete_command(self, mock_storage_class):
         """Test delete command."""
@@ -228,6 +249,8 @@ class TestCLI:
         mock_engine = Mock()
         mock_engine.capture_named.return_value = ('watch-baseline', {'test': 'data'})
         mock_engine.capture.return_value = {'test': 'data'}  # Same data
+        mock_engine.find_collector.return_value = None  # No files collector to watch
+        mock_engine.section_names.return_value = ['test']
         mock_engine_class.return_value = mock_engine
         
         # Mock storage
@@ -247,6 +270,27 @@ class TestCLI:
         assert result.exit_code == 0
         assert 'Monitoring stopped' in result.output
 
+    @patch('envdiff.cli.SnapshotEngine')
+    def test_watch_rejects_bad_cadences(self, mock_engine_class):
+        """Test that zero, negative and unknown cadences are usage errors."""
+        for args in (['--interval', '0'], ['--interval', '-1'], ['--every', 'packages=0'],
+                     ['--every', 'system=-5'], ['--every', 'pakages=60'], ['--every', 'system']):
+            result = self.runner.invoke(cli, ['watch', *args])
+            assert result.exit_code == 2, args
+        mock_engine_class.assert_not_called()
+
+    @patch('envdiff.cli.SnapshotStorage')
+    def test_storage_migrate_command(self, mock_storage_class):
+        """Test storage migrate command."""
+        mock_storage = Mock()
+        mock_storage.migrate.return_value = {'migrated': 3, 'bytes_before': 9000, 'bytes_after': 900}
+        mock_storage_class.return_value = mock_storage
+        
+        result = self.runner.invoke(cli, ['storage', 'migrate', '--no-vacuum'])
+        assert result.exit_code == 0
+        assert 'Migrated 3' in result.output
+        mock_storage.migrate.assert_called_once_with(vacuum=False)
+
     def test_custom_storage_path(self):
         """Test using custom storage path."""
         temp_db = self.get_temp_db()
@@ -2,14 +2,25 @@
 Tests for data collectors.
 """
 
+import hashlib
+import json
 import pytest
 import os
 import tempfile
+import psutil
+import socket
+import sys
+import time
 from unittest.mock import patch, Mock
 from envdiff.collectors import (
     ProcessCollector, NetworkCollector, EnvVarsCollector,
     PackagesCollector, FilesCollector, SystemCollector
 )
+from envdiff.collectors.files import hash_file
+from envdiff.collectors.network import proc_net_available, read_proc_net
+from envdiff.collectors.packages import read_node_modules, run_commands
+from envdiff.collectors.processes import proc_available, read_proc_processes
+from envdiff.hashcache import FileHashCache
 
 
 class TestProcessCollector:
@@ -38,12 +49,93 @@ class TestProcessCollector:
     def test_collect_with_psutil_error(self, mock_process_iter):
         """Test collect when psutil raises an error."""
         mock_process_iter.side_effect = Exception("Test error")
-        collector = ProcessCollector()
+        collector = ProcessCollector(backend='psutil')
         result = collector.collect()
         
         assert len(result) == 1
         assert 'error' in result[0]
 
+    def test_cpu_from_deltas_across_runs(self, tmp_path):
+        """Test that CPU usage comes from the reading persisted by an earlier run."""
+        state_path = str(tmp_path / 'process_cpu.json')
+        cpu_times = Mock(user=10.0, system=2.0)
+        proc = Mock(info={'pid': 42, 'name': 'worker', 'cmdline': ['worker'],
+                          'create_time': 1000.0, 'cpu_times': cpu_times,
+                          'memory_info': Mock(rss=1024 * 1024)})
+        
+        with patch('psutil.process_iter', return_value=[proc]), \
+             patch('time.time', return_value=1100.0):
+            first = ProcessCollector(state_path=state_path, backend='psutil').collect()
+        
+        # No earlier reading: average since the process started
+        assert first[0]['cpu'] == 12.0
+        
+        cpu_times.user = 14.0
+        with patch('psutil.process_iter', return_value=[proc]), \
+             patch('time.time', return_value=1110.0):
+            second = ProcessCollector(state_path=state_path, backend='psutil').collect()
+        
+        assert second[0]['cpu'] == 40.0
+
+    def test_pid_reuse_is_a_new_process(self, tmp_path):
+        """Test that a reused pid does not inherit the old process's reading."""
+        collector = ProcessCollector(persist=False, backend='psutil')
+        cpu_times = Mock(user=50.0, system=0.0)
+        info = {'pid': 42, 'name': 'old', 'cmdline': ['old'], 'create_time': 1000.0,
+                'cpu_times': cpu_times, 'memory_info': None}
+        
+        with patch('psutil.process_iter', return_value=[Mock(info=info)]), \
+             patch('time.time', return_value=1100.0):
+            collector.collect()
+        
+        reused = dict(info, name='new', cmdline=['new'], create_time=1090.0,
+                      cpu_times=Mock(user=1.0, system=0.0))
+        with patch('psutil.process_iter', return_value=[Mock(info=reused)]), \
+             patch('time.time', return_value=1100.0):
+            result = collector.collect()
+        
+        assert result[0]['cpu'] == 10.0
+
+    @pytest.mark.skipif(not proc_available(), reason="/proc fast path is Linux only")
+    def test_proc_backend_matches_psutil(self):
+        """Test that the /proc fast path reports the same processes as psutil."""
+        by_proc = {p['pid']: p for p in ProcessCollector(persist=False, limit=None, backend='proc').collect()}
+        by_psutil = {p['pid']: p for p in ProcessCollector(persist=False, limit=None, backend='psutil').collect()}
+        
+        me = by_proc[os.getpid()]
+        assert me['name'] == by_psutil[os.getpid()]['name']
+        assert me['cmdline'] == by_psutil[os.getpid()]['cmdline']
+        assert abs(me['mem_mb'] - by_psutil[os.getpid()]['mem_mb']) < 50
+        assert set(by_proc) & set(by_psutil) >= {os.getpid()}
+
+    def test_proc_reader_skips_kernel_threads_and_exited(self, tmp_path):
+        """Test parsing of stat/cmdline, including comm with spaces and parentheses."""
+        def make(pid, comm, cmdline, stat_tail='S 1 1 1 0 -1 0 0 0 0 0 250 50 0 0 20 0 1 0 1000 0 256'):
+            (tmp_path / pid).mkdir()
+            (tmp_path / pid / 'cmdline').write_bytes(cmdline)
+            (tmp_path / pid / 'stat').write_bytes(f"{pid} ({comm}) {stat_tail}".encode())
+        
+        make('10', 'my (odd) app', b'/opt/my (odd) app\0--flag\0')
+        make('11', 'kworker/0:1', b'')
+        (tmp_path / '12').mkdir()  # exited: no files left
+        (tmp_path / 'self').mkdir()
+        
+        with patch('psutil.boot_time', return_value=5000.0):
+            rows = list(read_proc_processes(str(tmp_path)))
+        
+        ticks = os.sysconf('SC_CLK_TCK')
+        assert rows == [(10, 'my (odd) app', '/opt/my (odd) app --flag',
+                         5000.0 + 1000 / ticks, 300 / ticks,
+                         256 * os.sysconf('SC_PAGE_SIZE'))]
+
+    def test_limit_is_configurable(self):
+        """Test that limit=None reports every process."""
+        rows = [(pid, f'p{pid}', f'p{pid}', 1000.0, 0.0, pid * 1024 * 1024) for pid in range(1, 6)]
+        
+        with patch.object(ProcessCollector, '_read_processes', side_effect=lambda: iter(rows)):
+            assert [p['pid'] for p in ProcessCollector(persist=False, limit=2).collect()] == [5, 4]
+            assert len(ProcessCollector(persist=False, limit=None).collect()) == 5
+
 
 class TestNetworkCollector:
     """Test cases for NetworkCollector."""
@@ -70,12 +162,98 @@ class TestNetworkCollector:
     def test_collect_with_psutil_error(self, mock_net_connections):
         """Test collect when psutil raises an error."""
         mock_net_connections.side_effect = Exception("Test error")
-        collector = NetworkCollector()
+        collector = NetworkCollector(backend='psutil')
         result = collector.collect()
         
         assert len(result) == 1
         assert 'error' in result[0]
 
+    def write_proc_net(self, path):
+        """Write /proc/net-style socket tables."""
+        header = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+        row = "   0: {} {} {} 00000000:00000000 00:00000000 00000000     0        0 {} 1 0000000000000000\n"
+        path.mkdir()
+        (path / 'tcp').write_text(header + "".join(row.format(*fields) for fields in [
+            ('00000000:01BB', '00000000:0000', '0A', 101),  # 0.0.0.0:443 LISTEN
+            ('0100007F:01BB', '0200000A:D431', '01', 102),  # 127.0.0.1:443 <- 10.0.0.2
+            ('0100007F:01BB', '0200000A:D432', '01', 103),
+            ('0100007F:A000', '0300000A:0050', '01', 104),  # outgoing to 10.0.0.3:80
+        ]))
+        (path / 'udp6').write_text(header + row.format(
+            '00000000000000000000000001000000:0035', '00000000000000000000000000000000:0000', '07', 105))
+
+    @pytest.mark.skipif(sys.byteorder != 'little', reason="fixture addresses are little-endian")
+    def test_proc_net_parser(self, tmp_path):
+        """Test decoding of /proc/net socket tables."""
+        self.write_proc_net(tmp_path / 'net')
+        
+        rows = list(read_proc_net(str(tmp_path / 'net')))
+        
+        assert rows[0] == (True, ('0.0.0.0', 443), None, 'LISTEN', 101)
+        assert rows[1] == (True, ('127.0.0.1', 443), ('10.0.0.2', 54321), 'ESTABLISHED', 102)
+        assert rows[-1] == (False, ('::1', 53), None, 'NONE', 105)
+
+    @pytest.mark.skipif(sys.byteorder != 'little', reason="fixture addresses are little-endian")
+    def test_aggregate_mode(self, tmp_path):
+        """Test that listeners are kept in full and connections are counted."""
+        self.write_proc_net(tmp_path / 'net')
+        collector = NetworkCollector(backend='proc', aggregate=True)
+        
+        with patch('envdiff.collectors.network.PROC_NET', str(tmp_path / 'net')), \
+             patch('envdiff.collectors.network.scan_socket_owners', return_value={101: 7}):
+            result = collector.collect()
+        
+        assert result == [
+            {'local': '*', 'remote': '10.0.0.3:80', 'status': 'ESTABLISHED', 'count': 1},
+            {'local': '*:443', 'remote': '10.0.0.2', 'status': 'ESTABLISHED', 'count': 2},
+            {'local': '0.0.0.0:443', 'remote': '', 'status': 'LISTEN', 'pid': 7},
+            {'local': '::1:53', 'remote': '', 'status': 'NONE', 'pid': None},
+        ]
+
+    def test_pid_resolution_cached_by_inode(self):
+        """Test that /proc is only rescanned for inodes not seen before."""
+        collector = NetworkCollector(backend='proc')
+        
+        with patch('envdiff.collectors.network.scan_socket_owners', return_value={1: 10}) as scan:
+            assert collector._resolve([1, 2]) == {1: 10, 2: None}
+            assert collector._resolve([1, 2]) == {1: 10, 2: None}
+            assert scan.call_count == 1
+            
+            collector._resolve([1, 3])
+            assert scan.call_count == 2
+
+    def test_pids_resolved_only_for_reported_sockets(self):
+        """Test that the limit applies before owners are looked up."""
+        rows = [(True, ('127.0.0.1', port), None, 'LISTEN', port) for port in (9005, 9001, 9004, 9002, 9003)]
+        collector = NetworkCollector(backend='proc', limit=2)
+        
+        with patch('envdiff.collectors.network.read_proc_net', return_value=iter(rows)), \
+                patch('envdiff.collectors.network.scan_socket_owners', return_value={9001: 1}) as scan, \
+                patch.object(collector, '_resolve', wraps=collector._resolve) as resolve:
+            result = collector.collect()
+        
+        assert [c['local'] for c in result] == ['127.0.0.1:9001', '127.0.0.1:9002']
+        assert [c['pid'] for c in result] == [1, None]
+        assert sorted(resolve.call_args[0][0]) == [9001, 9002]
+        scan.assert_called_once()
+
+    @pytest.mark.skipif(not proc_net_available(), reason="/proc/net backend is Linux only")
+    def test_proc_backend_matches_psutil(self):
+        """Test that the /proc/net backend sees the same sockets as psutil."""
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen()
+        try:
+            local = f"127.0.0.1:{server.getsockname()[1]}"
+            by_proc = NetworkCollector(backend='proc', limit=None).collect()
+            by_psutil = NetworkCollector(backend='psutil', limit=None).collect()
+            
+            mine = [c for c in by_proc if c['local'] == local]
+            assert mine == [{'local': local, 'remote': '', 'status': 'LISTEN', 'pid': os.getpid()}]
+            assert mine == [c for c in by_psutil if c['local'] == local]
+        finally:
+            server.close()
+
 
 class TestEnvVarsCollector:
     """Test cases for EnvVarsCollector."""
@@ -131,66 +309,204 @@ class TestPackagesCollector:
         assert 'npm' in result
         assert 'brew' in result
 
-    @patch('subprocess.run')
-    def test_pip_collection_success(self, mock_run):
+    @patch('envdiff.collectors.packages.run_commands')
+    def test_pip_collection_success(self, mock_run_commands):
         """Test successful pip package collection."""
-        mock_result = Mock()
-        mock_result.returncode = 0
-        mock_result.stdout = '[{"name": "requests", "version": "2.31.0"}]'
-        mock_run.return_value = mock_result
+        mock_run_commands.return_value = {
+            'pip': (0, '[{"name": "requests", "version": "2.31.0"}]'), 'npm': None, 'brew': None
+        }
         
-        collector = PackagesCollector()
+        collector = PackagesCollector(pip_backend='subprocess')
         result = collector.collect()
         
-        if 'error' not in result['pip']:
-            assert isinstance(result['pip'], dict)
+        assert result['pip'] == {'requests': '2.31.0'}
 
-    @patch('subprocess.run')
-    def test_pip_collection_failure(self, mock_run):
+    @patch('envdiff.collectors.packages.which')
+    def test_pip_collection_failure(self, mock_which):
         """Test pip collection failure."""
-        mock_run.side_effect = FileNotFoundError("pip not found")
+        mock_which.return_value = None  # pip not found
         
-        collector = PackagesCollector()
+        collector = PackagesCollector(pip_backend='subprocess')
         result = collector.collect()
         
         assert 'error' in result['pip']
 
-    @patch('subprocess.run')
-    def test_npm_collection_success(self, mock_run):
+    def make_site_packages(self, root):
+        """Create a fake venv with dist-info and egg-info metadata."""
+        site_dir = root / 'lib' / 'python3.11' / 'site-packages'
+        dist_info = site_dir / 'requests-2.31.0.dist-info'
+        dist_info.mkdir(parents=True)
+        (dist_info / 'METADATA').write_text(
+            'Metadata-Version: 2.1\nName: requests\nVersion: 2.31.0\n\nName: not-a-header\n'
+        )
+        egg_dir = site_dir / 'legacy.egg-info'
+        egg_dir.mkdir()
+        (egg_dir / 'PKG-INFO').write_text('Metadata-Version: 1.0\nName: legacy\nVersion: 0.9\n')
+        (site_dir / 'single-1.0-py3.11.egg-info').write_text('Name: single\nVersion: 1.0\n')
+        (site_dir / 'broken.dist-info').mkdir()
+        return site_dir
+
+    def test_pip_metadata_backend(self, tmp_path):
+        """Test reading pip packages from a venv's metadata without pip."""
+        site_dir = self.make_site_packages(tmp_path / 'venv')
+        
+        with patch('envdiff.collectors.packages.run_commands',
+                   side_effect=lambda commands, timeout: dict.fromkeys(commands)) as mock_run_commands:
+            collector = PackagesCollector(python_envs=[str(tmp_path / 'venv')], pip_backend='metadata',
+                                          package_cache=False)
+            result = collector.collect()
+        
+        assert 'pip' not in mock_run_commands.call_args[0][0]
+        assert result['pip'] == {'requests': '2.31.0', 'legacy': '0.9', 'single': '1.0'}
+
+    def test_pip_metadata_backend_from_interpreter_path(self, tmp_path):
+        """Test resolving site-packages from an interpreter inside a venv."""
+        site_dir = self.make_site_packages(tmp_path / 'venv')
+        python = tmp_path / 'venv' / 'bin' / 'python'
+        python.parent.mkdir()
+        python.write_text('')
+        
+        collector = PackagesCollector(python_envs=[str(python)])
+        assert collector._site_dirs() == [str(site_dir)]
+
+    def test_default_site_packages_follow_python3_on_path(self, tmp_path):
+        """Test that the default inventory is the environment of the python3 pip3 belongs to."""
+        site_dir = self.make_site_packages(tmp_path / 'venv')
+        python = tmp_path / 'venv' / 'bin' / 'python3'
+        python.parent.mkdir()
+        python.write_text('')
+        own = os.path.join(os.path.dirname(sys.executable), 'python3')
+        
+        with patch('envdiff.collectors.packages.which', return_value=str(python)):
+            assert PackagesCollector()._site_dirs() == [str(site_dir)]
+        with patch('envdiff.collectors.packages.which', return_value=None):
+            assert PackagesCollector()._site_dirs() == []
+        with patch('envdiff.collectors.packages.which', return_value=own):
+            assert set(PackagesCollector()._site_dirs()) <= set(sys.path)
+
+    def test_site_dirs_resolved_once_per_collect(self, tmp_path):
+        """Test that fingerprinting and reading share one site-packages lookup."""
+        site_dir = self.make_site_packages(tmp_path / 'venv')
+        
+        with patch('envdiff.collectors.packages.default_site_packages', return_value=[str(site_dir)]) as lookup, \
+                patch('envdiff.collectors.packages.run_commands',
+                      side_effect=lambda commands, timeout: dict.fromkeys(commands)):
+            result = PackagesCollector(cache_path=str(tmp_path / 'packages.db')).collect()
+        
+        assert lookup.call_count == 1
+        assert result['pip']['requests'] == '2.31.0'
+
+    def test_pip_auto_falls_back_to_subprocess(self, tmp_path):
+        """Test that auto mode uses pip3 when no site-packages dir is found."""
+        pip = (0, '[{"name": "requests", "version": "2.31.0"}]')
+        
+        with patch('envdiff.collectors.packages.run_commands',
+                   side_effect=lambda commands, timeout: {name: pip if name == 'pip' else None
+                                                          for name in commands}) as mock_run_commands:
+            collector = PackagesCollector(python_envs=[str(tmp_path / 'missing')], package_cache=False)
+            result = collector.collect()
+        
+        assert 'pip' in mock_run_commands.call_args[0][0]
+        assert result['pip'] == {'requests': '2.31.0'}
+
+    @patch('envdiff.collectors.packages.run_commands')
+    def test_npm_collection_success(self, mock_run_commands):
         """Test successful npm package collection."""
-        def side_effect(*args, **kwargs):
-            if 'npm' in args[0]:
-                mock_result = Mock()
-                mock_result.returncode = 0
-                mock_result.stdout = '{"dependencies": {"express": {"version": "4.18.2"}}}'
-                return mock_result
-            else:
-                # Other subprocess calls (pip, brew) should fail
-                mock_result = Mock()
-                mock_result.returncode = 1
-                return mock_result
-        
-        mock_run.side_effect = side_effect
+        mock_run_commands.return_value = {
+            'npm': (0, '{"dependencies": {"express": {"version": "4.18.2"}}}'),
+            # Other package managers fail
+            'brew': (1, ''),
+        }
         
-        collector = PackagesCollector()
+        collector = PackagesCollector(npm_backend='subprocess')
         result = collector.collect()
         
-        if 'error' not in result['npm']:
-            assert isinstance(result['npm'], dict)
+        assert result['npm'] == {'express': '4.18.2'}
+        assert result['brew'] == {}
 
-    @patch('subprocess.run')
-    def test_brew_collection_success(self, mock_run):
+    @patch('envdiff.collectors.packages.run_commands')
+    def test_brew_collection_success(self, mock_run_commands):
         """Test successful brew package collection."""
-        mock_result = Mock()
-        mock_result.returncode = 0
-        mock_result.stdout = 'node 21.5.0\npython 3.11.6\n'
-        mock_run.return_value = mock_result
+        mock_run_commands.return_value = {'npm': None, 'brew': (0, 'node 21.5.0\npython 3.11.4 3.11.6\n')}
         
-        collector = PackagesCollector()
+        collector = PackagesCollector(npm_backend='subprocess')
         result = collector.collect()
         
-        if 'error' not in result['brew']:
-            assert isinstance(result['brew'], dict)
+        assert result['brew'] == {'node': '21.5.0', 'python': '3.11.6'}
+        assert 'error' in result['npm']
+
+    def make_node_modules(self, root):
+        """Create a node_modules tree with plain, scoped and broken packages."""
+        node_modules = root / 'node_modules'
+        for rel, manifest in [
+            ('express', {'name': 'express', 'version': '4.18.2'}),
+            ('@angular/cli', {'name': '@angular/cli', 'version': '17.0.0'}),
+            ('no-version', {'name': 'no-version'}),
+        ]:
+            (node_modules / rel).mkdir(parents=True)
+            (node_modules / rel / 'package.json').write_text(json.dumps(manifest))
+        (node_modules / 'broken').mkdir()
+        (node_modules / '.bin').mkdir()
+        return node_modules
+
+    def test_npm_manifest_backend(self, tmp_path, monkeypatch):
+        """Test reading global npm packages from node_modules without running npm."""
+        self.make_node_modules(tmp_path / 'prefix' / 'lib')
+        monkeypatch.setenv('NPM_CONFIG_PREFIX', str(tmp_path / 'prefix'))
+        
+        with patch('envdiff.collectors.packages.run_commands', return_value={'brew': None}) as mock_run_commands:
+            result = PackagesCollector(npm_backend='manifest').collect()
+        
+        assert 'npm' not in mock_run_commands.call_args[0][0]
+        assert result['npm'] == {'express': '4.18.2', '@angular/cli': '17.0.0'}
+
+    def test_npm_projects_cached_by_mtime(self, tmp_path):
+        """Test project node_modules scanning and the directory-mtime cache."""
+        node_modules = self.make_node_modules(tmp_path / 'app')
+        collector = PackagesCollector(npm_projects=[str(tmp_path / 'app')])
+        
+        with patch('envdiff.collectors.packages.read_node_modules',
+                   wraps=read_node_modules) as mock_read:
+            first = collector._read_node_modules_cached(str(node_modules))
+            second = collector._read_node_modules_cached(str(node_modules))
+            assert mock_read.call_count == 1
+            
+            # Installing a scoped package touches only the @scope directory
+            (node_modules / '@angular' / 'core').mkdir()
+            (node_modules / '@angular' / 'core' / 'package.json').write_text(
+                '{"name": "@angular/core", "version": "17.0.1"}')
+            os.utime(node_modules / '@angular', ns=(0, 1))
+            third = collector._read_node_modules_cached(str(node_modules))
+            assert mock_read.call_count == 2
+        
+        assert first == second
+        assert third['@angular/core'] == '17.0.1'
+        
+        with patch('envdiff.collectors.packages.run_commands', return_value={'brew': None, 'npm': None}):
+            result = collector.collect()
+        assert result['npm_projects'] == {str(tmp_path / 'app'): third}
+
+    def test_commands_run_concurrently_under_one_deadline(self):
+        """Test that commands run in parallel and stragglers are killed at the deadline."""
+        start = time.monotonic()
+        results = run_commands({
+            'slow1': ['sh', '-c', 'sleep 0.5; echo one'],
+            'slow2': ['sh', '-c', 'sleep 0.5; echo two'],
+            'stuck': ['sleep', '30'],
+            'missing': ['envdiff-no-such-tool'],
+        }, timeout=1.5)
+        elapsed = time.monotonic() - start
+        
+        assert results == {'slow1': (0, 'one\n'), 'slow2': (0, 'two\n'), 'stuck': None, 'missing': None}
+        assert elapsed < 3.0
+
+    def test_missing_tools_looked_up_once(self):
+        """Test that PATH lookups are cached per process."""
+        with patch('shutil.which', return_value=None) as mock_which:
+            for _ in range(3):
+                run_commands({'tool': ['envdiff-cached-missing-tool']})
+        
+        assert mock_which.call_count == 1
 
 
 class TestFilesCollector:
@@ -208,13 +524,14 @@ class TestFilesCollector:
         collector = FilesCollector(watch_dirs=watch_dirs)
         assert collector.watch_dirs == watch_dirs
 
-    def test_collect_returns_list(self):
-        """Test that collect returns a list."""
+    def test_collect_returns_tree_section(self):
+        """Test that collect returns the entries with their digest tree."""
         # Create a temporary directory for testing
         with tempfile.TemporaryDirectory() as temp_dir:
             collector = FilesCollector(watch_dirs=[temp_dir])
             result = collector.collect()
-            assert isinstance(result, list)
+            assert isinstance(result['entries'], list)
+            assert 'hash' in result['tree']
 
     def test_collect_file_format(self):
         """Test that files have correct format."""
@@ -225,7 +542,7 @@ class TestFilesCollector:
                 f.write('test content')
             
             collector = FilesCollector(watch_dirs=[temp_dir])
-            result = collector.collect()
+            result = collector.collect()['entries']
             
             if result and not result[0].get('error'):
                 file_info = result[0]
@@ -243,20 +560,113 @@ class TestFilesCollector:
                 f.write('hidden')
             
             collector = FilesCollector(watch_dirs=[temp_dir])
-            result = collector.collect()
+            result = collector.collect()['entries']
             
             # Should not include hidden files
             for file_info in result:
                 if 'path' in file_info:
                     assert not file_info['path'].startswith('.')
 
+    def test_collect_reuses_cached_hash(self, tmp_path):
+        """Test that unchanged files are not reopened on the next collect."""
+        test_file = tmp_path / 'watched' / 'test.txt'
+        test_file.parent.mkdir()
+        test_file.write_text('test content')
+        os.utime(test_file, (1_700_000_000, 1_700_000_000))
+        
+        collector = FilesCollector(watch_dirs=[str(test_file.parent)],
+                                   cache_path=str(tmp_path / 'hashes.db'))
+        first = collector.collect()['entries']
+        
+        with patch('builtins.open', side_effect=AssertionError("file reopened")):
+            second = collector.collect()['entries']
+        
+        assert second == first
+        assert first[0]['hash'] == hashlib.blake2b(b'test content', digest_size=32).hexdigest()
+
+    def test_hash_cache_written_per_batch(self, tmp_path):
+        """Test that cache writes are flushed after every batch, not held until the walk ends."""
+        watched = tmp_path / 'watched'
+        watched.mkdir()
+        for i in range(5):
+            (watched / f'{i}.txt').write_text(str(i))
+            os.utime(watched / f'{i}.txt', (1_700_000_000, 1_700_000_000))
+        pending = []
+        real_flush = FileHashCache.flush
+
+        def flush(cache, evict=True):
+            pending.append(len(cache._pending))
+            real_flush(cache, evict)
+
+        collector = FilesCollector(watch_dirs=[str(watched)], cache_path=str(tmp_path / 'hashes.db'))
+        with patch('envdiff.collectors.files.BATCH_SIZE', 2), \
+                patch.object(FileHashCache, 'flush', flush):
+            collector.collect()
+
+        # Three batches of at most two files, then the final flush on close
+        assert pending == [2, 2, 1, 0]
+
+    def test_collect_without_hash_cache(self, tmp_path):
+        """Test that disabling the cache writes no cache database."""
+        (tmp_path / 'test.txt').write_text('test content')
+        cache_path = tmp_path.parent / 'no-cache.db'
+        
+        collector = FilesCollector(watch_dirs=[str(tmp_path)], hash_cache=False,
+                                   cache_path=str(cache_path), algorithm='md5')
+        result = collector.collect()['entries']
+        
+        assert result[0]['hash'] == hashlib.md5(b'test content').hexdigest()
+        assert not cache_path.exists()
+
+    def test_streaming_hash_of_large_file(self, tmp_path):
+        """Test that files larger than the read buffer are hashed in full."""
+        content = os.urandom(3 * 1024 * 1024 + 123)
+        (tmp_path / 'model.bin').write_bytes(content)
+        
+        assert hash_file(str(tmp_path / 'model.bin'), chunk_size=64 * 1024) == \
+            hashlib.blake2b(content, digest_size=32).hexdigest()
+        assert hash_file(str(tmp_path / 'model.bin'), 'sha256') == hashlib.sha256(content).hexdigest()
+
+    def test_size_ceiling(self, tmp_path):
+        """Test that files above the ceiling are tracked without being hashed."""
+        (tmp_path / 'small.txt').write_bytes(b'x' * 10)
+        (tmp_path / 'big.bin').write_bytes(b'x' * 100)
+        
+        collector = FilesCollector(watch_dirs=[str(tmp_path)], hash_cache=False, max_file_size=50)
+        result = {entry['path']: entry for entry in collector.collect()['entries']}
+        
+        assert result['big.bin']['hash'] == 'too_large'
+        assert result['big.bin']['size'] == 100
+        assert result['small.txt']['hash'] == hashlib.blake2b(b'x' * 10, digest_size=32).hexdigest()
+
+    def test_parallel_hashing_and_cache_per_algorithm(self, tmp_path):
+        """Test hashing on a thread pool, with cached digests kept per algorithm."""
+        watched = tmp_path / 'watched'
+        watched.mkdir()
+        for i in range(20):
+            (watched / f'file{i}.txt').write_text(f'content {i}')
+            os.utime(watched / f'file{i}.txt', (1_700_000_000, 1_700_000_000))
+        cache_path = str(tmp_path / 'hashes.db')
+        
+        blake = FilesCollector(watch_dirs=[str(watched)], cache_path=cache_path, hash_workers=4).collect()['entries']
+        md5 = FilesCollector(watch_dirs=[str(watched)], cache_path=cache_path, algorithm='md5').collect()['entries']
+        
+        assert blake[0]['hash'] == hashlib.blake2b(b'content 0', digest_size=32).hexdigest()
+        assert md5[0]['hash'] == hashlib.md5(b'content 0').hexdigest()
+        assert len(blake) == len(md5) == 20
+
+    def test_unknown_algorithm_rejected(self):
+        """Test that an unknown algorithm fails at construction."""
+        with pytest.raises(ValueError):
+            FilesCollector(algorithm='not-a-hash')
+
     def test_collect_nonexistent_directory(self):
         """Test collect with nonexistent directory."""
         collector = FilesCollector(watch_dirs=['/nonexistent/path'])
-        result = collector.collect()
+        result = collector.collect()['entries']
         
-        # Should return empty list or handle gracefully
-        assert isinstance(result, list)
+        # Should return an empty file list
+        assert result == []
 
 
 class TestSystemCollector:
@@ -285,11 +695,44 @@ class TestSystemCollector:
             assert isinstance(result['mem_percent'], (int, float))
             assert isinstance(result['disk_percent'], (int, float))
             assert isinstance(result['cpu_count'], int)
+            assert len(result['cpu_percent_per_core']) == len(psutil.cpu_times(percpu=True))
+            assert 0 <= result['iowait_percent'] <= 100
+
+    def test_collect_does_not_block_after_first_reading(self, tmp_path):
+        """Test that only the first collect samples for the full interval."""
+        state_path = str(tmp_path / 'cpu_times.json')
+        SystemCollector(state_path=state_path, sample_interval=2.0).collect()
+        
+        # A new collector (e.g. the next CLI run) starts from the persisted reading
+        collector = SystemCollector(state_path=state_path, sample_interval=2.0)
+        start = time.monotonic()
+        collector.collect()
+        result = collector.collect()
+        
+        assert 'error' not in result
+        assert time.monotonic() - start < 1.0
+
+    def test_cpu_usage_from_times_delta(self):
+        """Test utilisation, per-core and iowait figures from two readings."""
+        collector = SystemCollector(persist=False)
+        fields = {'user': 0.0, 'system': 0.0, 'idle': 0.0, 'iowait': 0.0, 'guest': 0.0}
+        previous = {'time': 0.0, 'boot_time': 1.0,
+                    'per_cpu': [dict(fields), dict(fields)]}
+        current = {'time': 1.0, 'boot_time': 1.0,
+                   'per_cpu': [dict(fields, user=0.5, idle=0.5, guest=0.4),
+                               dict(fields, system=0.25, idle=0.5, iowait=0.25)]}
+        
+        usage = collector._usage(previous, current)
+        
+        assert usage == {'cpu_percent': 37.5, 'per_core': [50.0, 25.0], 'iowait_percent': 12.5}
+        
+        # Counters from before a reboot cannot be compared
+        assert collector._usage(dict(previous, boot_time=0.0), current) is None
 
-    @patch('psutil.cpu_percent')
-    def test_collect_with_psutil_error(self, mock_cpu_percent):
+    @patch('psutil.cpu_times')
+    def test_collect_with_psutil_error(self, mock_cpu_times):
         """Test collect when psutil raises an error."""
-        mock_cpu_percent.side_effect = Exception("Test error")
+        mock_cpu_times.side_effect = Exception("Test error")
         collector = SystemCollector()
         result = collector.collect()
         
@@ -3,7 +3,9 @@ Tests for diff module.
 """
 
 import pytest
+from envdiff.codec import SnapshotData
 from envdiff.diff import SnapshotDiff
+from envdiff.merkle import tree_section
 
 
 class TestSnapshotDiff:
@@ -117,4 +119,208 @@ class TestSnapshotDiff:
         data2 = {"key1": "value1", "key2": "value2"}
         
         result = self.diff_engine._compare_collector_data(data1, data2)
-        assert result == {}
\ No newline at end of file
+        assert result == {}
+    def test_file_changed_in_place(self):
+        """Test that a file with the same path is reported as changed, not added/removed."""
+        snapshot1 = {"files": [{"path": "a.txt", "hash": "111", "size": 1, "mtime": 1}]}
+        snapshot2 = {"files": [{"path": "a.txt", "hash": "222", "size": 1, "mtime": 2}]}
+        
+        diff = self.diff_engine.compare(snapshot1, snapshot2)
+        
+        assert "items_added" not in diff["files"]
+        assert "items_removed" not in diff["files"]
+        assert diff["files"]["changed"]["a.txt[hash]"] == {"old": "111", "new": "222"}
+        assert diff["files"]["changed"]["a.txt[mtime]"] == {"old": 1, "new": 2}
+
+    def test_list_items_joined_by_key_regardless_of_order(self):
+        """Test that reordered list items produce no differences."""
+        files = [{"path": f"f{i}", "hash": str(i)} for i in range(50)]
+        
+        diff = self.diff_engine.compare({"files": files}, {"files": list(reversed(files))})
+        assert not self.diff_engine.has_changes(diff)
+
+    def test_process_keyed_by_pid_and_cmdline(self):
+        """Test that a pid reused by another command is an add/remove pair."""
+        snapshot1 = {"processes": [{"pid": 1, "name": "a", "cmdline": "a --x", "cpu": 0.0}]}
+        snapshot2 = {"processes": [{"pid": 1, "name": "b", "cmdline": "b", "cpu": 0.0}]}
+        
+        diff = self.diff_engine.compare(snapshot1, snapshot2)
+        
+        assert diff["processes"]["items_removed"] == snapshot1["processes"]
+        assert diff["processes"]["items_added"] == snapshot2["processes"]
+
+    def test_duplicate_network_keys(self):
+        """Test that duplicate natural keys are matched as a multiset."""
+        conn = {"local": "0.0.0.0:80", "remote": "", "status": "LISTEN", "pid": 1}
+        other = dict(conn, pid=2)
+        
+        diff = self.diff_engine.compare({"network": [conn, other]}, {"network": [other]})
+        
+        assert diff["network"] == {"items_removed": [conn]}
+
+    def test_nested_package_change(self):
+        """Test that nested dict changes are reported with bracketed paths."""
+        snapshot1 = {"packages": {"pip": {"requests": "2.30.0", "old": "1.0"}, "brew": {}}}
+        snapshot2 = {"packages": {"pip": {"requests": "2.31.0", "new": "2.0"}, "brew": {}}}
+        
+        diff = self.diff_engine.compare(snapshot1, snapshot2)["packages"]
+        
+        assert diff["changed"] == {"pip[requests]": {"old": "2.30.0", "new": "2.31.0"}}
+        assert diff["removed"] == {"pip[old]": "1.0"}
+        assert diff["added"] == {"pip[new]": "2.0"}
+
+    def test_type_change(self):
+        """Test that a value changing type is reported as type_changed."""
+        diff = self.diff_engine.compare({"system": {"cpu_count": 4}}, {"system": {"cpu_count": "4"}})
+        
+        change = diff["system"]["type_changed"]["cpu_count"]
+        assert change["old_value"] == 4
+        assert change["new_value"] == "4"
+
+    def test_large_file_lists(self):
+        """Test that large keyed lists diff quickly and precisely."""
+        files1 = [{"path": f"dir/file{i}", "hash": str(i), "size": i} for i in range(20000)]
+        files2 = [dict(f) for f in files1[1:]]
+        files2[0]["hash"] = "changed"
+        files2.append({"path": "dir/new", "hash": "x", "size": 0})
+        
+        diff = self.diff_engine.compare({"files": files1}, {"files": files2})["files"]
+        
+        assert diff["items_removed"] == [files1[0]]
+        assert diff["items_added"] == [{"path": "dir/new", "hash": "x", "size": 0}]
+        assert list(diff["changed"]) == ["dir/file1[hash]"]
+
+    def test_moves_and_renames_joined_on_hash(self):
+        """Test that a removed and an added file with the same contents pair up."""
+        old = [{"path": "src/a.py", "hash": "1", "size": 1}, {"path": "src/b.py", "hash": "2", "size": 2},
+               {"path": "gone.txt", "hash": "3", "size": 3}]
+        new = [{"path": "lib/a.py", "hash": "1", "size": 1}, {"path": "src/c.py", "hash": "2", "size": 2},
+               {"path": "new.txt", "hash": "4", "size": 4}]
+        
+        diff = self.diff_engine.compare({"files": tree_section(old)}, {"files": tree_section(new)})["files"]
+        
+        assert diff["moved"] == [{"from": "src/a.py", "to": "lib/a.py", "hash": "1", "size": 1}]
+        assert diff["renamed"] == [{"from": "src/b.py", "to": "src/c.py", "hash": "2", "size": 2}]
+        assert [f["path"] for f in diff["items_removed"]] == ["gone.txt"]
+        assert [f["path"] for f in diff["items_added"]] == ["new.txt"]
+        assert self.diff_engine.has_changes({"files": {"moved": diff["moved"]}})
+
+    def test_identical_contents_pair_by_name_first(self):
+        """Test that files sharing a hash pair with a file of the same name."""
+        old = [{"path": "a/__init__.py", "hash": "e", "size": 5}, {"path": "a/copy.txt", "hash": "e", "size": 5}]
+        new = [{"path": "b/copy.txt", "hash": "e", "size": 5}, {"path": "b/__init__.py", "hash": "e", "size": 5}]
+        
+        moved = self.diff_engine.compare({"files": old}, {"files": new})["files"]["moved"]
+        
+        assert sorted((m["from"], m["to"]) for m in moved) == [("a/__init__.py", "b/__init__.py"),
+                                                              ("a/copy.txt", "b/copy.txt")]
+
+    def test_similar_files_and_opaque_hashes(self):
+        """Test opt-in pairing by name and size, and that placeholder hashes never pair."""
+        old = [{"path": "etc/app.conf", "hash": "1", "size": 10}, {"path": "big.iso", "hash": "too_large", "size": 9}]
+        new = [{"path": "opt/app.conf", "hash": "2", "size": 10}, {"path": "other.iso", "hash": "too_large", "size": 9}]
+        
+        exact = self.diff_engine.compare({"files": old}, {"files": new})["files"]
+        similar = SnapshotDiff(detect_similar=True).compare({"files": old}, {"files": new})["files"]
+        
+        assert "moved" not in exact and len(exact["items_added"]) == 2
+        assert similar["moved"] == [{"from": "etc/app.conf", "to": "opt/app.conf", "hash": "2", "size": 10,
+                                     "old_hash": "1", "similar": True}]
+        assert [f["path"] for f in similar["items_added"]] == ["other.iso"]
+
+    def test_placeholders_and_empty_files_never_pair(self):
+        """Test that legacy large-file placeholders, empty files and size mismatches stay unpaired."""
+        old = [{"path": "lib/app.jar", "hash": "large_file", "size": 5 << 20},
+               {"path": "a/gone.txt", "hash": "e69d", "size": 0},
+               {"path": "a/x.bin", "hash": "1", "size": 3}]
+        new = [{"path": "models/w.bin", "hash": "large_file", "size": 9 << 20},
+               {"path": "b/new.txt", "hash": "e69d", "size": 0},
+               {"path": "b/y.bin", "hash": "1", "size": 4}]
+        
+        diff = self.diff_engine.compare({"files": old}, {"files": new})["files"]
+        
+        assert "moved" not in diff and "renamed" not in diff
+        assert len(diff["items_removed"]) == len(diff["items_added"]) == 3
+
+    def test_many_moves_scale_linearly(self):
+        """Test pairing tens of thousands of moved files."""
+        old = [{"path": f"old/f{i}", "hash": str(i), "size": i + 1} for i in range(30000)]
+        new = [{"path": f"new/f{i}", "hash": str(i), "size": i + 1} for i in range(30000)]
+        
+        diff = self.diff_engine.compare({"files": old}, {"files": new})["files"]
+        
+        assert len(diff["moved"]) == 30000
+        assert "items_added" not in diff and "items_removed" not in diff
+
+    def test_summarize_counts_items_once(self):
+        """Test that a list item with several changed fields counts as one change."""
+        old = [{"path": "a", "hash": "1", "size": 1, "mtime": 1}, {"path": "b", "hash": "2", "size": 2}]
+        new = [{"path": "a", "hash": "3", "size": 3, "mtime": 2}, {"path": "c", "hash": "2", "size": 2}]
+        
+        files = self.diff_engine.compare({"files": old}, {"files": new})["files"]
+        env = self.diff_engine.compare({"env": {"A": "1", "B": "1"}}, {"env": {"A": "2", "B": "2"}})["env"]
+        
+        assert self.diff_engine.summarize(files, "files") == {"changed": 1, "moved": 1}
+        assert self.diff_engine.summarize(env, "env") == {"changed": 2}
+
+    def test_tree_section_against_legacy_flat_list(self):
+        """Test that a files section with a digest tree compares against an old flat list."""
+        old = [{"path": "a.txt", "hash": "1", "size": 1, "mtime": 1}]
+        new = [{"path": "a.txt", "hash": "2", "size": 1, "mtime": 1}]
+        
+        diff = self.diff_engine.compare({"files": old}, {"files": tree_section(new)})
+        
+        assert diff["files"]["changed"] == {"a.txt[hash]": {"old": "1", "new": "2"}}
+        assert not self.diff_engine.compare({"files": tree_section(new)}, {"files": tree_section(new)})
+
+    def test_identical_fingerprints_skip_section(self):
+        """Test that sections with matching fingerprints are not compared."""
+        snapshot1 = SnapshotData({"packages": {"pip": {"a": "1"}}, "system": {"cpu_percent": 1}},
+                                 {"packages": "same", "system": "x"})
+        snapshot2 = SnapshotData({"packages": {"pip": {"a": "2"}}, "system": {"cpu_percent": 2}},
+                                 {"packages": "same", "system": "y"})
+        
+        diff = self.diff_engine.compare(snapshot1, snapshot2)
+        
+        assert "packages" not in diff
+        assert "system" in diff
+
+    def test_mutated_sections_lose_their_fingerprints(self):
+        """Test that no dict mutator leaves a stale fingerprint that would hide a change."""
+        def snapshot():
+            return SnapshotData({"a": {"v": 1}, "b": {"v": 1}, "c": {"v": 1}},
+                                {"a": "x", "b": "x", "c": "x"})
+        
+        updated = snapshot()
+        updated.update({"a": {"v": 2}}, b={"v": 2})
+        updated |= {"c": {"v": 2}}
+        assert sorted(self.diff_engine.compare(snapshot(), updated)) == ["a", "b", "c"]
+        
+        removed = snapshot()
+        del removed["a"]
+        removed.pop("b")
+        removed.popitem()
+        assert sorted(self.diff_engine.compare(snapshot(), removed)) == ["a", "b", "c"]
+        
+        cleared = snapshot()
+        cleared.clear()
+        cleared.setdefault("a", {"v": 2})
+        assert sorted(self.diff_engine.compare(snapshot(), cleared)) == ["a", "b", "c"]
+        assert cleared.fingerprints == {}
+
+    def test_partially_loaded_snapshots(self):
+        """Test comparing snapshots that only hold their changed sections."""
+        snapshot1 = SnapshotData({"system": {"cpu_percent": 1}}, {"files": "f", "system": "x"})
+        snapshot2 = SnapshotData({"system": {"cpu_percent": 2}}, {"files": "f", "system": "y"})
+        
+        diff = self.diff_engine.compare(snapshot1, snapshot2)
+        assert list(diff) == ["system"]
+
+    def test_engine_section_names_are_keyed(self):
+        """Test that the section names emitted by SnapshotEngine are joined on keys."""
+        snapshot1 = {"process": [{"pid": 1, "name": "a", "cmdline": "a", "cpu": 0.0}]}
+        snapshot2 = {"process": [{"pid": 1, "name": "a", "cmdline": "a", "cpu": 5.0}]}
+        
+        diff = self.diff_engine.compare(snapshot1, snapshot2)
+        
+        assert diff["process"] == {"changed": {"a (PID: 1)[cpu]": {"old": 0.0, "new": 5.0}}}
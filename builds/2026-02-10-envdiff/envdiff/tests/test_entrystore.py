@@ -0,0 +1,173 @@
+"""
+Tests for entrystore module.
+"""
+
+import os
+import time
+from unittest.mock import Mock
+
+from envdiff.collectors import FilesCollector
+from envdiff.diff import SnapshotDiff
+from envdiff.entrystore import EntrySpool, StoredEntries, close_spools, sweep_spools
+from envdiff.snapshot import SnapshotEngine
+from envdiff.storage import SnapshotStorage, get_data_dir
+from envdiff.watch import WatchPipeline
+
+
+def entry(path, digest='h'):
+    """Build a file entry with an os.sep-separated path."""
+    return {'path': path.replace('/', os.sep), 'hash': digest, 'size': 1, 'mtime': 1.0}
+
+
+def write(path, text=''):
+    """Create a file and its parent directories."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+class TestEntrySpool:
+    """Test cases for EntrySpool."""
+
+    def test_reads_back_sorted_and_by_directory(self, tmp_path):
+        """Test that batches added out of order read back in path order."""
+        spool = EntrySpool(str(tmp_path))
+        spool.add([entry('b/y'), entry('a.txt')])
+        spool.add([entry('b/c/z'), entry('b/x'), entry('bz')])
+        spool.finish()
+
+        assert len(spool) == 5
+        assert [e['path'] for e in spool] == sorted(e['path'] for e in spool)
+        assert [e['path'] for e in spool.under('b', False)] == [os.path.join('b', 'x'), os.path.join('b', 'y')]
+        assert len([*spool.under('b', True)]) == 3
+        assert [e['path'] for e in spool.under('', False)] == ['a.txt', 'bz']
+
+    def test_close_deletes_file(self, tmp_path):
+        """Test that the spool file goes away with the spool."""
+        spool = EntrySpool(str(tmp_path))
+        assert os.path.exists(spool.path)
+        spool.close()
+        assert not os.path.exists(spool.path)
+
+    def test_close_spools_keeps_shared_spools(self, tmp_path):
+        """Test that only spools not shared with the kept snapshot are deleted."""
+        shared, own = EntrySpool(str(tmp_path)), EntrySpool(str(tmp_path))
+        last = {'files': {'entries': shared}, 'env_vars': {'A': '1'}}
+        current = {'files': {'entries': own}, 'old': {'entries': shared}, 'env_vars': {'A': '1'}}
+
+        close_spools(current, keep=last)
+
+        assert os.path.exists(shared.path)
+        assert not os.path.exists(own.path)
+        shared.close()
+
+    def test_sweep_removes_only_stale_spools(self, tmp_path):
+        """Test that spools left by dead processes go, and recent ones and other files stay."""
+        stale, recent = EntrySpool(str(tmp_path)), EntrySpool(str(tmp_path))
+        other = tmp_path / 'snapshots.db'
+        other.write_text('')
+        past = time.time() - 2 * 86400
+        for path in (stale.path, str(other)):
+            os.utime(path, (past, past))
+
+        sweep_spools(str(tmp_path))
+
+        assert not os.path.exists(stale.path)
+        assert os.path.exists(recent.path)
+        assert other.exists()
+        recent.close()
+
+
+class TestSpilledSections:
+    """Test cases for files sections too large to hold in memory."""
+
+    def collect(self, watch_dir):
+        """Collect a files section, spilling past a handful of entries."""
+        return FilesCollector(watch_dirs=[str(watch_dir)], spill_threshold=5).collect()
+
+    def test_collect_spills_past_threshold(self, tmp_path):
+        """Test that a large collect returns a spool equal to the in-memory entries."""
+        for i in range(12):
+            write(tmp_path / 'watched' / f'd{i % 3}' / f'f{i}.txt', str(i))
+
+        section = self.collect(tmp_path / 'watched')
+        collector = FilesCollector(watch_dirs=[str(tmp_path / 'watched')])
+
+        assert isinstance(section['entries'], EntrySpool)
+        assert section['entries'].key == section['tree']['hash']
+        assert os.path.dirname(section['entries'].path) == str(get_data_dir())
+        assert section['entries'] == collector.collect_entries()
+        assert section == collector.collect()
+
+    def test_stale_spools_swept_on_first_spill(self, tmp_path, monkeypatch):
+        """Test that creating a collector leaves the data directory alone and spilling sweeps it."""
+        blocked = tmp_path / 'not-a-dir'
+        blocked.write_text('')
+        monkeypatch.setenv('ENVDIFF_HOME', str(blocked))
+        FilesCollector(watch_dirs=[str(tmp_path)])
+
+        monkeypatch.setenv('ENVDIFF_HOME', str(tmp_path / 'home'))
+        stale = EntrySpool(str(get_data_dir()))
+        stale._finalizer.detach()
+        stale._conn.close()
+        past = time.time() - 2 * 86400
+        os.utime(stale.path, (past, past))
+        for i in range(12):
+            write(tmp_path / 'watched' / f'f{i}.txt', str(i))
+        collector = FilesCollector(watch_dirs=[str(tmp_path / 'watched')], spill_threshold=5)
+        assert os.path.exists(stale.path)
+
+        section = collector.collect()
+
+        assert not os.path.exists(stale.path)
+        assert os.path.exists(section['entries'].path)
+        section['entries'].close()
+
+    def test_stored_round_trip_and_diff(self, tmp_path):
+        """Test saving, loading and diffing spilled sections, and collecting their rows."""
+        watched = tmp_path / 'watched'
+        for i in range(12):
+            write(watched / f'd{i % 3}' / f'f{i}.txt', str(i))
+        storage = SnapshotStorage(str(tmp_path / 'snapshots.db'))
+        try:
+            storage.save_snapshot('a', 'a', {'files': self.collect(watched)})
+            write(watched / 'd1' / 'f1.txt', 'changed')
+            (watched / 'd2' / 'f2.txt').unlink()
+            write(watched / 'new' / 'g.txt')
+            storage.save_snapshot('b', 'b', {'files': self.collect(watched)})
+
+            loaded_a = storage.get_snapshot('a')
+            loaded_b = storage.get_snapshot('b')
+            assert isinstance(loaded_a['files']['entries'], StoredEntries)
+            assert len(loaded_a['files']['entries']) == 12
+
+            diff = SnapshotDiff().compare(loaded_a, loaded_b)['files']
+            assert [e['path'] for e in diff['items_added']] == [os.path.join('new', 'g.txt')]
+            assert [e['path'] for e in diff['items_removed']] == [os.path.join('d2', 'f2.txt')]
+            assert os.path.join('d1', 'f1.txt') + '[hash]' in diff['changed']
+
+            storage.delete_snapshot('a')
+            keys = storage._conn.execute("SELECT DISTINCT entries_key FROM file_entries").fetchall()
+            assert keys == [(loaded_b['files']['entries'].key,)]
+        finally:
+            storage.close()
+
+    def test_watch_deletes_spools_no_longer_referenced(self, tmp_path):
+        """Test that a watch keeps only the spool of its last stored state."""
+        watched = tmp_path / 'watched'
+        for i in range(12):
+            write(watched / f'f{i}.txt', str(i))
+        collector = FilesCollector(watch_dirs=[str(watched)], spill_threshold=5)
+        pipeline = WatchPipeline(SnapshotEngine(collectors=[collector], concurrent=False),
+                                 Mock(), SnapshotDiff())
+        pipeline.baseline()
+        baseline = pipeline.last['files']['entries']
+
+        unchanged = pipeline.capture()
+        assert pipeline.commit(unchanged) is None
+        assert not os.path.exists(unchanged['files']['entries'].path)
+        assert os.path.exists(baseline.path)
+
+        write(watched / 'f0.txt', 'changed')
+        assert pipeline.tick() is not None
+        assert not os.path.exists(baseline.path)
+        assert os.path.exists(pipeline.last['files']['entries'].path)
@@ -0,0 +1,49 @@
+"""
+Tests for formatters module.
+"""
+
+import io
+
+from rich.console import Console
+from envdiff.diff import SnapshotDiff
+from envdiff.formatters import SnapshotFormatter
+
+
+def render_diff(diff):
+    """Render a diff and return the plain text printed."""
+    formatter = SnapshotFormatter()
+    formatter.console = Console(file=io.StringIO(), width=200, record=True)
+    formatter.format_diff(diff, 'a', 'b')
+    return formatter.console.export_text()
+
+
+class TestSnapshotFormatter:
+    """Test cases for SnapshotFormatter."""
+
+    def test_bracketed_keys_are_not_markup(self):
+        """Test that "label[field]" keys keep their brackets in the output."""
+        diff = SnapshotDiff().compare(
+            {'packages': {'pip': {'requests': '2.30'}},
+             'files': [{'path': 'src/f3.txt', 'hash': '1', 'size': 1}, {'path': 'a/[x].txt', 'hash': '2', 'size': 2}]},
+            {'packages': {'pip': {'requests': '2.31'}},
+             'files': [{'path': 'src/f3.txt', 'hash': '3', 'size': 1}, {'path': 'b/[x].txt', 'hash': '2', 'size': 2}]},
+        )
+
+        text = render_diff(diff)
+
+        assert 'pip[requests]: "2.30" → "2.31"' in text
+        assert 'src/f3.txt[hash]: "1" → "3"' in text
+        assert 'a/[x].txt → b/[x].txt' in text
+
+    def test_list_values_are_not_markup(self):
+        """Test that short numeric lists print in full and other lists as a count."""
+        diff = SnapshotDiff().compare(
+            {'system': {'load_avg': [0.5, 0.25, 0.1], 'users': ['a', 'b'], 'boot': '[x]'}},
+            {'system': {'load_avg': [1.5, 0.75, 0.3], 'users': ['a'], 'boot': '[y]'}},
+        )
+
+        text = render_diff(diff)
+
+        assert 'load_avg: [0.5, 0.25, 0.1] → [1.5, 0.75, 0.3]' in text
+        assert 'users: [list with 2 items] → [list with 1 items]' in text
+        assert 'boot: "[x]" → "[y]"' in text
@@ -0,0 +1,102 @@
+"""
+Tests for gitindex module.
+"""
+
+import os
+import shutil
+import subprocess
+import time
+from unittest.mock import patch
+
+import pytest
+import envdiff.collectors.files as files_module
+from envdiff.collectors import FilesCollector
+from envdiff.gitindex import GitIndex, find_git_dir
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None, reason='git is not installed')
+
+
+def git(repo, *args):
+    """Run git in a repository and return its output."""
+    return subprocess.run(['git', '-C', str(repo), *args], check=True,
+                          capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """A committed checkout whose files predate its index, so none is racily clean."""
+    root = tmp_path / 'repo'
+    (root / 'src').mkdir(parents=True)
+    (root / 'a.txt').write_text('hello\n')
+    (root / 'src' / 'b.py').write_text('print(1)\n')
+    past = time.time() - 60
+    for path in (root / 'a.txt', root / 'src' / 'b.py'):
+        os.utime(path, (past, past))
+    git(root, 'init', '-q')
+    git(root, 'add', '.')
+    git(root, '-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-qm', 'init')
+    return root
+
+
+def collect_paths(collector):
+    """Collect entries, returning them and the names of the files that were hashed."""
+    hashed = []
+    real_hash_file = files_module.hash_file
+
+    def spy(path, *args, **kwargs):
+        hashed.append(os.path.basename(path))
+        return real_hash_file(path, *args, **kwargs)
+
+    with patch.object(files_module, 'hash_file', side_effect=spy):
+        entries = collector.collect_entries()
+    return entries, sorted(hashed)
+
+
+class TestGitIndex:
+    """Test cases for GitIndex."""
+
+    def test_clean_files_reuse_index_shas(self, repo):
+        """Test that only modified and untracked files are read."""
+        (repo / 'src' / 'b.py').write_text('print(2)\n')
+        (repo / 'new.txt').write_text('new\n')
+
+        entries, hashed = collect_paths(FilesCollector(watch_dirs=[str(repo)], hash_cache=False))
+
+        assert hashed == ['b.py', 'new.txt']
+        for entry in entries:
+            assert entry['hash'] == git(repo, 'hash-object', entry['path'].replace(os.sep, '/'))
+
+    @pytest.mark.parametrize('version', ['2', '3', '4'])
+    def test_index_versions(self, repo, version):
+        """Test parsing every on-disk index version, from a subdirectory of the work tree."""
+        git(repo, 'update-index', '--index-version', version)
+        root, git_dir = find_git_dir(str(repo / 'src'))
+        assert root == str(repo)
+
+        index = GitIndex.load(root, git_dir)
+
+        assert set(index.entries) == {'a.txt', 'src/b.py'}
+        stat = os.stat(repo / 'src' / 'b.py')
+        assert index.lookup(os.path.join('src', 'b.py'), stat) == git(repo, 'rev-parse', ':src/b.py')
+
+    def test_racily_clean_entries_are_hashed(self, repo):
+        """Test that files modified after the index was written are never trusted."""
+        future = time.time() + 60
+        os.utime(repo / 'a.txt', (future, future))
+        git(repo, 'update-index', '--refresh')
+
+        index = GitIndex.load(str(repo), str(repo / '.git'))
+
+        assert 'a.txt' not in index.entries
+        assert 'src/b.py' in index.entries
+
+    def test_disabled_outside_checkouts(self, tmp_path, repo):
+        """Test that plain directories and git_index=False keep the configured algorithm."""
+        plain = tmp_path / 'plain'
+        plain.mkdir()
+        (plain / 'a.txt').write_text('hello\n')
+
+        in_repo = FilesCollector(watch_dirs=[str(repo)], git_index=False).collect_entries()
+        outside = FilesCollector(watch_dirs=[str(plain)]).collect_entries()
+
+        assert in_repo[0]['hash'] == outside[0]['hash'] != git(repo, 'hash-object', 'a.txt')
@@ -0,0 +1,81 @@
+"""
+Tests for hash cache module.
+"""
+
+import os
+import time
+
+from envdiff.hashcache import FileHashCache
+
+
+class TestFileHashCache:
+    """Test cases for FileHashCache."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.old = time.time() - 3600
+
+    def make_file(self, tmp_path, name='file.txt', content='data'):
+        """Create a file with an mtime outside the racy window."""
+        path = tmp_path / name
+        path.write_text(content)
+        os.utime(path, (self.old, self.old))
+        return path
+
+    def test_hit_after_store(self, tmp_path):
+        """Test that a stored digest is returned for matching stat data."""
+        path = self.make_file(tmp_path)
+        cache = FileHashCache(str(tmp_path / 'cache.db'))
+        
+        cache.store(os.stat(path), 'md5', 'abc123')
+        cache.close()
+        
+        cache = FileHashCache(str(tmp_path / 'cache.db'))
+        assert cache.lookup(os.stat(path), 'md5') == 'abc123'
+        assert cache.hits == 1
+        cache.close()
+
+    def test_miss_after_modification(self, tmp_path):
+        """Test that changed stat data invalidates the entry."""
+        path = self.make_file(tmp_path)
+        cache = FileHashCache(str(tmp_path / 'cache.db'))
+        cache.store(os.stat(path), 'md5', 'abc123')
+        cache.flush()
+        
+        path.write_text('changed data')
+        os.utime(path, (self.old + 10, self.old + 10))
+        
+        assert cache.lookup(os.stat(path), 'md5') is None
+        assert cache.misses == 1
+        cache.close()
+
+    def test_algorithm_is_part_of_key(self, tmp_path):
+        """Test that digests from another algorithm are not reused."""
+        path = self.make_file(tmp_path)
+        cache = FileHashCache(str(tmp_path / 'cache.db'))
+        cache.store(os.stat(path), 'md5', 'abc123')
+        cache.flush()
+        
+        assert cache.lookup(os.stat(path), 'sha1') is None
+        cache.close()
+
+    def test_racy_files_not_cached(self, tmp_path):
+        """Test that just-modified files are not cached."""
+        path = tmp_path / 'fresh.txt'
+        path.write_text('data')
+        cache = FileHashCache(str(tmp_path / 'cache.db'))
+        cache.store(os.stat(path), 'md5', 'abc123')
+        cache.flush()
+        
+        assert cache.lookup(os.stat(path), 'md5') is None
+        cache.close()
+
+    def test_stale_entries_evicted(self, tmp_path):
+        """Test that entries older than max_age are evicted on flush."""
+        path = self.make_file(tmp_path)
+        cache = FileHashCache(str(tmp_path / 'cache.db'), max_age=-1)
+        cache.store(os.stat(path), 'md5', 'abc123')
+        cache.flush()
+        
+        assert cache.lookup(os.stat(path), 'md5') is None
+        cache.close()
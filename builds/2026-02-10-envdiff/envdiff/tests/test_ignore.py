@@ -0,0 +1,174 @@
+"""
+Tests for ignore module.
+"""
+
+import os
+from unittest.mock import patch
+
+from envdiff.collectors import FilesCollector
+from envdiff.ignore import IgnoreMatcher, IgnoreRules
+
+
+def write(path, text=''):
+    """Create a file and its parent directories."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+class TestIgnoreRules:
+    """Test cases for IgnoreRules."""
+
+    def test_unanchored_pattern_matches_at_any_depth(self):
+        """Test that a pattern without '/' matches a name in any directory."""
+        rules = IgnoreRules(['*.log'])
+        assert rules.match('app.log', False)
+        assert rules.match('logs/deep/app.log', False)
+        assert rules.match('app.log.txt', False) is None
+
+    def test_anchored_pattern(self):
+        """Test that a leading or inner '/' anchors a pattern to its directory."""
+        rules = IgnoreRules(['/build', 'doc/*.html'])
+        assert rules.match('build', True)
+        assert rules.match('src/build', True) is None
+        assert rules.match('doc/index.html', False)
+        assert rules.match('doc/api/index.html', False) is None
+
+    def test_directory_only_pattern(self):
+        """Test that a trailing '/' matches directories only."""
+        rules = IgnoreRules(['cache/'])
+        assert rules.match('cache', True)
+        assert rules.match('a/cache', True)
+        assert rules.match('cache', False) is None
+
+    def test_double_star(self):
+        """Test leading, inner and trailing '**'."""
+        rules = IgnoreRules(['**/tmp', 'a/**/b', 'out/**'])
+        assert rules.match('tmp', True)
+        assert rules.match('x/y/tmp', False)
+        assert rules.match('a/b', False)
+        assert rules.match('a/x/y/b', False)
+        assert rules.match('out/x/y', False)
+        assert rules.match('out', True) is None
+
+    def test_negation_last_match_wins(self):
+        """Test that later patterns override earlier ones."""
+        rules = IgnoreRules(['*.log', '!keep.log'])
+        assert rules.match('debug.log', False) is True
+        assert rules.match('keep.log', False) is False
+        assert rules.match('x/keep.log', False) is False
+
+    def test_comments_escapes_and_classes(self):
+        """Test comments, escaped specials, trailing spaces and character classes."""
+        rules = IgnoreRules(['# comment', '', '\\#hash', '\\!bang', 'trail  ', 'file[0-9].txt', 'x[!a].md'])
+        assert rules.match('# comment', False) is None
+        assert rules.match('#hash', False)
+        assert rules.match('!bang', False)
+        assert rules.match('trail', False)
+        assert rules.match('file7.txt', False)
+        assert rules.match('filex.txt', False) is None
+        assert rules.match('xb.md', False)
+        assert rules.match('xa.md', False) is None
+
+
+class TestIgnoreMatcher:
+    """Test cases for IgnoreMatcher."""
+
+    def test_defaults_are_components_not_substrings(self, tmp_path):
+        """Test that defaults match names, not every path containing them."""
+        matcher = IgnoreMatcher(str(tmp_path))
+        assert matcher.is_ignored('node_modules/pkg/index.js', False)
+        assert matcher.is_ignored('src/.env', False)
+        assert matcher.is_ignored('.venv/lib/site.py', False)
+        assert matcher.is_ignored('mod/__pycache__/m.cpython-312.pyc', False)
+        assert not matcher.is_ignored('config.env.example', False)
+        assert not matcher.is_ignored('docs/venv-setup.md', False)
+        assert not matcher.is_ignored('src/environment.py', False)
+
+    def test_nested_ignore_files_take_precedence(self, tmp_path):
+        """Test that deeper ignore files and .envdiffignore override shallower rules."""
+        write(tmp_path / '.gitignore', '*.log\n')
+        write(tmp_path / 'sub' / '.gitignore', '!important.log\n')
+        write(tmp_path / '.envdiffignore', 'secrets/\n')
+        matcher = IgnoreMatcher(str(tmp_path))
+        assert matcher.is_ignored('debug.log', False)
+        assert matcher.is_ignored('other/important.log', False)
+        assert not matcher.is_ignored('sub/important.log', False)
+        assert matcher.is_ignored('a/secrets/key.pem', False)
+
+    def test_file_in_ignored_directory_cannot_be_reincluded(self, tmp_path):
+        """Test that negating a file does not undo its parent directory's exclusion."""
+        write(tmp_path / '.gitignore', 'build/\n!build/keep.txt\n')
+        matcher = IgnoreMatcher(str(tmp_path))
+        assert matcher.match('build/keep.txt', False) is False
+        assert matcher.is_ignored('build/keep.txt', False)
+
+    def test_default_can_be_negated(self, tmp_path):
+        """Test that an ignore file can re-include a default-ignored name."""
+        write(tmp_path / '.envdiffignore', '!.github/\n')
+        matcher = IgnoreMatcher(str(tmp_path))
+        assert not matcher.is_ignored('.github/workflows/ci.yml', True)
+        assert matcher.is_ignored('.git/config', False)
+
+    def test_git_info_exclude(self, tmp_path):
+        """Test that .git/info/exclude applies at the root."""
+        write(tmp_path / '.git' / 'info' / 'exclude', '*.bak\n')
+        assert IgnoreMatcher(str(tmp_path)).is_ignored('a/b.bak', False)
+        assert not IgnoreMatcher(str(tmp_path), ignore_files=()).is_ignored('a/b.bak', False)
+
+    def test_walk_prunes_ignored_directories(self, tmp_path):
+        """Test that ignored directories are not listed during the walk."""
+        write(tmp_path / 'b.txt')
+        write(tmp_path / 'a' / 'a.txt')
+        write(tmp_path / 'node_modules' / 'x.js')
+        write(tmp_path / 'build' / 'out.bin')
+        write(tmp_path / '.gitignore', 'build/\n')
+        listed = []
+        real_scandir = os.scandir
+
+        def scandir(path):
+            listed.append(os.path.relpath(path, tmp_path))
+            return real_scandir(path)
+
+        matcher = IgnoreMatcher(str(tmp_path))
+        with patch('os.scandir', side_effect=scandir):
+            files = [os.path.relpath(entry.path, tmp_path) for entry in matcher.walk()]
+
+        assert files == ['b.txt', os.path.join('a', 'a.txt')]
+        assert sorted(listed) == ['.', 'a']
+
+
+class TestFilesCollectorIgnore:
+    """Test cases for ignore rules in FilesCollector."""
+
+    def test_collect_honours_gitignore(self, tmp_path):
+        """Test that collect applies .gitignore and no longer drops substring matches."""
+        write(tmp_path / '.gitignore', '*.log\ndist/\n')
+        write(tmp_path / 'app.log')
+        write(tmp_path / 'dist' / 'bundle.js')
+        write(tmp_path / 'config.env.example')
+        write(tmp_path / 'docs' / 'venv-setup.md')
+        write(tmp_path / 'venv' / 'bin' / 'python')
+
+        paths = [entry['path'] for entry in FilesCollector(watch_dirs=[str(tmp_path)]).collect()['entries']]
+
+        assert paths == ['config.env.example', os.path.join('docs', 'venv-setup.md')]
+
+    def test_custom_patterns_without_ignore_files(self, tmp_path):
+        """Test that ignore_patterns replace the defaults and ignore_files can be disabled."""
+        write(tmp_path / '.gitignore', '*.txt\n')
+        write(tmp_path / 'a.txt')
+        write(tmp_path / 'b.dat')
+
+        collector = FilesCollector(watch_dirs=[str(tmp_path)], ignore_patterns=['*.dat'], ignore_files=())
+        paths = [entry['path'] for entry in collector.collect()['entries']]
+
+        assert paths == ['.gitignore', 'a.txt']
+
+    def test_skip_predicates_take_paths(self, tmp_path):
+        """Test skip_dir/skip_file against absolute paths."""
+        write(tmp_path / '.gitignore', 'generated/\n')
+        collector = FilesCollector(watch_dirs=[str(tmp_path)])
+        assert collector.skip_dir(str(tmp_path / 'src' / 'generated'))
+        assert collector.skip_file(str(tmp_path / 'src' / 'generated' / 'a.py'))
+        assert not collector.skip_file(str(tmp_path / 'src' / 'a.py'))
+        assert not collector.skip_file('/elsewhere/.hidden')
@@ -0,0 +1,88 @@
+"""
+Tests for merkle module.
+"""
+
+import os
+import random
+
+from envdiff.diff import SnapshotDiff
+from envdiff.merkle import build_tree, entries_in, subtree, tree_section
+
+
+def entry(path, digest='h', size=1):
+    """Build a file entry with an os.sep-separated path."""
+    return {'path': path.replace('/', os.sep), 'hash': digest, 'size': size, 'mtime': 1.0}
+
+
+def section(entries):
+    """Build a tree section from unsorted entries."""
+    return tree_section(sorted(entries, key=lambda e: e['path']))
+
+
+class TestBuildTree:
+    """Test cases for build_tree."""
+
+    def test_structure(self):
+        """Test that nodes hold direct files and subdirectories."""
+        tree = build_tree([entry('a.txt'), entry('src/b.py'), entry('src/lib/c.py')])
+        assert 'files' in tree
+        assert set(tree['dirs']) == {'src'}
+        assert 'files' in tree['dirs']['src']
+        assert 'dirs' not in tree['dirs']['src']['dirs']['lib']
+
+    def test_change_propagates_only_to_ancestors(self):
+        """Test that a changed file changes its ancestors' hashes and nothing else."""
+        before = build_tree([entry('docs/x.md'), entry('src/lib/c.py')])
+        after = build_tree([entry('docs/x.md'), entry('src/lib/c.py', 'new')])
+        assert before['hash'] != after['hash']
+        assert before['dirs']['src']['hash'] != after['dirs']['src']['hash']
+        assert before['dirs']['docs'] == after['dirs']['docs']
+
+    def test_empty(self):
+        """Test that an empty file list has a stable root."""
+        assert build_tree([]) == build_tree([])
+        assert build_tree([])['hash'] != build_tree([entry('a')])['hash']
+
+    def test_subtree(self):
+        """Test proving a directory unchanged with one comparison."""
+        one = section([entry('src/a.py'), entry('README')])
+        two = section([entry('src/a.py'), entry('README', 'new')])
+        assert subtree(one['tree'], 'src')['hash'] == subtree(two['tree'], 'src')['hash']
+        assert subtree(one['tree'], 'missing') is None
+        assert subtree(one['tree'], '') is one['tree']
+
+
+class TestChangedEntries:
+    """Test cases for entries_in and comparing only changed directories."""
+
+    def test_entries_in_skips_subdirectories(self):
+        """Test direct and recursive selection from a sorted list."""
+        entries = section([entry('a/x'), entry('a/b/y'), entry('a/b/c/z'), entry('a.txt'),
+                           entry('a/c'), entry('ab')])['entries']
+        direct = [e['path'] for e in entries_in(entries, 'a', False)]
+        recursive = [e['path'] for e in entries_in(entries, 'a', True)]
+        assert direct == [os.path.join('a', 'c'), os.path.join('a', 'x')]
+        assert len(recursive) == 4
+        assert [e['path'] for e in entries_in(entries, '', False)] == ['a.txt', 'ab']
+
+    def test_matches_flat_comparison(self):
+        """Test that the tree diff equals the flat diff on random edits."""
+        rng = random.Random(7)
+        dirs = ['', 'a', 'a/b', 'a/b/c', 'd', 'd/e']
+        base = [entry(f'{rng.choice(dirs)}/f{i}'.lstrip('/'), str(i)) for i in range(300)]
+        base = list({e['path']: e for e in base}.values())
+        engine = SnapshotDiff()
+
+        for _ in range(20):
+            edited = [dict(e) for e in base if rng.random() > 0.05]
+            for e in rng.sample(edited, 5):
+                e['hash'] = 'changed'
+            edited += [entry(f'{rng.choice(dirs)}/new{i}'.lstrip('/')) for i in range(3)]
+
+            tree_diff = engine.compare({'files': section(base)}, {'files': section(edited)})
+            flat_diff = engine.compare({'files': sorted(base, key=lambda e: e['path'])},
+                                       {'files': sorted(edited, key=lambda e: e['path'])})
+            for result in (tree_diff, flat_diff):
+                for key in ('items_added', 'items_removed'):
+                    result['files'][key].sort(key=lambda e: e['path'])
+            assert tree_diff == flat_diff
@@ -0,0 +1,87 @@
+"""
+Tests for package cache module.
+"""
+
+import os
+from unittest.mock import patch
+
+from envdiff.collectors import PackagesCollector, packages
+from envdiff.pkgcache import PackageCache, directory_fingerprint
+
+
+class TestPackageCache:
+    """Test cases for PackageCache."""
+
+    def test_round_trip(self, tmp_path):
+        """Test that an inventory is returned for the same fingerprint only."""
+        cache = PackageCache(str(tmp_path / 'cache.db'))
+        cache.put('pip', 'fp1', {'requests': '2.31.0'})
+        cache.close()
+        
+        cache = PackageCache(str(tmp_path / 'cache.db'))
+        assert cache.get('pip', 'fp1') == {'requests': '2.31.0'}
+        assert cache.get('pip', 'fp2') is None
+        assert cache.get('npm', 'fp1') is None
+        assert (cache.hits, cache.misses) == (1, 2)
+        cache.close()
+
+    def test_lru_eviction_by_size(self, tmp_path):
+        """Test that least recently used entries are evicted beyond max_bytes."""
+        inventory = {'package': 'x' * 100}
+        cache = PackageCache(str(tmp_path / 'cache.db'), max_bytes=300)
+        
+        with patch('time.time', side_effect=[1.0, 2.0, 3.0, 4.0]):
+            cache.put('pip', 'a', inventory)
+            cache.put('pip', 'b', inventory)
+            cache.get('pip', 'a')  # a is now more recent than b
+            cache.put('pip', 'c', inventory)
+        
+        assert cache.get('pip', 'b') is None
+        assert cache.get('pip', 'a') == inventory
+        assert cache.get('pip', 'c') == inventory
+        cache.close()
+
+    def test_directory_fingerprint(self, tmp_path):
+        """Test that adding an entry or touching a child changes the fingerprint."""
+        (tmp_path / 'formula' / '1.0').mkdir(parents=True)
+        before = directory_fingerprint([str(tmp_path)], children_of=[str(tmp_path)])
+        assert before == directory_fingerprint([str(tmp_path)], children_of=[str(tmp_path)])
+        
+        # An upgrade adds a version directory inside the formula directory only
+        (tmp_path / 'formula' / '1.1').mkdir()
+        os.utime(tmp_path / 'formula', ns=(0, 1))
+        assert directory_fingerprint([str(tmp_path)], children_of=[str(tmp_path)]) != before
+        
+        assert directory_fingerprint([str(tmp_path / 'missing')]) is None
+
+
+class TestPackagesCollectorCache:
+    """Test cases for PackagesCollector with the package cache."""
+
+    def test_unchanged_install_dirs_skip_collection(self, tmp_path):
+        """Test that a second run reuses the inventory until site-packages changes."""
+        site_dir = tmp_path / 'venv' / 'lib' / 'python3.11' / 'site-packages'
+        (site_dir / 'requests-2.31.0.dist-info').mkdir(parents=True)
+        (site_dir / 'requests-2.31.0.dist-info' / 'METADATA').write_text('Name: requests\nVersion: 2.31.0\n')
+        
+        def collect():
+            collector = PackagesCollector(python_envs=[str(tmp_path / 'venv')], npm_backend='subprocess',
+                                          cache_path=str(tmp_path / 'cache.db'))
+            return collector.collect()
+        
+        with patch('envdiff.collectors.packages.run_commands',
+                   side_effect=lambda commands, timeout: {name: None for name in commands}), \
+             patch('envdiff.collectors.packages.read_distributions',
+                   wraps=packages.read_distributions) as mock_read:
+            first = collect()
+            second = collect()
+            assert mock_read.call_count == 1
+            
+            (site_dir / 'flask-3.0.0.dist-info').mkdir()
+            (site_dir / 'flask-3.0.0.dist-info' / 'METADATA').write_text('Name: flask\nVersion: 3.0.0\n')
+            third = collect()
+            assert mock_read.call_count == 2
+        
+        assert first['pip'] == second['pip'] == {'requests': '2.31.0'}
+        assert third['pip'] == {'requests': '2.31.0', 'flask': '3.0.0'}
+        assert list(first) == ['pip', 'npm', 'brew']
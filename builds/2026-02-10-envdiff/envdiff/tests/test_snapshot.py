@@ -2,9 +2,13 @@
 Tests for snapshot module.
 """
 
+import threading
+import time
+
 import pytest
 from unittest.mock import Mock, patch
-from envdiff.snapshot import SnapshotEngine
+from envdiff.codec import section_hash
+from envdiff.snapshot import DEFAULT_TIMEOUTS, SnapshotEngine, collector_name
 from envdiff.collectors import ProcessCollector
 
 
@@ -65,6 +69,21 @@ class TestSnapshotEngine:
         assert "error" in snapshot["failing"]
         assert "Test error" in snapshot["failing"]["error"]
 
+    @pytest.mark.parametrize('concurrent', [True, False])
+    def test_unhashable_section_is_an_error(self, concurrent):
+        """Test that data that cannot be fingerprinted fails only its own section."""
+        bad, good = Mock(), Mock()
+        bad.__class__.__name__ = "BadCollector"
+        bad.collect.return_value = {'value': object()}
+        good.__class__.__name__ = "GoodCollector"
+        good.collect.return_value = {'value': 1}
+        
+        snapshot = SnapshotEngine([bad, good], concurrent=concurrent).capture()
+        
+        assert 'not JSON serializable' in snapshot['bad']['error']
+        assert snapshot['good'] == {'value': 1}
+        assert snapshot.fingerprints['bad'] == section_hash(snapshot['bad'])
+
     def test_capture_named(self):
         """Test named snapshot capture."""
         mock_collector = Mock()
@@ -88,4 +107,93 @@ class TestSnapshotEngine:
         snapshot_id, snapshot_data = engine.capture_named()
         
         assert snapshot_id.startswith("snapshot-")
-        assert "test" in snapshot_data
\ No newline at end of file
+        assert "test" in snapshot_data
+
+    def test_capture_sequential(self):
+        """Test snapshot capture with concurrency disabled."""
+        mock_collector = Mock()
+        mock_collector.__class__.__name__ = "TestCollector"
+        mock_collector.collect.return_value = {"test": "data"}
+        
+        engine = SnapshotEngine([mock_collector], concurrent=False)
+        snapshot = engine.capture()
+        
+        assert snapshot == {"test": {"test": "data"}}
+
+    def test_capture_runs_collectors_concurrently(self):
+        """Test that total capture time tracks the slowest collector."""
+        collectors = []
+        for name in ("SlowACollector", "SlowBCollector", "SlowCCollector"):
+            collector = Mock()
+            collector.__class__.__name__ = name
+            collector.collect.side_effect = lambda: time.sleep(0.3) or ["done"]
+            collectors.append(collector)
+        
+        engine = SnapshotEngine(collectors)
+        start = time.monotonic()
+        snapshot = engine.capture()
+        elapsed = time.monotonic() - start
+        
+        assert elapsed < 0.8
+        assert snapshot["slowa"] == ["done"]
+        assert snapshot["slowc"] == ["done"]
+
+    def test_capture_collector_timeout(self):
+        """Test that a collector overrunning its deadline records a timeout entry."""
+        slow = Mock()
+        slow.__class__.__name__ = "SlowCollector"
+        slow.collect.side_effect = lambda: time.sleep(2) or ["late"]
+        
+        fast = Mock()
+        fast.__class__.__name__ = "FastCollector"
+        fast.collect.return_value = {"ok": True}
+        
+        engine = SnapshotEngine([slow, fast], timeouts={"slow": 0.1})
+        start = time.monotonic()
+        snapshot = engine.capture()
+        
+        assert time.monotonic() - start < 1.5
+        assert snapshot["slow"]["timed_out"] is True
+        assert snapshot["slow"]["timeout"] == 0.1
+        assert "timed out" in snapshot["slow"]["error"]
+        assert snapshot["fast"] == {"ok": True}
+
+    def test_overrunning_collector_is_not_restarted(self):
+        """Test that a collector still running from a timed-out capture is skipped, not rerun."""
+        release = threading.Event()
+        stuck = Mock()
+        stuck.__class__.__name__ = "StuckCollector"
+        stuck.collect.side_effect = lambda: release.wait(5) and ["late"]
+        
+        engine = SnapshotEngine([stuck], timeouts={"stuck": 0.05})
+        snapshots = [engine.capture() for _ in range(5)]
+        
+        live = [t for t in threading.enumerate() if t.name == "envdiff-stuck"]
+        assert len(live) == 1
+        assert stuck.collect.call_count == 1
+        assert all(snapshot["stuck"]["timed_out"] for snapshot in snapshots)
+        assert "earlier capture" in snapshots[-1]["stuck"]["error"]
+        
+        release.set()
+        live[0].join(1)
+        assert engine.capture()["stuck"] == ["late"]
+        assert stuck.collect.call_count == 2
+
+    def test_capture_fingerprints_sections(self):
+        """Test that every captured section carries its canonical fingerprint."""
+        mock_collector = Mock()
+        mock_collector.__class__.__name__ = "TestCollector"
+        mock_collector.collect.return_value = {"b": 2, "a": 1}
+        
+        for concurrent in (True, False):
+            engine = SnapshotEngine([mock_collector], concurrent=concurrent)
+            snapshot = engine.capture()
+            
+            assert snapshot.fingerprints == {"test": section_hash({"a": 1, "b": 2})}
+
+    def test_default_timeouts_match_section_names(self):
+        """Test that every default collector has an explicit deadline."""
+        engine = SnapshotEngine()
+        
+        for collector in engine.collectors:
+            assert collector_name(collector) in DEFAULT_TIMEOUTS
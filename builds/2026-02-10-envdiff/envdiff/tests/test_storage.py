@@ -0,0 +1,221 @@
+"""
+Tests for storage module.
+"""
+
+import json
+import os
+import sqlite3
+
+import pytest
+from envdiff.codec import decode_blob, encode_blob
+from envdiff.collectors import EnvVarsCollector, FilesCollector
+from envdiff.storage import SnapshotStorage
+
+
+class TestSnapshotStorage:
+    """Test cases for SnapshotStorage."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.storages = []
+
+    def teardown_method(self):
+        """Close pooled connections opened by the test."""
+        for storage in self.storages:
+            storage.close()
+
+    def make_storage(self, tmp_path):
+        """Create a storage on a temporary database."""
+        storage = SnapshotStorage(str(tmp_path / 'snapshots.db'))
+        self.storages.append(storage)
+        return storage
+
+    def test_save_and_get_snapshot(self, tmp_path):
+        """Test round-tripping a snapshot by id and by name."""
+        storage = self.make_storage(tmp_path)
+        storage.save_snapshot('snap-1', 'baseline', {'env_vars': {'A': '1'}})
+        
+        assert storage.get_snapshot('snap-1') == {'env_vars': {'A': '1'}}
+        assert storage.get_snapshot('baseline') == {'env_vars': {'A': '1'}}
+        assert storage.get_snapshot('missing') is None
+
+    def test_list_and_delete(self, tmp_path):
+        """Test listing newest first and deleting by name."""
+        storage = self.make_storage(tmp_path)
+        storage.save_snapshot('a', 'a', {})
+        storage.save_snapshot('b', 'b', {})
+        
+        assert [s['id'] for s in storage.list_snapshots()] == ['b', 'a']
+        assert storage.delete_snapshot('a')
+        assert not storage.snapshot_exists('a')
+        assert not storage.delete_snapshot('a')
+
+    def test_connection_is_pooled(self, tmp_path):
+        """Test that storages on the same database share one connection."""
+        first = self.make_storage(tmp_path)
+        second = self.make_storage(tmp_path)
+        
+        assert first._conn is second._conn
+
+    def test_close_discards_pooled_connection(self, tmp_path):
+        """Test that a new storage reconnects after close."""
+        first = self.make_storage(tmp_path)
+        first.save_snapshot('a', 'a', {})
+        first.close()
+        
+        second = self.make_storage(tmp_path)
+        assert second._conn is not first._conn
+        assert second.snapshot_exists('a')
+
+    def test_close_keeps_connection_shared_with_open_storages(self, tmp_path):
+        """Test that closing one storage leaves the others on the same database usable."""
+        first = self.make_storage(tmp_path)
+        second = self.make_storage(tmp_path)
+        first.save_snapshot('a', 'a', {})
+        
+        first.close()
+        first.close()
+        
+        assert [s['id'] for s in second.list_snapshots()] == ['a']
+        second.close()
+        with pytest.raises(sqlite3.ProgrammingError):
+            second._conn.execute("SELECT 1")
+
+    def test_section_check_runs_inside_write_transaction(self, tmp_path):
+        """Test that existing sections are looked up after the write lock is taken."""
+        storage = self.make_storage(tmp_path)
+        statements = []
+        storage._conn.set_trace_callback(statements.append)
+        try:
+            storage.save_snapshot('a', 'a', {'env_vars': {'A': '1'}})
+            storage.delete_snapshot('a')
+        finally:
+            storage._conn.set_trace_callback(None)
+        
+        begins = [i for i, sql in enumerate(statements) if sql == 'BEGIN IMMEDIATE']
+        check = next(i for i, sql in enumerate(statements) if sql.startswith('SELECT 1 FROM sections'))
+        lookup = next(i for i, sql in enumerate(statements) if sql.startswith('SELECT id FROM snapshots'))
+        assert len(begins) == 2
+        assert begins[0] < check < begins[1] < lookup
+
+    def test_wal_mode_and_busy_timeout(self, tmp_path):
+        """Test that the connection runs in WAL mode with a busy timeout."""
+        storage = self.make_storage(tmp_path)
+        
+        assert storage._conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert storage._conn.execute("PRAGMA busy_timeout").fetchone()[0] > 0
+
+    def test_lookups_use_indexes(self, tmp_path):
+        """Test that name lookups and listing are served by indexes."""
+        storage = self.make_storage(tmp_path)
+        
+        plan = storage._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT data FROM snapshots WHERE id = ? OR name = ?",
+            ('x', 'x')
+        ).fetchall()
+        assert any('idx_snapshots_name' in row[-1] for row in plan)
+        
+        plan = storage._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM snapshots ORDER BY timestamp DESC"
+        ).fetchall()
+        assert any('idx_snapshots_timestamp' in row[-1] for row in plan)
+
+    def test_rows_are_compressed_blobs(self, tmp_path):
+        """Test that new rows use the compact versioned blob format."""
+        storage = self.make_storage(tmp_path)
+        data = {'files': [{'path': f'file{i}.txt', 'hash': 'abc'} for i in range(200)]}
+        storage.save_snapshot('a', 'a', data)
+        
+        blob = storage._conn.execute("SELECT data FROM sections").fetchone()[0]
+        assert isinstance(blob, bytes)
+        assert blob.startswith(b'EDS')
+        assert len(blob) < len(json.dumps(data)) / 5
+
+    def test_legacy_rows_readable_and_migrated(self, tmp_path):
+        """Test that pretty-printed JSON rows are read and rewritten in place."""
+        db_path = str(tmp_path / 'snapshots.db')
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("CREATE TABLE snapshots (id TEXT PRIMARY KEY, name TEXT NOT NULL, "
+                         "timestamp REAL NOT NULL, data JSON NOT NULL)")
+            conn.execute("INSERT INTO snapshots VALUES ('old', 'old', 1.0, ?)",
+                         (json.dumps({'env_vars': {'A': '1'}}, indent=2),))
+        
+        storage = self.make_storage(tmp_path)
+        storage.save_snapshot('new', 'new', {'env_vars': {'B': '2'}})
+        assert storage.get_snapshot('old') == {'env_vars': {'A': '1'}}
+        
+        stats = storage.migrate()
+        assert stats['migrated'] == 1
+        assert storage.get_snapshot('old') == {'env_vars': {'A': '1'}}
+        assert storage.get_section_hashes('old').keys() == {'env_vars'}
+        assert storage.migrate()['migrated'] == 0
+
+    def test_codec_round_trip(self):
+        """Test both compression codecs and unknown codec handling."""
+        data = {'pip': {'requests': '2.31.0'}, 'name': 'caf\u00e9'}
+        
+        assert decode_blob(encode_blob(data, 'zlib')) == data
+        assert decode_blob(encode_blob(data, 'lzma')) == data
+        with pytest.raises(ValueError):
+            encode_blob(data, 'bz2')
+
+    @pytest.mark.skipif(os.name != 'posix', reason='non-UTF-8 names are POSIX only')
+    def test_surrogate_escaped_strings_round_trip(self, tmp_path, monkeypatch):
+        """Test env vars and file names holding non-UTF-8 bytes, as os.fsdecode decodes them."""
+        monkeypatch.setenv('ENVDIFF_LATIN1', os.fsdecode(b'caf\xe9'))
+        watched = tmp_path / 'watched'
+        watched.mkdir()
+        try:
+            with open(os.path.join(os.fsencode(watched), b'caf\xe9.txt'), 'w') as f:
+                f.write('x')
+        except OSError:
+            pytest.skip('file system rejects non-UTF-8 names')
+        
+        data = {'env_vars': EnvVarsCollector().collect(),
+                'files': FilesCollector(watch_dirs=[str(watched)], hash_cache=False).collect()}
+        storage = self.make_storage(tmp_path)
+        storage.save_snapshot('snap-1', 'snap-1', data)
+        
+        assert data['env_vars']['ENVDIFF_LATIN1'] == 'caf\udce9'
+        assert [e['path'] for e in data['files']['entries']] == ['caf\udce9.txt']
+        assert storage.get_snapshot('snap-1') == data
+
+    def test_identical_sections_stored_once(self, tmp_path):
+        """Test that sections shared between snapshots are deduplicated."""
+        storage = self.make_storage(tmp_path)
+        packages = {'pip': {'requests': '2.31.0'}}
+        storage.save_snapshot('a', 'a', {'packages': packages, 'system': {'cpu_percent': 1.0}})
+        storage.save_snapshot('b', 'b', {'packages': packages, 'system': {'cpu_percent': 2.0}})
+        
+        count = storage._conn.execute("SELECT COUNT(*) FROM sections").fetchone()[0]
+        assert count == 3
+        
+        hashes_a = storage.get_section_hashes('a')
+        hashes_b = storage.get_section_hashes('b')
+        assert hashes_a['packages'] == hashes_b['packages']
+        assert hashes_a['system'] != hashes_b['system']
+        assert storage.get_snapshot('b') == {'packages': packages, 'system': {'cpu_percent': 2.0}}
+
+    def test_unreferenced_sections_collected(self, tmp_path):
+        """Test that deleting or replacing snapshots drops orphaned sections."""
+        storage = self.make_storage(tmp_path)
+        storage.save_snapshot('a', 'a', {'env_vars': {'A': '1'}, 'system': {}})
+        storage.save_snapshot('b', 'b', {'env_vars': {'A': '1'}, 'system': {'x': 1}})
+        storage.save_snapshot('b', 'b', {'env_vars': {'A': '1'}, 'system': {'x': 2}})
+        
+        assert storage._conn.execute("SELECT COUNT(*) FROM sections").fetchone()[0] == 3
+        
+        storage.delete_snapshot('a')
+        assert storage._conn.execute("SELECT COUNT(*) FROM sections").fetchone()[0] == 2
+        assert storage.get_snapshot('b') == {'env_vars': {'A': '1'}, 'system': {'x': 2}}
+
+    def test_partial_load_keeps_all_fingerprints(self, tmp_path):
+        """Test loading a subset of sections from a stored snapshot."""
+        storage = self.make_storage(tmp_path)
+        storage.save_snapshot('a', 'a', {'packages': {'pip': {}}, 'system': {'cpu_percent': 1.0}})
+        
+        snapshot = storage.get_snapshot('a', sections=['system'])
+        
+        assert snapshot == {'system': {'cpu_percent': 1.0}}
+        assert snapshot.fingerprints == storage.get_section_hashes('a')
+        assert set(snapshot.fingerprints) == {'packages', 'system'}
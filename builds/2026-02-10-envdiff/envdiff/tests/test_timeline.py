@@ -0,0 +1,87 @@
+"""
+Tests for timeline module.
+"""
+
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from click.testing import CliRunner
+from envdiff.cli import cli
+from envdiff.storage import SnapshotStorage
+from envdiff.timeline import Timeline, parse_time
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """A storage holding four snapshots taken 100 seconds apart."""
+    storage = SnapshotStorage(str(tmp_path / 'snapshots.db'))
+    snapshots = [
+        {'env_vars': {'A': '1'}, 'packages': {'pip': {'requests': '2.0'}}},
+        {'env_vars': {'A': '2'}, 'packages': {'pip': {'requests': '2.0'}}},
+        {'env_vars': {'A': '2'}, 'packages': {'pip': {'requests': '2.0'}}},
+        {'env_vars': {'A': '2', 'B': '1'}, 'packages': {'pip': {'requests': '2.1'}}},
+    ]
+    for index, data in enumerate(snapshots):
+        with patch('envdiff.storage.time.time', return_value=1000.0 + 100 * index):
+            storage.save_snapshot(f'snap-{index}', f'tick-{index}', data)
+    yield storage
+    storage.close()
+
+
+class TestTimeline:
+    """Test cases for Timeline."""
+
+    def test_consecutive_diffs(self, storage):
+        """Test that each snapshot is diffed against the one before it."""
+        steps = list(Timeline(storage).steps())
+
+        assert [(step['from']['id'], step['to']['id']) for step in steps] == \
+            [('snap-0', 'snap-1'), ('snap-1', 'snap-2'), ('snap-2', 'snap-3')]
+        assert steps[0]['diff'] == {'env_vars': {'changed': {'A': {'old': '1', 'new': '2'}}}}
+        assert steps[1]['diff'] == {}
+        assert steps[2]['diff']['env_vars'] == {'added': {'B': '1'}}
+        assert steps[2]['diff']['packages']['changed'] == {'pip[requests]': {'old': '2.0', 'new': '2.1'}}
+
+    def test_loads_only_changed_sections_once(self, storage):
+        """Test that unchanged sections are skipped by fingerprint and changed ones reused."""
+        loaded = []
+        real_get_snapshot = storage.get_snapshot
+
+        def get_snapshot(snapshot_id, sections=None):
+            loaded.append((snapshot_id, sorted(sections)))
+            return real_get_snapshot(snapshot_id, sections=sections)
+
+        with patch.object(storage, 'get_snapshot', side_effect=get_snapshot):
+            list(Timeline(storage).steps())
+
+        assert loaded == [('snap-0', ['env_vars']), ('snap-1', ['env_vars']),
+                          ('snap-2', ['packages']), ('snap-3', ['env_vars', 'packages'])]
+
+    def test_time_range(self, storage):
+        """Test that since and until bound the snapshots, inclusively."""
+        steps = list(Timeline(storage).steps(since=1100.0, until=1300.0))
+        assert [(step['from']['id'], step['to']['id']) for step in steps] == \
+            [('snap-1', 'snap-2'), ('snap-2', 'snap-3')]
+        assert list(Timeline(storage).steps(since=1300.0)) == []
+
+    def test_parse_time(self):
+        """Test ages, ISO date-times and Unix timestamps."""
+        assert parse_time('24h', now=100000.0) == 100000.0 - 86400
+        assert parse_time('30m', now=0.0) == -1800.0
+        assert parse_time('2026-01-02T03:04:05') == datetime(2026, 1, 2, 3, 4, 5).timestamp()
+        assert parse_time('1700000000') == 1700000000.0
+        with pytest.raises(ValueError):
+            parse_time('yesterday')
+
+    def test_cli_prints_condensed_log(self, storage):
+        """Test the timeline command end to end."""
+        result = CliRunner().invoke(cli, ['timeline', '--storage', storage.db_path])
+
+        assert result.exit_code == 0
+        assert 'tick-1' in result.output and 'tick-3' in result.output
+        assert 'tick-2' not in result.output
+        assert '2 of 3 consecutive snapshot pairs changed' in result.output
+
+        result = CliRunner().invoke(cli, ['timeline', '--since', 'soon', '--storage', storage.db_path])
+        assert result.exit_code != 0
@@ -0,0 +1,257 @@
+"""
+Tests for watch module.
+"""
+
+import errno
+import os
+import time
+
+from unittest.mock import Mock, patch
+
+import pytest
+from envdiff import inotify
+from envdiff.collectors import FilesCollector
+from envdiff.diff import SnapshotDiff
+from envdiff.snapshot import SnapshotEngine
+from envdiff.watch import FileEventSource, WatchPipeline
+
+needs_inotify = pytest.mark.skipif(not inotify.is_available(), reason="inotify requires Linux")
+
+
+@needs_inotify
+class TestInotifyWatcher:
+    """Test cases for InotifyWatcher."""
+
+    def test_reports_touched_paths(self, tmp_path):
+        """Test that created and modified files are reported."""
+        with inotify.InotifyWatcher([str(tmp_path)]) as watcher:
+            (tmp_path / 'a.txt').write_text('a')
+            touched = watcher.collect(timeout=2.0, debounce=0.05)
+        
+        assert str(tmp_path / 'a.txt') in touched
+
+    def test_watches_new_directories(self, tmp_path):
+        """Test that directories created after start are watched too."""
+        with inotify.InotifyWatcher([str(tmp_path)]) as watcher:
+            (tmp_path / 'sub').mkdir()
+            watcher.collect(timeout=2.0, debounce=0.05)
+            
+            (tmp_path / 'sub' / 'b.txt').write_text('b')
+            touched = watcher.collect(timeout=2.0, debounce=0.05)
+        
+        assert str(tmp_path / 'sub' / 'b.txt') in touched
+
+    def test_skipped_directories_not_watched(self, tmp_path):
+        """Test that skipped directories produce no events."""
+        (tmp_path / 'node_modules').mkdir()
+        
+        with inotify.InotifyWatcher([str(tmp_path)], skip_dir=lambda path: os.path.basename(path) == 'node_modules') as watcher:
+            (tmp_path / 'node_modules' / 'x.js').write_text('x')
+            touched = watcher.collect(timeout=0.3, debounce=0.05)
+        
+        assert touched == set()
+
+    def test_unwatchable_new_directory_degrades(self, tmp_path):
+        """Test that running out of watches marks the watcher degraded instead of raising."""
+        with inotify.InotifyWatcher([str(tmp_path)]) as watcher:
+            with patch.object(watcher, '_add_watch', side_effect=OSError(errno.ENOSPC, 'No space left')):
+                (tmp_path / 'sub').mkdir()
+                touched = watcher.collect(timeout=2.0, debounce=0.05)
+        
+        assert str(tmp_path / 'sub') in touched
+        assert watcher.degraded
+
+
+@needs_inotify
+class TestFileEventSource:
+    """Test cases for FileEventSource."""
+
+    def make_source(self, tmp_path):
+        """Create an event source with a baseline over tmp_path/watched."""
+        watched = tmp_path / 'watched'
+        watched.mkdir()
+        (watched / 'keep.txt').write_text('keep')
+        (watched / 'gone.txt').write_text('gone')
+        
+        collector = FilesCollector(watch_dirs=[str(watched)], hash_cache=False)
+        source = FileEventSource.create(collector, debounce=0.05)
+        source.entries = collector.collect_entries()
+        return watched, source
+
+    def test_applies_changes_incrementally(self, tmp_path):
+        """Test that only touched paths change in the files section."""
+        watched, source = self.make_source(tmp_path)
+        try:
+            (watched / 'new.txt').write_text('new')
+            (watched / 'gone.txt').unlink()
+            
+            start = time.monotonic()
+            assert source.wait(timeout=2.0)
+            assert time.monotonic() - start < 2.5
+            
+            assert [e['path'] for e in source.entries] == ['keep.txt', 'new.txt']
+        finally:
+            source.close()
+
+    def test_no_events_within_timeout(self, tmp_path):
+        """Test that an idle tree reports no change."""
+        watched, source = self.make_source(tmp_path)
+        try:
+            assert not source.wait(timeout=0.1)
+        finally:
+            source.close()
+
+    def test_falls_back_without_files_collector(self):
+        """Test that no event source is created without a files collector."""
+        assert FileEventSource.create(None) is None
+
+
+class CountingCollector:
+    """Collector returning a new value on each call."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def collect(self):
+        self.calls += 1
+        return {'value': self.calls}
+
+
+class TestWatchPipeline:
+    """Test cases for WatchPipeline."""
+
+    def make_pipeline(self):
+        """Create a pipeline over a counting collector and mocked storage."""
+        collector = CountingCollector()
+        engine = SnapshotEngine(collectors=[collector], concurrent=False)
+        storage = Mock()
+        return collector, storage, WatchPipeline(engine, storage, SnapshotDiff())
+
+    def test_tick_captures_once_and_stores_what_was_diffed(self):
+        """Test that a changed tick runs each collector once and stores its data."""
+        collector, storage, pipeline = self.make_pipeline()
+        pipeline.baseline()
+        assert collector.calls == 1
+        
+        snapshot_id, diff = pipeline.tick()
+        
+        assert collector.calls == 2
+        assert diff['counting']['changed']['value'] == {'old': 1, 'new': 2}
+        stored_id, _, stored_data = storage.save_snapshot.call_args[0]
+        assert stored_id == snapshot_id
+        assert stored_data is pipeline.last
+        assert stored_data['counting'] == {'value': 2}
+
+    def test_unchanged_tick_stores_nothing(self):
+        """Test that a tick without changes does not write a snapshot."""
+        _, storage, pipeline = self.make_pipeline()
+        pipeline.baseline()
+        pipeline.diff_engine = Mock(compare=Mock(return_value={}), has_changes=Mock(return_value=False))
+        
+        assert pipeline.tick() is None
+        assert storage.save_snapshot.call_count == 1
+
+    def test_ids_unique_within_a_second(self):
+        """Test that snapshots stored in the same second get distinct IDs."""
+        _, _, pipeline = self.make_pipeline()
+        pipeline.baseline()
+        
+        with patch('envdiff.watch.time.time', return_value=1700000000.0):
+            first, _ = pipeline.tick()
+            second, _ = pipeline.tick()
+        
+        assert first == 'watch-1700000000'
+        assert second == 'watch-1700000000-1'
+
+
+class FastCollector(CountingCollector):
+    """Cheap collector scheduled often."""
+
+
+class SlowCollector(CountingCollector):
+    """Expensive collector scheduled rarely."""
+
+
+class TestWatchScheduling:
+    """Test cases for per-collector cadences in WatchPipeline."""
+
+    def make_pipeline(self, cadences):
+        """Create a pipeline over a fast and a slow collector."""
+        fast, slow = FastCollector(), SlowCollector()
+        engine = SnapshotEngine(collectors=[fast, slow], concurrent=False)
+        pipeline = WatchPipeline(engine, Mock(), SnapshotDiff(), cadences=cadences)
+        pipeline.baseline()
+        return fast, slow, pipeline
+
+    def test_tick_merges_into_rolling_state(self):
+        """Test that refreshing one section keeps the others from the last snapshot."""
+        fast, slow, pipeline = self.make_pipeline({})
+        
+        snapshot_id, diff = pipeline.tick(['fast'])
+        
+        assert (fast.calls, slow.calls) == (2, 1)
+        assert list(diff) == ['fast']
+        assert pipeline.last == {'fast': {'value': 2}, 'slow': {'value': 1}}
+
+    def test_timed_out_section_keeps_last_good_data(self):
+        """Test that a timeout entry never replaces a section's last good data."""
+        fast, slow, pipeline = self.make_pipeline({})
+        fingerprint = pipeline.last.fingerprints['slow']
+        timed_out = {'error': 'Collection timed out after 1s', 'timed_out': True, 'timeout': 1.0}
+        
+        with patch.object(slow, 'collect', return_value=timed_out):
+            snapshot_id, diff = pipeline.tick()
+        
+        assert list(diff) == ['fast']
+        assert pipeline.last['slow'] == {'value': 1}
+        assert pipeline.last.fingerprints['slow'] == fingerprint
+
+    def test_run_follows_cadences(self):
+        """Test that each collector runs at its own cadence."""
+        fast, slow, pipeline = self.make_pipeline({'fast': 5, 'slow': 60})
+        clock = [0.0]
+        
+        def sleep(seconds):
+            clock[0] += seconds
+            if clock[0] >= 120:
+                raise KeyboardInterrupt()
+        
+        changes = []
+        with patch('envdiff.watch.time.monotonic', side_effect=lambda: clock[0]), \
+             patch('envdiff.watch.time.sleep', side_effect=sleep):
+            with pytest.raises(KeyboardInterrupt):
+                pipeline.run(lambda snapshot_id, diff: changes.append(diff))
+        
+        # Baseline plus one run every 5s / 60s before t=120
+        assert fast.calls == 1 + 23
+        assert slow.calls == 1 + 1
+        assert len(changes) == 23
+        assert sum('slow' in diff for diff in changes) == 1
+
+    def test_degraded_file_events_fall_back_to_polling(self):
+        """Test that a degraded event source is dropped and its section rescanned, then polled."""
+        fast, slow = FastCollector(), SlowCollector()
+        engine = SnapshotEngine(collectors=[fast, slow], concurrent=False)
+        file_events = Mock(collector=slow, degraded=True)
+        file_events.wait.return_value = False
+        file_events.section.return_value = {'value': 0}
+        pipeline = WatchPipeline(engine, Mock(), SnapshotDiff(), file_events=file_events,
+                                 cadences={'fast': 5, 'slow': 20})
+        pipeline.baseline()
+        assert pipeline.scheduled_sections() == ['fast']
+        clock = [0.0]
+        
+        def sleep(seconds):
+            clock[0] += seconds
+            if clock[0] >= 30:
+                raise KeyboardInterrupt()
+        
+        with patch('envdiff.watch.time.monotonic', side_effect=lambda: clock[0]), \
+             patch('envdiff.watch.time.sleep', side_effect=sleep):
+            with pytest.raises(KeyboardInterrupt):
+                pipeline.run(lambda snapshot_id, diff: None)
+        
+        file_events.close.assert_called_once()
+        assert pipeline.file_events is None
+        # Baseline, the rescan at t=0 and the polled run at t=20
+        assert slow.calls == 3
@@ -0,0 +1,128 @@
+"""
+Timeline module - consecutive diffs across a range of stored snapshots.
+"""
+
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .diff import SnapshotDiff
+from .storage import SnapshotStorage
+
+# Relative times such as "90s", "30m", "24h", "7d", "2w"
+_AGE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([smhdw])\s*$')
+_UNIT_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+
+def parse_time(value: str, now: Optional[float] = None) -> float:
+    """
+    Parse a point in time given on the command line.
+
+    Args:
+        value: An age ("30m", "24h", "7d": that long before now), an ISO
+            date or date-time in local time, or a Unix timestamp.
+        now: Reference time for ages. Defaults to the current time.
+
+    Returns:
+        Unix timestamp.
+
+    Raises:
+        ValueError: If the value is in none of these forms.
+    """
+    match = _AGE.match(value)
+    if match:
+        amount, unit = match.groups()
+        return (time.time() if now is None else now) - float(amount) * _UNIT_SECONDS[unit]
+    try:
+        return datetime.fromisoformat(value.strip()).timestamp()
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"expected an age like 24h, an ISO date/time or a Unix timestamp, got '{value}'")
+
+
+class Timeline:
+    """
+    Diffs every pair of neighbouring snapshots in timestamp order, in one pass.
+
+    Snapshots are streamed oldest first with their section fingerprints
+    only. Sections whose fingerprints match their predecessor's are never
+    loaded; a changed section is loaded once, diffed against the previous
+    version and kept in place of it. Memory holds one version of each
+    section at most, however many snapshots the range covers.
+    """
+
+    def __init__(self, storage: SnapshotStorage, diff_engine: Optional[SnapshotDiff] = None):
+        """
+        Initialize the timeline.
+
+        Args:
+            storage: Snapshot storage to read from.
+            diff_engine: Engine computing each step's diff.
+        """
+        self.storage = storage
+        self.diff_engine = diff_engine or SnapshotDiff()
+
+    def steps(self, since: Optional[float] = None,
+              until: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the diff between each snapshot in a time range and the one before it.
+
+        Args:
+            since: Unix time of the first snapshot to include.
+            until: Unix time of the last snapshot to include.
+
+        Yields:
+            {'from': metadata, 'to': metadata, 'diff': diff by section}, where
+            metadata is the id, name, timestamp and fingerprints of a snapshot.
+        """
+        previous = None
+        # Sections loaded so far: name -> (fingerprint, data) as of the previous snapshot
+        state: Dict[str, Tuple[str, Any]] = {}
+
+        for snapshot in self.storage.iter_snapshots(since, until):
+            if previous is not None:
+                diff = self._step(previous, snapshot, state)
+                if diff is None:
+                    # Deleted while the timeline was running
+                    continue
+                yield {'from': previous, 'to': snapshot, 'diff': diff}
+            previous = snapshot
+
+    def _step(self, previous: Dict[str, Any], snapshot: Dict[str, Any],
+              state: Dict[str, Tuple[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Diff a snapshot against its predecessor and advance the state to it."""
+        before_fingerprints = previous['fingerprints']
+        after_fingerprints = snapshot['fingerprints']
+        changed = self.diff_engine.changed_sections(before_fingerprints, after_fingerprints)
+        if not changed:
+            return {}
+
+        # The previous version of a changed section is usually in the state
+        # already; load it only if it was never needed before
+        missing = [name for name in changed if name in before_fingerprints
+                   and state.get(name, (None,))[0] != before_fingerprints[name]]
+        if missing:
+            loaded = self.storage.get_snapshot(previous['id'], sections=missing)
+            for name in missing:
+                if loaded is not None and name in loaded:
+                    state[name] = (before_fingerprints[name], loaded[name])
+
+        after = self.storage.get_snapshot(snapshot['id'],
+                                          sections=[name for name in changed if name in after_fingerprints])
+        if after is None:
+            return None
+
+        before = {name: state[name][1] for name in changed
+                  if name in state and state[name][0] == before_fingerprints.get(name)}
+        diff = self.diff_engine.compare(before, dict(after))
+
+        for name in changed:
+            if name in after:
+                state[name] = (after_fingerprints[name], after[name])
+            else:
+                state.pop(name, None)
+        return diff
@@ -0,0 +1,305 @@
+"""
+Watch module - event sources that keep snapshot sections current between full captures.
+"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import inotify
+from .codec import SnapshotData
+from .collectors import FilesCollector
+from .entrystore import close_spools
+from .merkle import is_tree_section, section_entries, tree_section
+from .snapshot import collector_name
+
+
+class FileEventSource:
+    """
+    Keeps a files section current from inotify events.
+
+    Instead of re-walking and re-hashing the watched directories every tick,
+    only the paths reported by inotify are re-stat'ed and re-hashed. A
+    change is reported within debounce..max_latency seconds of happening.
+    If the kernel queue overflows, the whole section is re-collected; if a
+    new directory cannot be watched, the source reports itself degraded
+    and the pipeline falls back to polling. The digest tree is rebuilt
+    only when the entries change.
+    """
+
+    def __init__(self, collector: FilesCollector, debounce: float = 0.2, max_latency: float = 2.0):
+        """
+        Initialize the event source.
+
+        Args:
+            collector: Files collector whose watch_dirs are monitored.
+            debounce: Quiet period that ends a burst of events.
+            max_latency: Upper bound between the first event and its report.
+        """
+        self.collector = collector
+        self.debounce = debounce
+        self.max_latency = max_latency
+        self.entries: List[Dict[str, Any]] = []
+        self._section: Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]] = None
+        self._watcher = inotify.InotifyWatcher(collector.watch_dirs, skip_dir=collector.skip_dir)
+
+    @classmethod
+    def create(cls, collector: Optional[FilesCollector], **kwargs) -> Optional['FileEventSource']:
+        """
+        Start an event source for a collector, or return None to fall back to polling.
+
+        Returns None when there is no files collector, inotify is unavailable
+        (non-Linux) or the watches cannot be set up (e.g. max_user_watches).
+        """
+        if collector is None or not inotify.is_available():
+            return None
+
+        source = cls(collector, **kwargs)
+        try:
+            source._watcher.start()
+        except OSError:
+            source.close()
+            return None
+        return source
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait up to timeout seconds for file events and apply them.
+
+        Returns:
+            True if the files section was updated.
+        """
+        try:
+            touched = self._watcher.collect(timeout, self.debounce, self.max_latency)
+        except inotify.InotifyOverflow:
+            self.entries = self.collector.collect_entries()
+            return True
+
+        if not touched:
+            return False
+
+        updated = self.collector.refresh(self.entries, touched)
+        if updated == self.entries:
+            return False
+        self.entries = updated
+        return True
+
+    @property
+    def degraded(self) -> bool:
+        """Whether some watched directories are no longer covered by events."""
+        return self._watcher.degraded
+
+    def section(self) -> Dict[str, Any]:
+        """Return the files section for the current entries."""
+        if self._section is None or self._section[0] is not self.entries:
+            self._section = (self.entries, tree_section(self.entries))
+        return self._section[1]
+
+    def close(self) -> None:
+        """Stop watching."""
+        self._watcher.close()
+
+
+# Seconds between runs of each collector in watch mode, keyed by section name.
+# Cheap, fast-moving sections refresh often; package managers spawn
+# subprocesses and rarely change, so they run every ten minutes.
+DEFAULT_CADENCES = {
+    'system': 5.0,
+    'process': 15.0,
+    'network': 15.0,
+    'envvars': 30.0,
+    'files': 60.0,
+    'packages': 600.0,
+}
+
+
+class WatchPipeline:
+    """
+    Capture, diff and store pipeline behind `envdiff watch`.
+
+    Each collector runs on its own cadence. Its latest result is merged into
+    a rolling current state, which is diffed against the last stored
+    snapshot and, if anything changed, stored as-is. Sections maintained by
+    a FileEventSource are taken from it instead of being re-collected.
+    """
+
+    def __init__(self, engine, storage, diff_engine,
+                 file_events: Optional[FileEventSource] = None,
+                 cadences: Optional[Dict[str, float]] = None,
+                 default_cadence: float = 60.0):
+        """
+        Initialize the pipeline.
+
+        Args:
+            engine: SnapshotEngine used to run the collectors.
+            storage: SnapshotStorage that receives changed snapshots.
+            diff_engine: SnapshotDiff used to detect changes.
+            file_events: Optional event source keeping the files section current.
+            cadences: Seconds between runs per section, merged over DEFAULT_CADENCES.
+            default_cadence: Cadence for sections without an explicit one.
+        """
+        self.engine = engine
+        self.storage = storage
+        self.diff_engine = diff_engine
+        self.file_events = file_events
+        self.files_section = collector_name(file_events.collector) if file_events else None
+        self.cadences = dict(DEFAULT_CADENCES)
+        if cadences:
+            self.cadences.update(cadences)
+        self.default_cadence = default_cadence
+        self.last: Dict[str, Any] = {}
+        self._last_id: Optional[str] = None
+        self._repeat = 0
+
+    def cadence(self, section: str) -> float:
+        """Return the seconds between runs of a section's collector."""
+        return self.cadences.get(section, self.default_cadence)
+
+    def scheduled_sections(self) -> List[str]:
+        """Return the sections refreshed by running their collector."""
+        return [name for name in self.engine.section_names()
+                if self.file_events is None or name != self.files_section]
+
+    def baseline(self, name: str = 'watch-baseline') -> str:
+        """
+        Capture and store the snapshot later ticks are compared against.
+
+        Returns:
+            The baseline snapshot ID.
+        """
+        snapshot_id, data = self.engine.capture_named(name)
+        self.storage.save_snapshot(snapshot_id, snapshot_id, data)
+        self.last = data
+        if self.file_events:
+            files = data.get(self.files_section)
+            # A spilled section is read back once; watching keeps entries in memory
+            self.file_events.entries = list(section_entries(files)) if is_tree_section(files) else []
+        return snapshot_id
+
+    def capture(self, sections: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Refresh sections and merge them into the rolling current state.
+
+        Args:
+            sections: Sections whose collectors run. Defaults to all of them.
+
+        Returns:
+            The last stored snapshot with the refreshed sections replaced and
+            event-maintained sections taken from their source. A section
+            whose collector timed out keeps its last good data.
+        """
+        exclude = [self.files_section] if self.file_events else None
+        fresh = self.engine.capture(exclude=exclude, include=sections)
+
+        current = SnapshotData(self.last, getattr(self.last, 'fingerprints', None))
+        fresh_fingerprints = getattr(fresh, 'fingerprints', {})
+        for name, data in fresh.items():
+            if isinstance(data, dict) and data.get('timed_out') and name in self.last:
+                continue
+            current[name] = data
+            if name in fresh_fingerprints:
+                current.fingerprints[name] = fresh_fingerprints[name]
+        if self.file_events:
+            current[self.files_section] = self.file_events.section()
+        return current
+
+    def commit(self, current: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Diff current against the last stored snapshot and store it if it changed.
+
+        Spilled entries are deleted as soon as no state refers to them: those
+        of current when it is dropped, those of the previous state once
+        current replaces it.
+
+        Returns:
+            (snapshot_id, diff) when a snapshot was stored, otherwise None.
+        """
+        try:
+            diff = self.diff_engine.compare(self.last, current)
+            if not self.diff_engine.has_changes(diff):
+                close_spools(current, keep=self.last)
+                return None
+
+            snapshot_id = self._next_id()
+            self.storage.save_snapshot(snapshot_id, snapshot_id, current)
+        except BaseException:
+            close_spools(current, keep=self.last)
+            raise
+        close_spools(self.last, keep=current)
+        self.last = current
+        return snapshot_id, diff
+
+    def tick(self, sections: Optional[List[str]] = None) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Refresh sections once and commit the resulting state."""
+        return self.commit(self.capture(sections))
+
+    def run(self, on_change: Callable[[str, Dict[str, Any]], None]) -> None:
+        """
+        Run each collector on its cadence until interrupted.
+
+        Collectors that fall due together share one capture. Between
+        captures, file events are committed as they arrive on top of the
+        last stored snapshot, without running any collector. If the event
+        source degrades, its section is rescanned at once and then polled
+        on its cadence like any other.
+
+        Args:
+            on_change: Called with (snapshot_id, diff) for every stored snapshot.
+        """
+        start = time.monotonic()
+        next_due = {name: start + self.cadence(name) for name in self.scheduled_sections()}
+        if not next_due and self.file_events is None:
+            return
+
+        while True:
+            wake = min(next_due.values()) if next_due else float('inf')
+            self._wait_until(wake, on_change)
+
+            now = time.monotonic()
+            for name in self.scheduled_sections():
+                # A degraded event source left its section to polling; rescan it now
+                next_due.setdefault(name, now)
+            due = [name for name, when in next_due.items() if when <= now]
+            for name in due:
+                # Schedule from now so a slow capture does not cause a burst of catch-up runs
+                next_due[name] = max(next_due[name] + self.cadence(name), now)
+            if due:
+                self._notify(self.tick(due), on_change)
+
+    def _wait_until(self, wake: float, on_change: Callable[[str, Dict[str, Any]], None]) -> None:
+        """Sleep until wake, committing file events that arrive in the meantime."""
+        remaining = wake - time.monotonic()
+        if self.file_events is None:
+            if remaining > 0:
+                time.sleep(remaining)
+            return
+
+        while remaining > 0:
+            if self.file_events.wait(min(remaining, 3600.0)):
+                current = SnapshotData(self.last, getattr(self.last, 'fingerprints', None))
+                current[self.files_section] = self.file_events.section()
+                self._notify(self.commit(current), on_change)
+            if self.file_events.degraded:
+                self._stop_file_events()
+                return
+            remaining = wake - time.monotonic()
+
+    def _stop_file_events(self) -> None:
+        """Stop relying on a degraded event source; its section is polled from now on."""
+        self.file_events.close()
+        self.file_events = None
+
+    def _notify(self, result: Optional[Tuple[str, Dict[str, Any]]],
+                on_change: Callable[[str, Dict[str, Any]], None]) -> None:
+        """Pass a stored snapshot on to the caller."""
+        if result is not None:
+            on_change(*result)
+
+    def _next_id(self) -> str:
+        """Return a snapshot ID that does not overwrite one stored in the same second."""
+        snapshot_id = f"watch-{int(time.time())}"
+        if snapshot_id == self._last_id:
+            self._repeat += 1
+            return f"{snapshot_id}-{self._repeat}"
+        self._last_id = snapshot_id
+        self._repeat = 0
+        return snapshot_id